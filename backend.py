@@ -1,38 +1,159 @@
-from fastapi import FastAPI, HTTPException, Header, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Header, Depends, WebSocket, WebSocketDisconnect, Body, Request, Response, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from pydantic import BaseModel
-from typing import Optional, List, Set
+from fastapi.responses import RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, List, Any
 import sqlite3
+import asyncio
 import datetime
 import json
+import os
 import secrets
+import tempfile
 import uuid
+import base64
+import anyio
+import orjson
 from contextlib import asynccontextmanager
+from itertools import chain
+from broadcast import create_bus
+from cache import ResponseCache
+from db import Database, db, get_db, DB_FILE
+from migrations import apply_migrations
+from pagination import decode_cursor, paginate
+from export import FORMATS, csv_lines, gzipped, iter_chunks, ndjson_lines
+from sync import MAX_CHANGES, PRUNE_INTERVAL as SYNC_PRUNE_INTERVAL, current_revision, fetch_rows, prune as prune_changes, read_changes
+from ingest import ActivityWriter, IngestQueueFull
+from logs import (MAX_READ_BYTES as LOG_MAX_READ, STREAMS as LOG_STREAMS, LogNotFound, LogTails,
+                  append as append_log, read as read_log, replace as replace_log, text as log_text)
+from latency import FLUSH_SECONDS as LATENCY_FLUSH_SECONDS, WINDOWS as LATENCY_WINDOWS, LatencyTracker
+from partitions import RETENTION_INTERVAL, ActivityStore
+from realtime import ConnectionManager
+from rollups import COMPLETED_STATUS, FLUSH_SECONDS as ROLLUP_FLUSH_SECONDS, Rollup
+from scheduler import ENABLED as SCHEDULER_ENABLED, ENTRY_FIELDS as SCHEDULE_FIELDS, Scheduler
+from search import ORDERS as SEARCH_ORDERS, TYPES as SEARCH_TYPES, search
+from tagging import MODES as TAG_MODES, facets, tag_filter
+from records import ActivityRecord, ComponentRecord, SubAgentRecord, TaskRecord, fetch_records, json_response, project, render
+from updates import Expr, VersionConflict, etag, parse_if_match, update_many, update_returning
+from webhooks import WebhookDispatcher, WebhookRegistry, enqueue as enqueue_webhooks
 
 # WebSocket manager for real-time updates
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.add(websocket)
-    
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.discard(websocket)
-    
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
 manager = ConnectionManager()
+rollup = Rollup()
+latency = LatencyTracker()
+activity_store = ActivityStore(observers=[rollup, latency])
+activity_writer = ActivityWriter(db, activity_store)
+webhook_dispatcher = WebhookDispatcher(db)
+webhook_registry = WebhookRegistry()
+response_cache = ResponseCache()
+log_tails = LogTails()
+bus = create_bus()
+scheduler = Scheduler(db, notify=lambda conn, event, data: trigger_webhooks(conn, event, data),
+                      on_fired=lambda claimed, spawned: _scheduler_fired(claimed, spawned))
+
+# Threads left for sync work: streamed exports, static files and any sync dependency.
+# Route handlers are async and run their queries on the DB executor (see db.py).
+THREADPOOL_SIZE = int(os.environ.get("HOOKER_THREADPOOL", "40"))
+
+def invalidate_cache(*tables: str):
+    """Bump the response cache versions here now, and on the other workers via the bus"""
+    response_cache.invalidate(*tables)
+    bus.publish("cache", tables)
+
+def reschedule(tasks=(), deleted=()):
+    """Report created/updated task rows and deleted ids to the scheduler here and on the other workers"""
+    if SCHEDULER_ENABLED:
+        bus.publish("schedule", {"upsert": [{field: task.get(field) for field in SCHEDULE_FIELDS} for task in tasks],
+                                 "delete": list(deleted)})
+
+def _scheduler_fired(claimed: list, spawned: list):
+    invalidate_cache("tasks")
+    reschedule(claimed + spawned)
+    for task in spawned:
+        bus.publish("ws", {"type": "task_created", "data": _task_row(task)})
+    overdue = [task["id"] for task in claimed if task["overdue_at"] == task["updated_at"]]
+    if overdue:
+        bus.publish("ws", {"type": "tasks_overdue", "data": {"count": len(overdue), "ids": overdue}})
+
+def _apply_log_piece(piece: dict):
+    log_tails.publish(piece["agent"], piece["stream"], piece["offset"], base64.b64decode(piece["data"]))
+
+def _apply_webhook_change(change: dict):
+    if change["op"] == "add":
+        webhook_registry.add(change["id"], change["url"], change["events"])
+    else:
+        webhook_registry.remove(change["id"])
+
+# Everything a request changes in a worker's memory is applied on every worker
+bus.subscribe("ws", manager.publish)
+bus.subscribe("log", _apply_log_piece)
+bus.subscribe("cache", lambda tables: response_cache.invalidate(*tables), own=False)
+bus.subscribe("webhooks", _apply_webhook_change, own=False)
+# Invalidations sent while this worker was off the bus never arrive
+bus.on_reconnect(response_cache.clear)
+if SCHEDULER_ENABLED:
+    bus.subscribe("schedule", scheduler.apply)
+
+async def enforce_activity_retention():
+    """Drop (and archive) expired activity partitions every RETENTION_INTERVAL seconds"""
+    while True:
+        try:
+            dropped = await asyncio.to_thread(activity_store.enforce_retention, db)
+            if dropped:
+                print(f"Activity retention dropped {', '.join(dropped)}")
+        except Exception as e:
+            print(f"Activity retention error: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+async def prune_change_feed():
+    """Drop /sync changes older than its window every SYNC_PRUNE_INTERVAL seconds"""
+    while True:
+        try:
+            await db.write(prune_changes)
+        except Exception as e:
+            print(f"Change feed prune error: {e}")
+        await asyncio.sleep(SYNC_PRUNE_INTERVAL)
+
+async def flush_periodically(name: str, flush, seconds: float):
+    """Write pending in-memory deltas (rollups, latency sketches) every `seconds`"""
+    while True:
+        await asyncio.sleep(seconds)
+        try:
+            await asyncio.to_thread(flush, db)
+        except Exception as e:
+            print(f"{name} flush error: {e}")
 
-app = FastAPI(title="Hooker API", description="Systematic Task Management for Hardware Engineers + Activity Monitoring")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    db.open()
+    await bus.start()
+    await activity_writer.start()
+    webhook_registry.load(db)
+    latency.load(db)
+    await webhook_dispatcher.start()
+    if SCHEDULER_ENABLED:
+        scheduler.load(db)
+        await scheduler.start()
+    retention = asyncio.create_task(enforce_activity_retention()) if activity_store.retention_days > 0 else None
+    flushes = [asyncio.create_task(flush_periodically("Rollup", rollup.flush, ROLLUP_FLUSH_SECONDS)),
+               asyncio.create_task(flush_periodically("Latency", latency.flush, LATENCY_FLUSH_SECONDS)),
+               asyncio.create_task(prune_change_feed())]
+    yield
+    if retention is not None:
+        retention.cancel()
+    for task in flushes:
+        task.cancel()
+    await scheduler.stop()
+    await webhook_dispatcher.stop()
+    await activity_writer.stop()
+    rollup.flush(db)
+    latency.flush(db)
+    await bus.stop()
+    db.close()
+
+app = FastAPI(title="Hooker API", description="Systematic Task Management for Hardware Engineers + Activity Monitoring", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +161,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag", "X-Log-Offset", "X-Log-Size", "X-Log-Next"],
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -48,15 +170,16 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 async def root_redirect():
     return RedirectResponse(url="/static/index.html")
 
-DB_FILE = "hooker.db"
-
 # API Key storage (in production, use env vars or secure storage)
 VALID_API_KEYS = {
     "demo_key_123": "demo_user",
     "": "anonymous"  # Allow empty key for backward compatibility
 }
 
-def verify_api_key(x_api_key: Optional[str] = Header(None)):
+# Page size used when a cursor is passed without an explicit limit
+DEFAULT_PAGE_SIZE = 100
+
+async def verify_api_key(x_api_key: Optional[str] = Header(None)):
     """Simple API key verification"""
     if x_api_key in VALID_API_KEYS or x_api_key is None or x_api_key == "":
         return VALID_API_KEYS.get(x_api_key, "anonymous")
@@ -65,6 +188,8 @@ def verify_api_key(x_api_key: Optional[str] = Header(None)):
 def init_db():
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
+    # Only takes effect on a new database; lets activity retention shrink the file
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
     
     # Tasks table with additional fields
     c.execute('''CREATE TABLE IF NOT EXISTS tasks
@@ -122,6 +247,7 @@ def init_db():
                   created_at TEXT)''')
     
     conn.commit()
+    apply_migrations(conn)
     conn.close()
 
 init_db()
@@ -148,6 +274,24 @@ class TaskUpdate(BaseModel):
     recurring: Optional[bool] = None
     recurrence: Optional[str] = None
 
+class TaskFilter(BaseModel):
+    status: Optional[str] = None
+    assignee: Optional[str] = None
+    tag: List[str] = []
+    tag_mode: str = Field("all", pattern="^(" + "|".join(TAG_MODES) + ")$")
+
+class TaskSelection(BaseModel):
+    """The tasks a bulk operation applies to: explicit ids, or every task matching a filter"""
+    ids: Optional[List[int]] = None
+    filter: Optional[TaskFilter] = None
+
+class TaskBulkUpdate(TaskSelection):
+    set: TaskUpdate
+
+class TaskBulkResult(BaseModel):
+    count: int
+    ids: List[int]
+
 class Task(BaseModel):
     id: int
     title: str
@@ -161,6 +305,8 @@ class Task(BaseModel):
     recurrence: Optional[str]
     created_at: str
     updated_at: str
+    overdue_at: Optional[str] = None
+    version: int = 1
 
 class ComponentCreate(BaseModel):
     part_number: str
@@ -169,6 +315,13 @@ class ComponentCreate(BaseModel):
     datasheet_url: Optional[str] = ""
     tags: List[str] = []
 
+class ComponentUpdate(BaseModel):
+    part_number: Optional[str] = None
+    description: Optional[str] = None
+    stock: Optional[int] = None
+    datasheet_url: Optional[str] = None
+    tags: Optional[List[str]] = None
+
 class Component(BaseModel):
     id: int
     part_number: str
@@ -177,6 +330,7 @@ class Component(BaseModel):
     datasheet_url: str
     tags: List[str]
     created_at: str
+    version: int = 1
 
 class WebhookCreate(BaseModel):
     url: str
@@ -207,15 +361,31 @@ class ActivityCreate(BaseModel):
     duration_ms: int = 0
     metadata: dict = {}
 
-class SubAgent(BaseModel):
+class ActivityBatchError(BaseModel):
+    index: int
+    errors: List[Any]
+
+class ActivityBatchResult(BaseModel):
+    inserted: int
+    failed: int
+    ids: List[str] = []
+    errors: List[ActivityBatchError]
+
+class SubAgentSummary(BaseModel):
     id: str
     name: str
     status: str
     started_at: str
     completed_at: Optional[str]
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    created_at: str
+    version: int = 1
+
+class SubAgent(SubAgentSummary):
+    # The last LOG_MAX_READ bytes of each stream; GET /subagents/{id}/logs pages through the rest
     stdout: Optional[str]
     stderr: Optional[str]
-    created_at: str
 
 class SubAgentCreate(BaseModel):
     name: str
@@ -227,160 +397,400 @@ class SubAgentUpdate(BaseModel):
     stdout: Optional[str] = None
     stderr: Optional[str] = None
 
+class SyncDeleted(BaseModel):
+    tasks: List[int] = []
+    activity: List[str] = []
+    subagents: List[str] = []
+
+class SyncResult(BaseModel):
+    rev: int
+    reset: bool
+    more: bool
+    tasks: List[Task] = []
+    activity: List[ActivityEntry] = []
+    subagents: List[SubAgentSummary] = []
+    deleted: SyncDeleted
+
+def _task_row(row) -> dict:
+    r = dict(row)
+    try: r['tags'] = json.loads(r['tags']) if r['tags'] else []
+    except: r['tags'] = []
+    r['recurring'] = bool(r.get('recurring', 0))
+    return r
+
+def _component_row(row) -> dict:
+    r = dict(row)
+    try: r['tags'] = json.loads(r['tags']) if r['tags'] else []
+    except: r['tags'] = []
+    return r
+
+def _activity_row(row) -> dict:
+    r = dict(row)
+    try:
+        r['metadata'] = json.loads(r['metadata']) if r['metadata'] else {}
+    except:
+        r['metadata'] = {}
+    return r
+
 # --- Routes: TASKS ---
+def _insert_task(conn: sqlite3.Connection, task: TaskCreate, now: str) -> dict:
+    c = conn.execute("""INSERT INTO tasks (title, description, status, assignee, priority, tags, due_date, recurring, recurrence, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                     (task.title, task.description, "TODO", task.assignee, task.priority,
+                      json.dumps(task.tags), task.due_date, int(task.recurring or 0), task.recurrence, now, now))
+    result = {**task.dict(), "id": c.lastrowid, "status": "TODO", "created_at": now, "updated_at": now}
+    trigger_webhooks(conn, "task_created", result)
+    return result
+
 @app.post("/tasks", response_model=Task)
-def create_task(task: TaskCreate, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+async def create_task(task: TaskCreate, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
     now = datetime.datetime.utcnow().isoformat()
-    tags_json = json.dumps(task.tags)
-    
-    c.execute("""INSERT INTO tasks (title, description, status, assignee, priority, tags, due_date, recurring, recurrence, created_at, updated_at) 
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-              (task.title, task.description, "TODO", task.assignee, task.priority, 
-               tags_json, task.due_date, int(task.recurring or 0), task.recurrence, now, now))
-    tid = c.lastrowid
-    conn.commit()
-    conn.close()
     
-    result = {**task.dict(), "id": tid, "status": "TODO", "created_at": now, "updated_at": now}
-    trigger_webhooks("task_created", result)
+    result = await db.write(_insert_task, task, now)
+    invalidate_cache("tasks")
+    reschedule([result])
     
     return result
 
+TAG_MODE = Query("all", pattern="^(" + "|".join(TAG_MODES) + ")$")
+
+def _tagged(conn, table: str, tag: List[str], tag_mode: str, conditions: list, params: list) -> bool:
+    """Add the ?tag= conditions for `table`; False when no row can match"""
+    if not tag:
+        return True
+    tagged = tag_filter(conn, table, tag, tag_mode)
+    if tagged is None:
+        return False
+    conditions.extend(tagged[0])
+    params.extend(tagged[1])
+    return True
+
+def _select_tagged(conn, table: str, record_class, tag: List[str], tag_mode: str, conditions: list, params: list,
+                   limit: Optional[int]) -> list:
+    """Records of `table` by id matching `conditions` and ?tag=, limit + 1 of them when paging"""
+    if not _tagged(conn, table, tag, tag_mode, conditions, params):
+        return []
+    query = f"SELECT {record_class.COLUMNS} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit + 1)
+    return fetch_records(conn, record_class, query, params)
+
+def _tag_facets(conn, table: str, tag: List[str], tag_mode: str, conditions: list, params: list) -> list:
+    return facets(conn, table, conditions, params) if _tagged(conn, table, tag, tag_mode, conditions, params) else []
+
+FIELDS = Query(None, description="Comma-separated fields to return; id and the sort key are always included")
+
+def _projection(record_class, fields: Optional[str], *always: str):
+    """record_class narrowed to ?fields= (plus the fields paging needs)"""
+    if not fields:
+        return record_class
+    try:
+        return project(record_class, {name.strip() for name in fields.split(",") if name.strip()}.union(always))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 @app.get("/tasks", response_model=List[Task])
-def list_tasks(status: Optional[str] = None, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    query = "SELECT * FROM tasks"
-    params = []
+async def list_tasks(request: Request, response: Response, status: Optional[str] = None,
+               tag: List[str] = Query([]), tag_mode: str = TAG_MODE,
+               limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None, fields: Optional[str] = FIELDS,
+               user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    List tasks; pass limit (then the X-Next-Cursor value as cursor) to page by id.
+    Repeat tag= for tasks carrying all of the tags, or any of them with tag_mode=any.
+    fields=id,title,status returns just those fields.
+    """
+    cached = response_cache.lookup("tasks", request)
+    if cached is not None:
+        return cached
+    version = response_cache.version("tasks")
+    record_class = _projection(TaskRecord, fields, "id")
+    conditions = []; params = []
     if status:
-        query += " WHERE status = ?"
+        conditions.append("status = ?")
         params.append(status)
-    c.execute(query, params)
-    rows = c.fetchall()
-    conn.close()
-    tasks = []
-    for row in rows:
-        r = dict(row)
-        try: r['tags'] = json.loads(r['tags']) if r['tags'] else []
-        except: r['tags'] = []
-        r['recurring'] = bool(r.get('recurring', 0))
-        tasks.append(r)
-    return tasks
+    after = decode_cursor(cursor, int)
+    if after:
+        conditions.append("id > ?")
+        params.append(after[0])
+    if cursor and limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    tasks = await db.read(_select_tagged, "tasks", record_class, tag, tag_mode, conditions, params, limit)
+    if limit is not None:
+        tasks = paginate(tasks, limit, lambda t: (t.id,), request, response)
+    return response_cache.store("tasks", request, version, render(tasks), response)
+
+def _export_response(chunks, record_class, name: str, format: str, gzip: bool) -> StreamingResponse:
+    """Stream record chunks as NDJSON or CSV, gzip-encoded on request"""
+    lines = csv_lines(chunks, record_class) if format == "csv" else ndjson_lines(chunks)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    if gzip:
+        lines = gzipped(lines)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(lines, media_type=FORMATS[format], headers=headers)
+
+@app.get("/tasks/tags")
+async def task_tag_facets(request: Request, response: Response, status: Optional[str] = None,
+                          tag: List[str] = Query([]), tag_mode: str = TAG_MODE,
+                          user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Tag counts over the tasks matching the same filters as GET /tasks, most used first"""
+    cached = response_cache.lookup("tasks", request)
+    if cached is not None:
+        return cached
+    version = response_cache.version("tasks")
+    conditions = []; params = []
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    counts = await db.read(_tag_facets, "tasks", tag, tag_mode, conditions, params)
+    return response_cache.store("tasks", request, version, orjson.dumps(counts), response)
+
+@app.get("/tasks/export")
+async def export_tasks(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), gzip: bool = False,
+                       status: Optional[str] = None, assignee: Optional[str] = None,
+                       since: Optional[str] = None, until: Optional[str] = None,
+                       user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Stream every matching task by id; since/until bound created_at (ISO timestamps, until exclusive)"""
+    conditions = []; params = []
+    if status: conditions.append("status = ?"); params.append(status)
+    if assignee: conditions.append("assignee = ?"); params.append(assignee)
+    if since: conditions.append("created_at >= ?"); params.append(since)
+    if until: conditions.append("created_at < ?"); params.append(until)
+    chunks = iter_chunks(db, TaskRecord, "tasks", ("id",), conditions, params)
+    return _export_response(chunks, TaskRecord, "tasks", format, gzip)
+
+IF_MATCH = Header(None, description='Row version from the ETag (or "version" field); a stale one gets 409')
+
+def _expected_version(if_match: Optional[str]) -> Optional[int]:
+    try:
+        return parse_if_match(if_match)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _updated(conn: sqlite3.Connection, table: str, row_id, changes: dict, expected: Optional[int],
+             returning: str = "*", missing: str = "Not found") -> sqlite3.Row:
+    """update_returning() with its outcomes mapped to 404 and 409"""
+    try:
+        row = update_returning(conn, table, row_id, changes, expected, returning)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"ETag": etag(e.current)})
+    if row is None:
+        raise HTTPException(status_code=404, detail=missing)
+    return row
+
+def _task_changes(task: TaskUpdate, now: str) -> dict:
+    """The columns a TaskUpdate sets, for update_returning() / update_many()"""
+    changes = {}
+    if task.title: changes["title"] = task.title
+    if task.description is not None: changes["description"] = task.description
+    if task.status: changes["status"] = task.status
+    if task.assignee: changes["assignee"] = task.assignee
+    if task.priority: changes["priority"] = task.priority
+    if task.due_date is not None: changes["due_date"] = task.due_date; changes["overdue_at"] = None
+    if task.tags is not None: changes["tags"] = json.dumps(task.tags)
+    if task.recurring is not None: changes["recurring"] = int(task.recurring)
+    if task.recurrence is not None: changes["recurrence"] = task.recurrence
+    changes["updated_at"] = now
+    if task.status == COMPLETED_STATUS:
+        # Stamped on the transition only: `status` in the CASE is the value before the update
+        changes["completed_at"] = Expr("CASE WHEN status IS ? THEN completed_at ELSE ? END", (COMPLETED_STATUS, now))
+    return changes
+
+def _update_task(conn: sqlite3.Connection, task_id: int, changes: dict, expected: Optional[int]) -> dict:
+    r = _task_row(_updated(conn, "tasks", task_id, changes, expected, missing="Task not found"))
+    
+    trigger_webhooks(conn, "task_updated", r)
+    return r
 
 @app.put("/tasks/{task_id}", response_model=Task)
-def update_task(task_id: int, task: TaskUpdate, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-    if not c.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    updates = []; params = []
-    if task.title: updates.append("title = ?"); params.append(task.title)
-    if task.description is not None: updates.append("description = ?"); params.append(task.description)
-    if task.status: updates.append("status = ?"); params.append(task.status)
-    if task.assignee: updates.append("assignee = ?"); params.append(task.assignee)
-    if task.priority: updates.append("priority = ?"); params.append(task.priority)
-    if task.due_date is not None: updates.append("due_date = ?"); params.append(task.due_date)
-    if task.tags is not None: updates.append("tags = ?"); params.append(json.dumps(task.tags))
-    if task.recurring is not None: updates.append("recurring = ?"); params.append(int(task.recurring))
-    if task.recurrence is not None: updates.append("recurrence = ?"); params.append(task.recurrence)
-    updates.append("updated_at = ?"); params.append(datetime.datetime.utcnow().isoformat())
-    params.append(task_id)
-    
-    c.execute(f"UPDATE tasks SET {', '.join(updates)} WHERE id = ?", params)
-    conn.commit()
-    c.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-    updated = c.fetchone()
-    conn.close()
-    r = dict(updated)
-    try: r['tags'] = json.loads(r['tags']) if r['tags'] else []
-    except: r['tags'] = []
-    r['recurring'] = bool(r.get('recurring', 0))
+async def update_task(task_id: int, task: TaskUpdate, response: Response, if_match: Optional[str] = IF_MATCH,
+                      user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Partial update; send If-Match with the task's version to get 409 instead of overwriting someone else's change"""
+    now = datetime.datetime.utcnow().isoformat()
+    changes = _task_changes(task, now)
     
-    trigger_webhooks("task_updated", r)
+    r = await db.write(_update_task, task_id, changes, _expected_version(if_match))
+    invalidate_cache("tasks")
+    reschedule([r])
+    if task.status == COMPLETED_STATUS and r["completed_at"] == now:
+        rollup.task_completed(r)
     
+    response.headers["ETag"] = etag(r["version"])
     return r
 
-@app.delete("/tasks/{task_id}")
-def delete_task(task_id: int, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    conn.commit()
-    conn.close()
+# --- Routes: BULK TASKS (before /tasks/{task_id}, which would take "bulk" as an id) ---
+def _selected(conn: sqlite3.Connection, selection: TaskSelection):
+    """(conditions, params) for the selected tasks; None when the selection matches nothing"""
+    conditions = []; params = []
+    if selection.ids is not None:
+        # One parameter however many ids
+        conditions.append("id IN (SELECT value FROM json_each(?))"); params.append(json.dumps(selection.ids))
+    f = selection.filter
+    if f is not None:
+        if f.status: conditions.append("status = ?"); params.append(f.status)
+        if f.assignee: conditions.append("assignee = ?"); params.append(f.assignee)
+        if not _tagged(conn, "tasks", f.tag, f.tag_mode, conditions, params):
+            return None
+    return conditions, params
+
+def _check_selection(selection: TaskSelection):
+    f = selection.filter
+    if selection.ids is None and not (f and (f.status or f.assignee or f.tag)):
+        # An empty selection must not mean "every task"
+        raise HTTPException(status_code=422, detail="Pass ids or a filter with status, assignee or tag")
+
+def _bulk_update_tasks(conn: sqlite3.Connection, selection: TaskSelection, changes: dict) -> list:
+    selected = _selected(conn, selection)
+    if selected is None:
+        return []
+    rows = [_task_row(row) for row in update_many(conn, "tasks", changes, *selected)]
+    if rows:
+        trigger_webhooks(conn, "tasks_bulk_updated", {"count": len(rows), "ids": [r["id"] for r in rows],
+                                                      "changes": selection.set.dict(exclude_none=True)})
+    return rows
+
+def _bulk_delete_tasks(conn: sqlite3.Connection, selection: TaskSelection) -> list:
+    selected = _selected(conn, selection)
+    if selected is None:
+        return []
+    conditions, params = selected
+    ids = [row[0] for row in conn.execute(f"DELETE FROM tasks WHERE {' AND '.join(conditions)} RETURNING id", params).fetchall()]
+    if ids:
+        trigger_webhooks(conn, "tasks_bulk_deleted", {"count": len(ids), "ids": ids})
+    return ids
+
+@app.patch("/tasks/bulk", response_model=TaskBulkResult)
+async def bulk_update_tasks(bulk: TaskBulkUpdate, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    Apply one TaskUpdate to the tasks listed in `ids` or matching `filter`
+    (status, assignee, tag, tag_mode) in a single transaction, with one
+    tasks_bulk_updated webhook and WebSocket event for the lot.
+    """
+    _check_selection(bulk)
+    now = datetime.datetime.utcnow().isoformat()
+    
+    rows = await db.write(_bulk_update_tasks, bulk, _task_changes(bulk.set, now))
+    ids = [r["id"] for r in rows]
+    if rows:
+        invalidate_cache("tasks")
+        reschedule(rows)
+        bus.publish("ws", {"type": "tasks_bulk_updated", "data": {"count": len(ids), "ids": ids,
+                                                                   "changes": bulk.set.dict(exclude_none=True)}})
+    if bulk.set.status == COMPLETED_STATUS:
+        for r in rows:
+            if r["completed_at"] == now:
+                rollup.task_completed(r)
+    
+    return {"count": len(ids), "ids": ids}
+
+@app.delete("/tasks/bulk", response_model=TaskBulkResult)
+async def bulk_delete_tasks(selection: TaskSelection, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Delete the tasks listed in `ids` or matching `filter` in one transaction, with one tasks_bulk_deleted event"""
+    _check_selection(selection)
     
-    trigger_webhooks("task_deleted", {"id": task_id})
+    ids = await db.write(_bulk_delete_tasks, selection)
+    if ids:
+        invalidate_cache("tasks")
+        reschedule(deleted=ids)
+        bus.publish("ws", {"type": "tasks_bulk_deleted", "data": {"count": len(ids), "ids": ids}})
+    
+    return {"count": len(ids), "ids": ids}
+
+def _delete_task(conn: sqlite3.Connection, task_id: int):
+    conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+    trigger_webhooks(conn, "task_deleted", {"id": task_id})
+
+@app.delete("/tasks/{task_id}")
+async def delete_task(task_id: int, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    await db.write(_delete_task, task_id)
+    invalidate_cache("tasks")
+    reschedule(deleted=[task_id])
     
     return {"status": "success"}
 
 # --- Routes: COMPONENTS ---
 @app.post("/components", response_model=Component)
-def create_component(comp: ComponentCreate, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+async def create_component(comp: ComponentCreate, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
     now = datetime.datetime.utcnow().isoformat()
     tags_json = json.dumps(comp.tags)
-    c.execute("""INSERT INTO components (part_number, description, stock, datasheet_url, tags, created_at) 
-                 VALUES (?, ?, ?, ?, ?, ?)""",
-              (comp.part_number, comp.description, comp.stock, comp.datasheet_url, tags_json, now))
-    cid = c.lastrowid
-    conn.commit()
-    conn.close()
+    cid = await db.write(lambda conn: conn.execute("""INSERT INTO components (part_number, description, stock, datasheet_url, tags, created_at)
+                                                      VALUES (?, ?, ?, ?, ?, ?)""",
+                                                   (comp.part_number, comp.description, comp.stock, comp.datasheet_url,
+                                                    tags_json, now)).lastrowid)
+    invalidate_cache("components")
     return {**comp.dict(), "id": cid, "created_at": now}
 
 @app.get("/components", response_model=List[Component])
-def list_components(user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM components")
-    rows = c.fetchall()
-    conn.close()
-    comps = []
-    for row in rows:
-        r = dict(row)
-        try: r['tags'] = json.loads(r['tags']) if r['tags'] else []
-        except: r['tags'] = []
-        comps.append(r)
-    return comps
+async def list_components(request: Request, response: Response, tag: List[str] = Query([]), tag_mode: str = TAG_MODE,
+                          limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None,
+                          user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    List components; pass limit (then the X-Next-Cursor value as cursor) to page by id.
+    Repeat tag= for parts carrying all of the tags, or any of them with tag_mode=any.
+    """
+    cached = response_cache.lookup("components", request)
+    if cached is not None:
+        return cached
+    version = response_cache.version("components")
+    conditions = []; params = []
+    after = decode_cursor(cursor, int)
+    if after:
+        conditions.append("id > ?")
+        params.append(after[0])
+    if cursor and limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    comps = await db.read(_select_tagged, "components", ComponentRecord, tag, tag_mode, conditions, params, limit)
+    if limit is not None:
+        comps = paginate(comps, limit, lambda c: (c.id,), request, response)
+    return response_cache.store("components", request, version, render(comps), response)
+
+@app.put("/components/{comp_id}", response_model=Component)
+async def update_component(comp_id: int, comp: ComponentUpdate, response: Response, if_match: Optional[str] = IF_MATCH,
+                           user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Partial update; If-Match works as on PUT /tasks/{id}"""
+    changes = comp.dict(exclude_none=True)
+    if "tags" in changes:
+        changes["tags"] = json.dumps(changes["tags"])
+    row = await db.write(_updated, "components", comp_id, changes, _expected_version(if_match), "*", "Component not found")
+    invalidate_cache("components")
+    
+    response.headers["ETag"] = etag(row["version"])
+    return _component_row(row)
+
+@app.get("/components/tags")
+async def component_tag_facets(request: Request, response: Response, tag: List[str] = Query([]), tag_mode: str = TAG_MODE,
+                               user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Tag counts over the components matching the same tag filter as GET /components, most used first"""
+    cached = response_cache.lookup("components", request)
+    if cached is not None:
+        return cached
+    version = response_cache.version("components")
+    counts = await db.read(_tag_facets, "components", tag, tag_mode, [], [])
+    return response_cache.store("components", request, version, orjson.dumps(counts), response)
 
 @app.delete("/components/{comp_id}")
-def delete_component(comp_id: int, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM components WHERE id = ?", (comp_id,))
-    conn.commit()
-    conn.close()
+async def delete_component(comp_id: int, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    await db.write(lambda conn: conn.execute("DELETE FROM components WHERE id = ?", (comp_id,)))
+    invalidate_cache("components")
     return {"status": "success"}
 
 # --- Routes: WEBHOOKS ---
 @app.post("/webhooks", response_model=Webhook)
-def create_webhook(webhook: WebhookCreate, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+async def create_webhook(webhook: WebhookCreate, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
     now = datetime.datetime.utcnow().isoformat()
     events_json = json.dumps(webhook.events)
-    c.execute("""INSERT INTO webhooks (url, events, created_at) VALUES (?, ?, ?)""",
-              (webhook.url, events_json, now))
-    wid = c.lastrowid
-    conn.commit()
-    conn.close()
+    wid = await db.write(lambda conn: conn.execute("""INSERT INTO webhooks (url, events, created_at) VALUES (?, ?, ?)""",
+                                                   (webhook.url, events_json, now)).lastrowid)
+    webhook_registry.add(wid, webhook.url, webhook.events)
+    bus.publish("webhooks", {"op": "add", "id": wid, "url": webhook.url, "events": webhook.events})
     return {"id": wid, "url": webhook.url, "events": webhook.events, "created_at": now}
 
 @app.get("/webhooks", response_model=List[Webhook])
-def list_webhooks(user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM webhooks")
-    rows = c.fetchall()
-    conn.close()
+async def list_webhooks(user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    rows = await db.read(lambda conn: conn.execute("SELECT * FROM webhooks").fetchall())
     webhooks = []
     for row in rows:
         r = dict(row)
@@ -390,36 +800,34 @@ def list_webhooks(user: str = Depends(verify_api_key)):
     return webhooks
 
 @app.delete("/webhooks/{webhook_id}")
-def delete_webhook(webhook_id: int, user: str = Depends(verify_api_key)):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM webhooks WHERE id = ?", (webhook_id,))
-    conn.commit()
-    conn.close()
+async def delete_webhook(webhook_id: int, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    await db.write(lambda conn: conn.execute("DELETE FROM webhooks WHERE id = ?", (webhook_id,)))
+    webhook_registry.remove(webhook_id)
+    bus.publish("webhooks", {"op": "remove", "id": webhook_id})
     return {"status": "success"}
 
-def trigger_webhooks(event: str, data: dict):
-    """Trigger registered webhooks (simplified - in production use async/queue)"""
-    import requests
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM webhooks")
-    webhooks = c.fetchall()
-    conn.close()
-    
-    for wh in webhooks:
-        try:
-            events = json.loads(wh['events']) if wh['events'] else []
-            if not events or event in events:
-                payload = {"event": event, "data": data, "timestamp": datetime.datetime.utcnow().isoformat()}
-                requests.post(wh['url'], json=payload, timeout=5)
-        except Exception as e:
-            print(f"Webhook error: {e}")
+def trigger_webhooks(conn: sqlite3.Connection, event: str, data: dict):
+    """
+    Queue `event` for every matching webhook. Must be called inside the
+    route's write transaction; delivery happens in the background once the
+    outbox rows are committed.
+    """
+    if enqueue_webhooks(conn, event, data, webhook_registry.match(event)):
+        webhook_dispatcher.wake()
+
+@app.get("/stats/webhooks")
+async def webhook_stats(user: str = Depends(verify_api_key)):
+    """Webhook outbox backlog and delivery latency"""
+    return await webhook_dispatcher.stats()
+
+@app.get("/stats/scheduler")
+async def scheduler_stats(user: str = Depends(verify_api_key)):
+    """Due-date heap size, next fire time and what the scheduler has done so far"""
+    return {"enabled": SCHEDULER_ENABLED, **scheduler.stats()}
 
 # --- API Key Management ---
 @app.get("/api-keys/generate")
-def generate_api_key(user: str = Depends(verify_api_key)):
+async def generate_api_key(user: str = Depends(verify_api_key)):
     """Generate a new API key"""
     new_key = secrets.token_urlsafe(32)
     # In production, store this in database
@@ -427,27 +835,31 @@ def generate_api_key(user: str = Depends(verify_api_key)):
 
 # --- Routes: ACTIVITY LOG (NEW) ---
 @app.post("/activity", response_model=ActivityEntry)
-def create_activity(activity: ActivityCreate, user: str = Depends(verify_api_key)):
-    """Create a new activity log entry"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
+async def create_activity(activity: ActivityCreate, durable: Optional[bool] = None,
+                          user: str = Depends(verify_api_key)):
+    """
+    Create a new activity log entry.
+    Rows are group-committed by the ingest writer; pass durable=false to
+    return before the commit instead of after it.
+    """
     activity_id = str(uuid.uuid4())
     now = datetime.datetime.utcnow().isoformat()
     metadata_json = json.dumps(activity.metadata)
+    activity.status = latency.classify(activity.actor, activity.action, activity.status, activity.duration_ms)
     
-    c.execute("""INSERT INTO activity_log 
-                 (id, timestamp, actor, action, status, description, duration_ms, metadata, created_at)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-              (activity_id, now, activity.actor, activity.action, activity.status,
-               activity.description, activity.duration_ms, metadata_json, now))
-    
-    conn.commit()
-    conn.close()
+    try:
+        committed = activity_writer.submit(
+            (activity_id, now, activity.actor, activity.action, activity.status,
+             activity.description, activity.duration_ms, metadata_json, now),
+            durable=durable)
+    except IngestQueueFull:
+        raise HTTPException(status_code=503, detail="Activity ingest queue is full",
+                            headers={"Retry-After": "1"})
+    if committed is not None:
+        await committed
     
     # Broadcast to WebSocket clients
-    import asyncio
-    asyncio.create_task(manager.broadcast({
+    bus.publish("ws", {
         "type": "activity_created",
         "data": {
             "id": activity_id,
@@ -459,7 +871,7 @@ def create_activity(activity: ActivityCreate, user: str = Depends(verify_api_key
             "duration_ms": activity.duration_ms,
             "metadata": activity.metadata
         }
-    }))
+    })
     
     return {
         "id": activity_id,
@@ -472,90 +884,189 @@ def create_activity(activity: ActivityCreate, user: str = Depends(verify_api_key
         "metadata": activity.metadata
     }
 
-@app.get("/activity", response_model=List[ActivityEntry])
-def list_activity(status: Optional[str] = None, actor: Optional[str] = None, 
-                  limit: int = 100, user: str = Depends(verify_api_key)):
-    """List activity log entries with optional filters"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+# Bulk ingestion: at most this many per-item errors / broadcast entries are kept
+BATCH_MAX_ERRORS = 1000
+BATCH_BROADCAST_LIMIT = 200
+
+def _activity_from_item(item: Any):
+    """Validate one bulk item; returns (row, entry) for the insert and broadcast"""
+    if not isinstance(item, dict):
+        raise TypeError("Expected a JSON object")
+    activity = ActivityCreate(**item)
+    activity.status = latency.classify(activity.actor, activity.action, activity.status, activity.duration_ms)
+    activity_id = str(uuid.uuid4())
+    now = datetime.datetime.utcnow().isoformat()
+    row = (activity_id, now, activity.actor, activity.action, activity.status,
+           activity.description, activity.duration_ms, json.dumps(activity.metadata), now)
+    entry = {**activity.dict(), "id": activity_id, "timestamp": now}
+    return row, entry
+
+def _broadcast_activity_batch(entries: list, count: int):
+    if count:
+        bus.publish("ws", {
+            "type": "activity_batch_created",
+            "count": count,
+            "data": entries[-BATCH_BROADCAST_LIMIT:]
+        })
+
+@app.post("/activity/batch", response_model=ActivityBatchResult)
+async def create_activity_batch(items: List[Any] = Body(...), user: str = Depends(verify_api_key),
+                                db: Database = Depends(get_db)):
+    """Create many activity entries in one transaction; invalid items are reported, not fatal"""
+    rows, entries, errors = [], [], []
+    for index, item in enumerate(items):
+        try:
+            row, entry = _activity_from_item(item)
+        except (ValidationError, TypeError) as e:
+            if len(errors) < BATCH_MAX_ERRORS:
+                errors.append({"index": index, "errors": json.loads(e.json()) if isinstance(e, ValidationError) else [str(e)]})
+            continue
+        rows.append(row)
+        entries.append(entry)
     
-    query = "SELECT * FROM activity_log WHERE 1=1"
+    if rows:
+        await db.write(activity_store.insert, rows)
+    _broadcast_activity_batch(entries, len(rows))
+    
+    return {"inserted": len(rows), "failed": len(items) - len(rows),
+            "ids": [row[0] for row in rows], "errors": errors}
+
+@app.post("/activity/stream", response_model=ActivityBatchResult)
+async def create_activity_stream(request: Request, user: str = Depends(verify_api_key),
+                                 db: Database = Depends(get_db)):
+    """
+    Ingest an application/x-ndjson body, one ActivityCreate per line.
+    The body is parsed as it arrives and validated rows are spooled to a
+    temp file, so memory stays flat regardless of upload size.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode="w+")
+    entries, errors, ids = [], [], []
+    inserted = failed = 0
+    index = 0
+    
+    def handle_line(line: bytes):
+        nonlocal index, inserted, failed
+        if not line.strip():
+            return
+        try:
+            row, entry = _activity_from_item(json.loads(line))
+        except (ValueError, TypeError) as e:
+            failed += 1
+            if len(errors) < BATCH_MAX_ERRORS:
+                errors.append({"index": index, "errors": json.loads(e.json()) if isinstance(e, ValidationError) else [str(e)]})
+        else:
+            spool.write(json.dumps(row) + "\n")
+            ids.append(row[0])
+            inserted += 1
+            entries.append(entry)
+            if len(entries) > 2 * BATCH_BROADCAST_LIMIT:
+                del entries[:-BATCH_BROADCAST_LIMIT]
+        index += 1
+    
+    with spool:
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                handle_line(line)
+        handle_line(pending)
+        
+        if inserted:
+            spool.seek(0)
+            await db.write(activity_store.insert, (json.loads(line) for line in spool))
+    _broadcast_activity_batch(entries, inserted)
+    
+    return {"inserted": inserted, "failed": failed, "ids": ids, "errors": errors}
+
+@app.get("/activity", response_model=List[ActivityEntry])
+async def list_activity(request: Request, response: Response, status: Optional[str] = None, actor: Optional[str] = None,
+                        limit: int = Query(100, ge=1), cursor: Optional[str] = None, fields: Optional[str] = FIELDS,
+                        user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    List activity log entries with optional filters, newest first; follow
+    X-Next-Cursor for older pages. fields= picks the fields returned.
+    """
+    record_class = _projection(ActivityRecord, fields, "id", "timestamp")
+    conditions = []
     params = []
     
     if status:
-        query += " AND status = ?"
+        conditions.append("status = ?")
         params.append(status)
     if actor:
-        query += " AND actor = ?"
+        conditions.append("actor = ?")
         params.append(actor)
+    after = decode_cursor(cursor, str, str)
+    if after:
+        conditions.append("(timestamp, id) < (?, ?)")
+        params.extend(after)
     
-    query += " ORDER BY timestamp DESC LIMIT ?"
-    params.append(limit)
-    
-    c.execute(query, params)
-    rows = c.fetchall()
-    conn.close()
-    
-    entries = []
-    for row in rows:
-        r = dict(row)
-        try:
-            r['metadata'] = json.loads(r['metadata']) if r['metadata'] else {}
-        except:
-            r['metadata'] = {}
-        entries.append(r)
+    # One snapshot across the partitions the page spans
+    entries = await db.read(lambda conn: activity_store.select(conn, record_class, conditions, params, limit + 1,
+                                                               until=after[0] if after else None))
     
-    return entries
+    entries = paginate(entries, limit, lambda e: (e.timestamp, e.id), request, response)
+    return json_response(render(entries), response)
+
+@app.get("/activity/export")
+async def export_activity(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), gzip: bool = False,
+                          actor: Optional[str] = None, status: Optional[str] = None,
+                          since: Optional[str] = None, until: Optional[str] = None,
+                          user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Stream the activity log oldest first; since/until bound timestamp (ISO timestamps, until exclusive)"""
+    conditions = []; params = []
+    if actor: conditions.append("actor = ?"); params.append(actor)
+    if status: conditions.append("status = ?"); params.append(status)
+    if since: conditions.append("timestamp >= ?"); params.append(since)
+    if until: conditions.append("timestamp < ?"); params.append(until)
+    partitions = await db.read(activity_store.partitions, since, until)
+    chunks = chain.from_iterable(iter_chunks(db, ActivityRecord, partition.name, ("timestamp", "id"), conditions, params)
+                                 for partition in partitions)
+    return _export_response(chunks, ActivityRecord, "activity", format, gzip)
+
+@app.get("/stats/activity")
+async def activity_stats(user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Activity partitions (newest first) and the retention policy"""
+    return await db.read(activity_store.stats)
+
+@app.get("/stats/ingest")
+async def ingest_stats(user: str = Depends(verify_api_key)):
+    """Activity ingest queue depth and group-commit counters"""
+    return activity_writer.stats()
 
 @app.get("/activity/{activity_id}", response_model=ActivityEntry)
-def get_activity(activity_id: str, user: str = Depends(verify_api_key)):
+async def get_activity(activity_id: str, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
     """Get a specific activity log entry"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM activity_log WHERE id = ?", (activity_id,))
-    row = c.fetchone()
-    conn.close()
+    row = await db.read(lambda conn: conn.execute("SELECT * FROM activity_log WHERE id = ?", (activity_id,)).fetchone())
     
     if not row:
         raise HTTPException(status_code=404, detail="Activity not found")
     
-    r = dict(row)
-    try:
-        r['metadata'] = json.loads(r['metadata']) if r['metadata'] else {}
-    except:
-        r['metadata'] = {}
-    
-    return r
+    return _activity_row(row)
 
 # --- Routes: SUB-AGENTS (NEW) ---
 @app.post("/subagents", response_model=SubAgent)
-def create_subagent(subagent: SubAgentCreate, user: str = Depends(verify_api_key)):
+async def create_subagent(subagent: SubAgentCreate, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
     """Register a spawned sub-agent"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
     subagent_id = str(uuid.uuid4())
     now = datetime.datetime.utcnow().isoformat()
     
-    c.execute("""INSERT INTO subagents 
-                 (id, name, status, started_at, created_at)
-                 VALUES (?, ?, ?, ?, ?)""",
-              (subagent_id, subagent.name, subagent.status, now, now))
-    
-    conn.commit()
-    conn.close()
+    await db.write(lambda conn: conn.execute("""INSERT INTO subagents
+                                                (id, name, status, started_at, created_at)
+                                                VALUES (?, ?, ?, ?, ?)""",
+                                             (subagent_id, subagent.name, subagent.status, now, now)))
+    invalidate_cache("subagents")
     
     # Log activity
-    asyncio.create_task(manager.broadcast({
+    bus.publish("ws", {
         "type": "subagent_spawned",
         "data": {
             "id": subagent_id,
             "name": subagent.name,
             "status": subagent.status
         }
-    }))
+    })
     
     return {
         "id": subagent_id,
@@ -565,90 +1076,240 @@ def create_subagent(subagent: SubAgentCreate, user: str = Depends(verify_api_key
         "completed_at": None,
         "stdout": None,
         "stderr": None,
+        "stdout_bytes": 0,
+        "stderr_bytes": 0,
         "created_at": now
     }
 
-@app.get("/subagents", response_model=List[SubAgent])
-def list_subagents(status: Optional[str] = None, user: str = Depends(verify_api_key)):
-    """List all sub-agents"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    query = "SELECT * FROM subagents WHERE 1=1"
+@app.get("/subagents", response_model=List[SubAgentSummary])
+async def list_subagents(request: Request, response: Response, status: Optional[str] = None,
+                         limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None, fields: Optional[str] = FIELDS,
+                         user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    List sub-agents, newest first, with log sizes rather than the logs; pass
+    limit (then the X-Next-Cursor value as cursor) to page. fields= picks the
+    fields returned; the logs themselves are only on GET /subagents/{id}.
+    """
+    cached = response_cache.lookup("subagents", request)
+    if cached is not None:
+        return cached
+    version = response_cache.version("subagents")
+    record_class = _projection(SubAgentRecord, fields, "id", "started_at")
+    query = f"SELECT {record_class.COLUMNS} FROM subagents WHERE 1=1"
     params = []
     
     if status:
         query += " AND status = ?"
         params.append(status)
+    after = decode_cursor(cursor, str, str)
+    if after:
+        query += " AND (started_at, id) < (?, ?)"
+        params.extend(after)
     
-    query += " ORDER BY started_at DESC"
+    query += " ORDER BY started_at DESC, id DESC"
+    if cursor and limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit + 1)
     
-    c.execute(query, params)
-    rows = c.fetchall()
-    conn.close()
+    agents = await db.read(fetch_records, record_class, query, params)
     
-    return [dict(row) for row in rows]
+    if limit is not None:
+        agents = paginate(agents, limit, lambda a: (a.started_at, a.id), request, response)
+    return response_cache.store("subagents", request, version, render(agents), response)
 
-@app.get("/subagents/{subagent_id}", response_model=SubAgent)
-def get_subagent(subagent_id: str, user: str = Depends(verify_api_key)):
-    """Get a specific sub-agent"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM subagents WHERE id = ?", (subagent_id,))
-    row = c.fetchone()
-    conn.close()
-    
+@app.get("/subagents/export")
+async def export_subagents(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), gzip: bool = False,
+                           status: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                           user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Stream sub-agents oldest first; since/until bound started_at (ISO timestamps, until exclusive)"""
+    conditions = []; params = []
+    if status: conditions.append("status = ?"); params.append(status)
+    if since: conditions.append("started_at >= ?"); params.append(since)
+    if until: conditions.append("started_at < ?"); params.append(until)
+    chunks = iter_chunks(db, SubAgentRecord, "subagents", ("started_at", "id"), conditions, params)
+    return _export_response(chunks, SubAgentRecord, "subagents", format, gzip)
+
+def _subagent_detail(conn: sqlite3.Connection, subagent_id: str) -> dict:
+    row = conn.execute(f"SELECT {SubAgentRecord.COLUMNS} FROM subagents WHERE id = ?", (subagent_id,)).fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Sub-agent not found")
-    
-    return dict(row)
+    agent = dict(row)
+    for stream in LOG_STREAMS:
+        agent[stream] = log_text(read_log(conn, subagent_id, stream, tail=LOG_MAX_READ)[0]) if agent[f"{stream}_bytes"] else None
+    return agent
 
-@app.put("/subagents/{subagent_id}", response_model=SubAgent)
-def update_subagent(subagent_id: str, subagent: SubAgentUpdate, user: str = Depends(verify_api_key)):
-    """Update sub-agent status"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM subagents WHERE id = ?", (subagent_id,))
-    
-    if not c.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Sub-agent not found")
-    
-    updates = []
-    params = []
+@app.get("/subagents/{subagent_id}", response_model=SubAgent)
+async def get_subagent(subagent_id: str, user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Get a specific sub-agent with the end of its stdout/stderr"""
+    return await db.read(_subagent_detail, subagent_id)
+
+def _update_subagent(conn: sqlite3.Connection, subagent_id: str, changes: dict, expected: Optional[int], replaced: dict) -> dict:
+    agent = dict(_updated(conn, "subagents", subagent_id, changes, expected, SubAgentRecord.COLUMNS, "Sub-agent not found"))
+    for stream, data in replaced.items():
+        replace_log(conn, subagent_id, stream, data)
+        agent[f"{stream}_bytes"] = len(data)
+    return agent
+
+@app.put("/subagents/{subagent_id}", response_model=SubAgentSummary)
+async def update_subagent(subagent_id: str, subagent: SubAgentUpdate, response: Response, if_match: Optional[str] = IF_MATCH,
+                          user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Update sub-agent status; stdout/stderr replace the whole log (prefer POST /subagents/{id}/logs)"""
+    changes = {}
     
     if subagent.status:
-        updates.append("status = ?")
-        params.append(subagent.status)
+        changes["status"] = subagent.status
     if subagent.completed_at:
-        updates.append("completed_at = ?")
-        params.append(subagent.completed_at)
-    if subagent.stdout:
-        updates.append("stdout = ?")
-        params.append(subagent.stdout)
-    if subagent.stderr:
-        updates.append("stderr = ?")
-        params.append(subagent.stderr)
-    
-    if updates:
-        params.append(subagent_id)
-        c.execute(f"UPDATE subagents SET {', '.join(updates)} WHERE id = ?", params)
-        conn.commit()
-    
-    c.execute("SELECT * FROM subagents WHERE id = ?", (subagent_id,))
-    updated = c.fetchone()
-    conn.close()
+        changes["completed_at"] = subagent.completed_at
+    replaced = {stream: getattr(subagent, stream).encode("utf-8") for stream in LOG_STREAMS if getattr(subagent, stream)}
+    
+    updated = await db.write(_update_subagent, subagent_id, changes, _expected_version(if_match), replaced)
+    invalidate_cache("subagents")
     
     # Broadcast update
-    asyncio.create_task(manager.broadcast({
+    bus.publish("ws", {
         "type": "subagent_updated",
-        "data": dict(updated)
-    }))
+        "data": updated
+    })
+    
+    response.headers["ETag"] = etag(updated["version"])
+    return updated
+
+LOG_STREAM = Query("stdout", pattern="^(" + "|".join(LOG_STREAMS) + ")$")
+
+@app.post("/subagents/{subagent_id}/logs")
+async def append_subagent_log(subagent_id: str, request: Request, stream: str = LOG_STREAM,
+                              user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """Append the raw request body to a sub-agent's stdout or stderr; returns the byte offset it landed at"""
+    data = await request.body()
+    try:
+        offset = await db.write(append_log, subagent_id, stream, data)
+    except LogNotFound:
+        raise HTTPException(status_code=404, detail="Sub-agent not found")
+    invalidate_cache("subagents")
+    if data:
+        bus.publish("log", {"agent": subagent_id, "stream": stream, "offset": offset,
+                            "data": base64.b64encode(data).decode("ascii")})
+
+    return {"stream": stream, "offset": offset, "size": offset + len(data)}
+
+@app.get("/subagents/{subagent_id}/logs")
+async def read_subagent_log(subagent_id: str, stream: str = LOG_STREAM, offset: int = Query(0, ge=0),
+                            limit: int = Query(LOG_MAX_READ, ge=1, le=LOG_MAX_READ), tail: Optional[int] = Query(None, ge=0),
+                            user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    Raw bytes of a sub-agent log from `offset`, or the last `tail` bytes, at
+    most `limit`. X-Log-Offset is where the body starts, X-Log-Size the
+    stream's size and X-Log-Next the offset to ask for next.
+    """
+    try:
+        # One snapshot for the size and the chunks
+        data, start, total = await db.read(read_log, subagent_id, stream, offset, limit, tail)
+    except LogNotFound:
+        raise HTTPException(status_code=404, detail="Sub-agent not found")
+
+    return Response(content=data, media_type="text/plain; charset=utf-8",
+                    headers={"X-Log-Offset": str(start), "X-Log-Size": str(total), "X-Log-Next": str(start + len(data))})
+
+# --- Routes: SEARCH ---
+@app.get("/search")
+async def search_all(q: str = Query(..., min_length=1), type: List[str] = Query(list(SEARCH_TYPES)),
+                     limit: int = Query(20, ge=1, le=100), order: str = Query("rank", pattern="^(" + "|".join(SEARCH_ORDERS) + ")$"),
+                     since: Optional[str] = None, until: Optional[str] = None,
+                     user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    Full-text search over tasks, components and activity. Every word is
+    matched as a prefix; hits come best first (order=rank) or newest first
+    (order=recent), with the matching text in <mark> tags. Repeat type= to
+    pick sources; since/until (ISO timestamps) limit the activity searched.
+    bm25 scores only compare within one type, so ranked hits are ranked per
+    type and interleaved (best task, best component, best activity, ...).
+    """
+    unknown = set(type) - set(SEARCH_TYPES)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown search type(s): {', '.join(sorted(unknown))}")
     
-    return dict(updated)
+    # One snapshot across the indexes searched
+    results = await db.read(search, activity_store, q, type, limit, order, since, until)
+    
+    return {"query": q, "results": results}
+
+# --- Routes: SYNC ---
+def _read_feed(conn: sqlite3.Connection, since: Optional[int], limit: int):
+    if since is None:
+        feed = {"rev": current_revision(conn), "reset": True, "more": False, "upserts": {}, "deleted": {}}
+    else:
+        feed = read_changes(conn, since, limit)
+    return feed, {table: fetch_rows(conn, table, ids) for table, ids in feed["upserts"].items()}
+
+@app.get("/sync", response_model=SyncResult)
+async def sync_changes(since: Optional[int] = Query(None, ge=0), limit: int = Query(1000, ge=1, le=MAX_CHANGES),
+                       user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    Rows changed or deleted after revision `since`. Without `since` only the
+    current revision is returned (with reset=true): fetch it first, load the
+    lists in full, then poll with since=<rev>. Follow up immediately while
+    more=true; on reset=true refetch everything.
+    """
+    # One snapshot for the feed and the rows it points at
+    feed, rows = await db.read(_read_feed, since, limit)
+    
+    return {
+        "rev": feed["rev"],
+        "reset": feed["reset"],
+        "more": feed["more"],
+        "tasks": [_task_row(row) for row in rows.get("tasks", [])],
+        "activity": [_activity_row(row) for row in rows.get("activity_log", [])],
+        "subagents": [dict(row) for row in rows.get("subagents", [])],
+        "deleted": {
+            "tasks": feed["deleted"].get("tasks", []),
+            "activity": feed["deleted"].get("activity_log", []),
+            "subagents": feed["deleted"].get("subagents", []),
+        },
+    }
+
+@app.get("/stats")
+async def get_stats(since: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+                    until: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+                    bucket: str = Query("day", pattern="^(day|week|month)$"), actor: Optional[str] = None,
+                    user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    Task and activity aggregates per day, week or month over [since, until)
+    (dates; the last 30 days by default), read from the rollup tables.
+    Pass actor for one agent's figures. Totals cover the whole range.
+    """
+    today = datetime.datetime.utcnow().date()
+    until = until or (today + datetime.timedelta(days=1)).isoformat()
+    since = since or (today - datetime.timedelta(days=29)).isoformat()
+    return await db.read(rollup.query, since, until, bucket, actor)
+
+@app.get("/stats/rollups")
+async def rollup_stats(user: str = Depends(verify_api_key)):
+    """Unflushed rollup deltas and flush timing"""
+    return rollup.stats()
+
+@app.get("/stats/latency")
+async def latency_stats(window: str = Query("1h", pattern="^(" + "|".join(LATENCY_WINDOWS) + ")$"),
+                        actor: Optional[str] = None, action: Optional[str] = None,
+                        user: str = Depends(verify_api_key), db: Database = Depends(get_db)):
+    """
+    duration_ms percentiles per (actor, action) over a sliding window, merged
+    from the latency sketches as of their last flush. slow_threshold_ms is
+    the rolling p95 above which new successful entries are marked "slow".
+    """
+    actions = await db.read(latency.query, LATENCY_WINDOWS[window], actor, action)
+    return {"window": window, "actions": actions, **latency.stats()}
+
+@app.get("/stats/cache")
+async def cache_stats(user: str = Depends(verify_api_key)):
+    """Response cache size, table versions and hit/304 counters"""
+    return response_cache.stats()
+
+@app.get("/stats/websocket")
+async def websocket_stats(user: str = Depends(verify_api_key)):
+    """Connected dashboards, queued messages and slow-consumer drops, plus the cross-worker bus"""
+    return {**manager.stats(), "log_tails": log_tails.stats(), "bus": bus.stats()}
 
 # --- Routes: WEBSOCKET (NEW) ---
 @app.websocket("/ws/activity")
@@ -657,7 +1318,47 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # Keep connection alive, receive pings
+            # Subscribe/unsubscribe frames; anything else is a keep-alive ping
             data = await websocket.receive_text()
+            manager.handle_frame(websocket, data)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
+
+@app.websocket("/ws/subagents/{subagent_id}/logs")
+async def subagent_log_websocket(websocket: WebSocket, subagent_id: str, stream: str = "stdout",
+                                 offset: int = 0, tail: Optional[int] = None):
+    """
+    Live tail of a sub-agent log: everything from `offset` (or the last
+    `tail` bytes), then each append, as {"type": "log", "stream", "offset", "data"}
+    """
+    if stream not in LOG_STREAMS:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    # Subscribed before the backlog is read, so no append falls in between
+    log_tail = log_tails.subscribe(subagent_id, stream)
+    try:
+        _, log_tail.position, _ = await db.read(read_log, subagent_id, stream, offset, 1, tail)
+    except LogNotFound:
+        log_tails.unsubscribe(log_tail)
+        await websocket.close(code=4404)
+        return
+
+    async def catch_up(position: int):
+        return await db.read(read_log, subagent_id, stream, position)
+
+    async def send(position: int, data: bytes):
+        await websocket.send_text(json.dumps({"type": "log", "stream": stream, "offset": position, "data": log_text(data)}))
+
+    follower = asyncio.create_task(log_tails.follow(log_tail, catch_up, send))
+    try:
+        while True:
+            # Nothing is expected from the client; this notices the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        follower.cancel()
+        log_tails.unsubscribe(log_tail)
@@ -0,0 +1,723 @@
+"""
+Hooker micro-benchmarks.
+
+Runs the FastAPI app in-process (httpx ASGI transport) against a scratch
+database so results are not skewed by the network or by hooker.db.
+
+    python bench.py db --requests 2000 --concurrency 50
+    python bench.py concurrency --clients 1000 --requests 20000
+    python bench.py ingest --rows 20000 --producers 200
+    python bench.py webhooks --subscribers 10000
+    python bench.py ws --clients 5000
+    python bench.py cache --tasks 2000
+    python bench.py serialize --rows 10000 --profile
+    python bench.py export --rows 200000
+    python bench.py retention --rows 500000 --days 10
+    python bench.py stats --rows 200000
+    python bench.py search --rows 1000000
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+import anyio
+import typer
+from rich.console import Console
+from rich.table import Table
+
+# Point the app at a scratch database before backend is imported
+_scratch = tempfile.mkdtemp(prefix="hooker-bench-")
+os.environ.setdefault("HOOKER_DB", os.path.join(_scratch, "bench.db"))
+
+import httpx  # noqa: E402
+
+import backend  # noqa: E402
+from db import Database, get_db  # noqa: E402
+from ingest import ActivityWriter  # noqa: E402
+from migrations import feed_triggers  # noqa: E402
+from partitions import ActivityStore  # noqa: E402
+from realtime import POLICIES, ConnectionManager  # noqa: E402
+from webhooks import WebhookRegistry  # noqa: E402
+
+app = typer.Typer()
+console = Console()
+
+
+@app.callback()
+def main():
+    """Hooker micro-benchmarks"""
+
+
+class UnpooledDatabase(Database):
+    """Pre-pool behaviour: a fresh rollback-journal connection per call"""
+
+    def open(self):
+        return self
+
+    def close(self):
+        pass
+
+    @contextmanager
+    def _fresh(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def reader(self):
+        return self._fresh()
+
+    def writer(self):
+        return self._fresh()
+
+
+class ThreadpoolDatabase(Database):
+    """Pre-executor behaviour: queries run in Starlette's threadpool and wait there for a connection"""
+
+    async def read(self, fn, *args):
+        return await anyio.to_thread.run_sync(self._snapshot, fn, args)
+
+    async def write(self, fn, *args):
+        return await anyio.to_thread.run_sync(self._transaction, fn, args)
+
+
+async def _hammer(method: str, url: str, total: int, concurrency: int, json=None) -> float:
+    """Fire `total` requests with `concurrency` in flight, return requests/sec"""
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                r = await client.request(method, url, json=json)
+                r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+async def _crowd(method: str, url: str, total: int, clients: int, json=None):
+    """`clients` concurrent clients sharing `total` requests; returns (req/s, p50 ms, p99 ms)"""
+    transport = httpx.ASGITransport(app=backend.app)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits) as client:
+        remaining = iter(range(total))
+        latencies = []
+
+        async def worker():
+            for _ in remaining:
+                sent = time.perf_counter()
+                r = await client.request(method, url, json=json)
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - sent)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return total / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def _provider(database: Database):
+    return lambda: database
+
+
+def _seed_activity(path: str, rows: int, describe=None):
+    """Replace the activity log with `rows` entries one second apart, ending now; describe(i) sets descriptions"""
+    store = backend.activity_store
+    database = Database(path).open()
+    now = datetime.datetime.utcnow()
+    with database.writer() as conn:
+        for partition in store.partitions(conn):
+            store.drop(conn, partition.name)
+        store.insert(conn, ((f"seed-{i}", (now - datetime.timedelta(seconds=i)).isoformat(timespec="milliseconds"),
+                             f"Agent-{i % 20}", "bench", "success", describe(i) if describe else "seeded", i % 1000,
+                             "{}", "now")
+                            for i in range(rows, 0, -1)))
+    database.close()
+
+
+@app.command("db")
+def bench_db(requests: int = 2000, concurrency: int = 50, seed_rows: int = 10000):
+    """Requests/sec on the task and activity endpoints, per-call connect vs. pooled WAL"""
+    path = os.environ["HOOKER_DB"]
+    _seed_activity(path, seed_rows)
+
+    scenarios = [
+        ("POST /tasks", "POST", "/tasks", {"title": "bench", "tags": ["bench"]}),
+        ("GET /tasks?status=DONE", "GET", "/tasks?status=DONE", None),
+        ("GET /activity?limit=50", "GET", "/activity?limit=50", None),
+    ]
+    modes = [("per-request connect", UnpooledDatabase(path)), ("pooled WAL", Database(path))]
+
+    table = Table(title=f"Hooker DB layer ({requests} requests, concurrency {concurrency})")
+    table.add_column("Endpoint", style="cyan")
+    for label, _ in modes:
+        table.add_column(f"{label} req/s", justify="right")
+
+    results = {name: [] for name, *_ in scenarios}
+    for label, database in modes:
+        backend.app.dependency_overrides[get_db] = _provider(database)
+        database.open()
+        try:
+            for name, method, url, body in scenarios:
+                results[name].append(asyncio.run(_hammer(method, url, requests, concurrency, body)))
+        finally:
+            database.close()
+            backend.app.dependency_overrides.pop(get_db, None)
+
+    for name, rates in results.items():
+        table.add_row(name, *(f"{rate:,.0f}" for rate in rates))
+    console.print(table)
+
+
+
+@app.command("concurrency")
+def bench_concurrency(clients: int = 1000, requests: int = 20000, seed_rows: int = 10000, threadpool: int = 40):
+    """Throughput and latency with `clients` concurrent clients: queries in the threadpool vs. on the DB executor"""
+    path = os.environ["HOOKER_DB"]
+    _seed_activity(path, seed_rows)
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM tasks")
+    conn.execute("""WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 500)
+                    INSERT INTO tasks (title, description, status, assignee, priority, tags, created_at, updated_at)
+                    SELECT 'task ' || i, 'seeded', 'TODO', 'Morty', 'NORMAL', '["bench"]', 'now', 'now' FROM n""")
+    conn.commit()
+    conn.close()
+
+    scenarios = [
+        ("GET /activity?limit=50", "GET", "/activity?limit=50", None),
+        ("GET /tasks?limit=50", "GET", "/tasks?limit=50", None),
+        ("POST /tasks", "POST", "/tasks", {"title": "bench", "tags": ["bench"]}),
+    ]
+    modes = [(f"threadpool ({threadpool} threads)", ThreadpoolDatabase(path)), ("DB executor", Database(path))]
+
+    table = Table(title=f"{clients:,} concurrent clients, {requests:,} requests per endpoint (response cache off)")
+    table.add_column("Endpoint", style="cyan")
+    table.add_column("Queries run in")
+    for column in ("req/s", "p50 ms", "p99 ms"):
+        table.add_column(column, justify="right")
+
+    async def run(database):
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool
+        return [await _crowd(method, url, requests, clients, body) for _, method, url, body in scenarios]
+
+    backend.response_cache.enabled = False
+    backend.db.open()
+    try:
+        for label, database in modes:
+            backend.app.dependency_overrides[get_db] = _provider(database)
+            database.open()
+            try:
+                results = asyncio.run(run(database))
+            finally:
+                database.close()
+                backend.app.dependency_overrides.pop(get_db, None)
+            for (name, *_), (rate, p50, p99) in zip(scenarios, results):
+                table.add_row(name, label, f"{rate:,.0f}", f"{p50:,.1f}", f"{p99:,.1f}")
+    finally:
+        backend.response_cache.enabled = True
+        backend.db.close()
+    console.print(table)
+
+
+def _activity_row(i: int) -> tuple:
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return (f"bench-{time.perf_counter_ns()}-{i}", now, f"Agent-{i % 20}", "bench", "success",
+            "ingest benchmark", i % 1000, "{}", now)
+
+
+async def _ingest_grouped(database: Database, rows: int, producers: int, durable: bool) -> float:
+    writer = ActivityWriter(database, max_queue=rows + producers, durable=durable)
+    await writer.start()
+
+    async def producer(offset: int):
+        for i in range(offset, rows, producers):
+            waiter = writer.submit(_activity_row(i))
+            if waiter is not None:
+                await waiter
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(p) for p in range(producers)))
+    await writer.stop()
+    return rows / (time.perf_counter() - start)
+
+
+@app.command("ingest")
+def bench_ingest(rows: int = 20000, producers: int = 200):
+    """Activity inserts/sec: one commit per row vs. the group-commit writer"""
+    path = os.environ["HOOKER_DB"]
+    database = Database(path).open()
+
+    # The pre-queue path: a fresh connection and a commit for every row
+    baseline = UnpooledDatabase(path)
+    start = time.perf_counter()
+    for i in range(rows):
+        with baseline.writer() as conn:
+            backend.activity_store.insert(conn, [_activity_row(i)])
+    per_row = rows / (time.perf_counter() - start)
+
+    durable = asyncio.run(_ingest_grouped(database, rows, producers, durable=True))
+    fire_and_forget = asyncio.run(_ingest_grouped(database, rows, producers, durable=False))
+    database.close()
+
+    table = Table(title=f"Activity ingest ({rows} rows, {producers} producers)")
+    table.add_column("Mode", style="cyan")
+    table.add_column("rows/s", justify="right")
+    table.add_row("connect + commit per row", f"{per_row:,.0f}")
+    table.add_row("group commit, durable ack", f"{durable:,.0f}")
+    table.add_row("group commit, fire-and-forget", f"{fire_and_forget:,.0f}")
+    console.print(table)
+
+
+
+WEBHOOK_EVENTS = ["task_created", "task_updated", "task_deleted", "activity_created",
+                  "subagent_spawned", "subagent_updated", "component_created", "component_updated"]
+
+
+@app.command("webhooks")
+def bench_webhooks(subscribers: int = 10000, wildcard_pct: float = 1.0, lookups: int = 2000):
+    """Subscriber lookup per event: SELECT + json.loads per row vs. the in-memory registry"""
+    import random
+
+    path = os.environ["HOOKER_DB"]
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM webhooks")
+    rows = []
+    for i in range(subscribers):
+        events = [] if rng.random() * 100 < wildcard_pct else rng.sample(WEBHOOK_EVENTS[3:], 2)
+        rows.append((f"http://hooks.local/{i}", json.dumps(events), "now"))
+    # Keep the benchmarked event rare so the match set stays small
+    rows[0] = ("http://hooks.local/0", json.dumps(["task_created"]), "now")
+    conn.executemany("INSERT INTO webhooks (url, events, created_at) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    database = Database(path).open()
+
+    def scan(event):
+        with database.reader() as c:
+            matched = []
+            for wh in c.execute("SELECT id, url, events FROM webhooks").fetchall():
+                events = json.loads(wh['events']) if wh['events'] else []
+                if not events or event in events:
+                    matched.append((wh['id'], wh['url']))
+            return matched
+
+    registry = WebhookRegistry()
+    start = time.perf_counter()
+    registry.load(database)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    assert sorted(scan("task_created")) == sorted(registry.match("task_created"))
+    scan_runs = max(1, lookups // 100)
+    start = time.perf_counter()
+    for _ in range(scan_runs):
+        matched = scan("task_created")
+    scan_us = (time.perf_counter() - start) / scan_runs * 1e6
+    start = time.perf_counter()
+    for _ in range(lookups):
+        registry.match("task_created")
+    index_us = (time.perf_counter() - start) / lookups * 1e6
+    database.close()
+
+    table = Table(title=f"Webhook fan-out lookup ({subscribers} subscribers, {len(matched)} match 'task_created')")
+    table.add_column("Path", style="cyan")
+    table.add_column("µs / event", justify="right")
+    table.add_row("SELECT webhooks + json.loads per row", f"{scan_us:,.1f}")
+    table.add_row("WebhookRegistry.match", f"{index_us:,.2f}")
+    table.add_row("registry load at startup (once)", f"{load_ms * 1000:,.0f}")
+    console.print(table)
+
+
+
+class SimulatedSocket:
+    """Stand-in for a browser tab: healthy, slow (stalls on send) or dead"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.kind == "dead":
+            raise ConnectionResetError()
+        await asyncio.sleep(0.05 if self.kind == "slow" else 0)
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def _ws_fanout(clients: int, messages: int, slow_pct: float, dead_pct: float, policy: str):
+    manager = ConnectionManager(queue_size=64, policy=policy)
+    sockets = []
+    for i in range(clients):
+        kind = "dead" if i % 100 < dead_pct else "slow" if i % 100 < dead_pct + slow_pct else "ok"
+        sockets.append(SimulatedSocket(kind))
+        await manager.connect(sockets[-1])
+
+    message = {"type": "activity_created", "data": {"actor": "Morty", "action": "bench", "description": "x" * 200}}
+    publish = 0.0
+    start = time.perf_counter()
+    for i in range(messages):
+        t = time.perf_counter()
+        manager.publish({**message, "n": i})
+        publish += time.perf_counter() - t
+        await asyncio.sleep(0)
+    healthy = [ws for ws in sockets if ws.kind == "ok"]
+    while any(ws.received < messages for ws in healthy):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    stats = manager.stats()
+    for ws in list(manager.clients):
+        manager.disconnect(ws)
+    return elapsed, publish / messages, stats, len(healthy)
+
+
+@app.command("ws")
+def bench_ws(clients: int = 5000, messages: int = 200, slow_pct: float = 2, dead_pct: float = 1):
+    """WebSocket fan-out to simulated clients, some slow and some dead"""
+    table = Table(title=f"WebSocket fan-out ({clients} clients, {messages} messages, {slow_pct}% slow, {dead_pct}% dead)")
+    table.add_column("Policy", style="cyan")
+    table.add_column("publish µs/msg", justify="right")
+    table.add_column("healthy clients done in", justify="right")
+    table.add_column("deliveries/s", justify="right")
+    table.add_column("dropped", justify="right")
+    table.add_column("evicted", justify="right")
+    table.add_column("clients left", justify="right")
+    for policy in POLICIES:
+        elapsed, publish, stats, healthy = asyncio.run(_ws_fanout(clients, messages, slow_pct, dead_pct, policy))
+        table.add_row(policy, f"{publish * 1e6:,.0f}", f"{elapsed:.2f}s", f"{healthy * messages / elapsed:,.0f}",
+                      f"{stats['dropped']:,}", f"{stats['evicted']:,}", f"{stats['clients']:,}")
+    console.print(table)
+
+
+async def _poll(url: str, polls: int, conditional: bool):
+    """Sequential polls of `url`; returns (µs per poll, bytes per poll, status)"""
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        etag = (await client.get(url)).headers.get("ETag")
+        headers = {"If-None-Match": etag} if conditional and etag else {}
+        received = 0
+        start = time.perf_counter()
+        for _ in range(polls):
+            r = await client.get(url, headers=headers)
+            received += len(r.content)
+        elapsed = time.perf_counter() - start
+    return elapsed / polls * 1e6, received / polls, r.status_code
+
+
+@app.command("cache")
+def bench_cache(tasks: int = 2000, polls: int = 500):
+    """Cost of an unchanged GET /tasks poll: uncached vs. cached body vs. 304 via If-None-Match"""
+    path = os.environ["HOOKER_DB"]
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM tasks")
+    conn.execute("""WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                    INSERT INTO tasks (title, description, status, assignee, priority, tags, created_at, updated_at)
+                    SELECT 'task ' || i, 'seeded', 'TODO', 'Morty', 'NORMAL', '["bench","cache"]', 'now', 'now' FROM n""",
+                 (tasks,))
+    conn.commit()
+    conn.close()
+
+    cache = backend.response_cache
+    backend.db.open()
+    table = Table(title=f"Unchanged GET /tasks poll ({tasks} tasks, {polls} polls)")
+    table.add_column("Mode", style="cyan")
+    table.add_column("µs/poll", justify="right")
+    table.add_column("bytes/poll", justify="right")
+    table.add_column("status", justify="right")
+    try:
+        for label, enabled, conditional in [("no cache", False, False), ("cached body", True, False),
+                                            ("If-None-Match", True, True)]:
+            cache.enabled = enabled
+            cache.invalidate("tasks")
+            micros, size, status = asyncio.run(_poll("/tasks", polls, conditional))
+            table.add_row(label, f"{micros:,.0f}", f"{size:,.0f}", str(status))
+    finally:
+        cache.enabled = True
+        backend.db.close()
+    console.print(table)
+
+
+def _legacy_render(conn, table: str, model, decode) -> bytes:
+    """The pre-records path: Row -> dict -> json.loads -> pydantic -> JSON"""
+    from pydantic import TypeAdapter
+
+    rows = [decode(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY id").fetchall()]
+    adapter = TypeAdapter(list[model])
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def _decode_tags(row) -> dict:
+    r = dict(row)
+    try: r['tags'] = json.loads(r['tags']) if r['tags'] else []
+    except: r['tags'] = []  # noqa: E722
+    return r
+
+
+@app.command("serialize")
+def bench_serialize(rows: int = 10000, repeat: int = 5, profile: bool = False):
+    """List-route serialization: dict + json.loads + pydantic vs. slots records + orjson splice"""
+    import cProfile
+    import pstats
+
+    from records import ActivityRecord, ComponentRecord, TaskRecord, fetch_records, render
+
+    path = os.environ["HOOKER_DB"]
+    _seed_activity(path, rows)
+    conn = sqlite3.connect(path)
+    for table in ("tasks", "components"):
+        conn.execute(f"DELETE FROM {table}")
+    series = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+    conn.execute(series + """INSERT INTO tasks (title, description, status, assignee, priority, tags, recurring, created_at, updated_at)
+                             SELECT 'task ' || i, 'seeded', 'TODO', 'Morty', 'NORMAL', '["bench", "serialize"]', i % 2,
+                                    'now', 'now' FROM n""", (rows,))
+    conn.execute(series + """INSERT INTO components (part_number, description, stock, datasheet_url, tags, created_at)
+                             SELECT 'PART-' || i, 'seeded', i, '', '["smd"]', 'now' FROM n""", (rows,))
+    conn.commit()
+    conn.row_factory = sqlite3.Row
+
+    scenarios = [
+        ("tasks", backend.Task, backend._task_row, TaskRecord),
+        ("components", backend.Component, _decode_tags, ComponentRecord),
+        ("activity_log", backend.ActivityEntry, backend._activity_row, ActivityRecord),
+    ]
+    table = Table(title=f"Serializing {rows:,} rows (best of {repeat})")
+    table.add_column("Table", style="cyan")
+    table.add_column("dict + pydantic ms", justify="right")
+    table.add_column("records + orjson ms", justify="right")
+    table.add_column("speed-up", justify="right")
+    for name, model, decode, record in scenarios:
+        def legacy():
+            return _legacy_render(conn, name, model, decode)
+
+        def fast():
+            return render(fetch_records(conn, record, f"SELECT {record.COLUMNS} FROM {name} ORDER BY id"))
+
+        timings = []
+        for fn in (legacy, fast):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            timings.append(best * 1000)
+            if profile:
+                profiler = cProfile.Profile()
+                profiler.runcall(fn)
+                console.print(f"[bold]{name} / {fn.__name__}[/bold]")
+                pstats.Stats(profiler).sort_stats("cumulative").print_stats(8)
+        table.add_row(name, f"{timings[0]:,.1f}", f"{timings[1]:,.1f}", f"{timings[0] / timings[1]:.1f}x")
+    conn.close()
+    console.print(table)
+
+
+async def _drain(path: str, query: str):
+    """
+    Call the ASGI app directly and discard the body as it streams (httpx's
+    ASGITransport buffers whole responses); returns (bytes received, seconds)
+    """
+    # spec_version 2.4: the server reports disconnects via send(), so nothing polls receive()
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+             "query_string": query.encode(), "headers": [(b"host", b"bench")],
+             "client": ("127.0.0.1", 0), "server": ("bench", 80)}
+    received = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    start = time.perf_counter()
+    await backend.app(scope, receive, send)
+    return received, time.perf_counter() - start
+
+
+@app.command("export")
+def bench_export(rows: int = 200000):
+    """Streaming /activity/export throughput and peak Python memory at two export sizes"""
+    import tracemalloc
+
+    path = os.environ["HOOKER_DB"]
+    _seed_activity(path, rows)
+    backend.db.open()
+    table = Table(title="GET /activity/export (peak memory via tracemalloc)")
+    table.add_column("Export", style="cyan")
+    table.add_column("rows", justify="right")
+    table.add_column("MB sent", justify="right")
+    table.add_column("rows/s", justify="right")
+    table.add_column("peak MB", justify="right")
+    try:
+        for label, query in [("ndjson", "format=ndjson"), ("csv", "format=csv"), ("ndjson + gzip", "gzip=true")]:
+            for size in (rows // 10, rows):
+                # Seeded timestamps count back from now, so `since` picks the newest `size` rows
+                since = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() - size + 1))
+                tracemalloc.start()
+                received, elapsed = asyncio.run(_drain("/activity/export", f"{query}&since={since}"))
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                table.add_row(label, f"{size:,}", f"{received / 1e6:,.1f}", f"{size / elapsed:,.0f}", f"{peak / 1e6:,.1f}")
+    finally:
+        backend.db.close()
+    console.print(table)
+
+
+def _legacy_activity_db(path: str, rows: int, days: int):
+    """The pre-partitioning layout: one activity_log table with its indexes and change-feed triggers"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("CREATE TABLE changes (rev INTEGER PRIMARY KEY AUTOINCREMENT, entity TEXT NOT NULL, "
+                 "entity_id NOT NULL, op TEXT NOT NULL)")
+    conn.execute("""CREATE TABLE activity_log (id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, actor TEXT NOT NULL,
+                                               action TEXT NOT NULL, status TEXT DEFAULT 'pending', description TEXT,
+                                               duration_ms INTEGER DEFAULT 0, metadata TEXT, created_at TEXT)""")
+    for columns in ("timestamp, id", "actor, timestamp, id", "status, timestamp, id"):
+        conn.execute(f"CREATE INDEX idx_activity_{columns.replace(', ', '_')} ON activity_log ({columns})")
+    for statement in feed_triggers("activity_log"):
+        conn.execute(statement)
+    step = days * 86400 / rows
+    conn.execute("""WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                    INSERT INTO activity_log (id, timestamp, actor, action, status, description, duration_ms, metadata, created_at)
+                    SELECT printf('seed-%d', i), strftime('%Y-%m-%dT%H:%M:%f', '2026-01-01', printf('+%f seconds', i * ?)),
+                           'Agent-' || (i % 20), 'bench', 'success', 'seeded', i % 1000, '{}', 'now'
+                    FROM n""", (rows, step))
+    return conn
+
+
+@app.command("retention")
+def bench_retention(rows: int = 500000, days: int = 10):
+    """Expiring the oldest day of activity: a DELETE on one table vs. dropping its day partition"""
+    cutoff = "2026-01-02"
+    table = Table(title=f"Expiring 1 of {days} days ({rows:,} rows)")
+    table.add_column("Layout", style="cyan")
+    table.add_column("rows expired", justify="right")
+    table.add_column("ms", justify="right")
+
+    conn = _legacy_activity_db(os.path.join(_scratch, "retention-delete.db"), rows, days)
+    start = time.perf_counter()
+    expired = conn.execute("DELETE FROM activity_log WHERE timestamp < ?", (cutoff,)).rowcount
+    table.add_row("single table, DELETE", f"{expired:,}", f"{(time.perf_counter() - start) * 1000:,.1f}")
+    conn.close()
+
+    conn = _legacy_activity_db(os.path.join(_scratch, "retention-drop.db"), rows, days)
+    store = ActivityStore(granularity="day")
+    conn.execute("BEGIN")
+    store.migrate(conn)
+    conn.execute("COMMIT")
+    oldest = store.partitions(conn)[0]
+    expired = conn.execute(f"SELECT COUNT(*) FROM {oldest.name}").fetchone()[0]
+    start = time.perf_counter()
+    conn.execute("BEGIN")
+    store.drop(conn, oldest.name)
+    conn.execute("COMMIT")
+    table.add_row("day partitions, DROP TABLE", f"{expired:,}", f"{(time.perf_counter() - start) * 1000:,.1f}")
+    conn.close()
+    console.print(table)
+
+
+@app.command("stats")
+def bench_stats(rows: int = 200000, polls: int = 50):
+    """GET /stats from the rollup tables vs. aggregating the raw activity log per request"""
+    path = os.environ["HOOKER_DB"]
+    _seed_activity(path, rows)
+    backend.db.open()
+    with backend.db.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        backend.rollup.rebuild(conn, backend.activity_store)
+    since = (datetime.datetime.utcnow() - datetime.timedelta(days=29)).date().isoformat()
+
+    conn = sqlite3.connect(path)
+
+    def raw_stats():
+        per_day = conn.execute("""SELECT substr(timestamp, 1, 10), actor, COUNT(*), SUM(status = 'error')
+                                  FROM activity_log WHERE timestamp >= ? GROUP BY 1, 2""", (since,)).fetchall()
+        durations = sorted(row[0] for row in conn.execute("SELECT duration_ms FROM activity_log WHERE timestamp >= ?",
+                                                          (since,)))
+        return per_day, durations[len(durations) // 2], durations[int(0.95 * (len(durations) - 1))]
+
+    start = time.perf_counter()
+    for _ in range(polls // 10 or 1):
+        raw_stats()
+    raw_us = (time.perf_counter() - start) / (polls // 10 or 1) * 1e6
+    conn.close()
+    try:
+        rollup_us, _, _ = asyncio.run(_poll("/stats", polls, conditional=False))
+    finally:
+        backend.db.close()
+
+    table = Table(title=f"Last 30 days of stats over {rows:,} activity rows")
+    table.add_column("Source", style="cyan")
+    table.add_column("ms per request", justify="right")
+    table.add_row("GROUP BY + sort on activity_log", f"{raw_us / 1000:,.1f}")
+    table.add_row("GET /stats (rollup tables)", f"{rollup_us / 1000:,.2f}")
+    console.print(table)
+
+
+@app.command("search")
+def bench_search(rows: int = 1000000, polls: int = 50):
+    """GET /search latency at `rows` activity entries vs. a LIKE scan of the description"""
+    import random
+    from itertools import accumulate
+
+    rng = random.Random(17)
+    # A Zipf-like vocabulary of made-up words: word k shows up about 1/k as often as word 1
+    syllables = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+    vocabulary = list(dict.fromkeys("".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(6000)))[:5000]
+    cum_weights = list(accumulate(1 / k for k in range(1, 5001)))
+    path = os.environ["HOOKER_DB"]
+    start = time.perf_counter()
+    _seed_activity(path, rows, lambda i: " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=8)))
+    console.print(f"Seeded and indexed {rows:,} rows in {time.perf_counter() - start:,.1f}s")
+
+    conn = sqlite3.connect(path)
+    counts = {}
+    for word in (vocabulary[0], vocabulary[99], vocabulary[4999]):
+        # Sharing a prefix with other words, so count whole words only
+        counts[word] = sum(conn.execute(f"SELECT COUNT(*) FROM {name}_fts WHERE {name}_fts MATCH ?",
+                                        (f'"{word}"',)).fetchone()[0]
+                           for (name,) in conn.execute("SELECT name FROM activity_partitions"))
+    backend.db.open()
+    table = Table(title=f"Activity search over {rows:,} rows (limit 20)")
+    table.add_column("Query", style="cyan")
+    table.add_column("matches", justify="right")
+    table.add_column("ms per request", justify="right")
+    try:
+        word = vocabulary[99]
+        start = time.perf_counter()
+        found = conn.execute("SELECT COUNT(*) FROM activity_log WHERE ' ' || description || ' ' LIKE ?",
+                             (f"% {word} %",)).fetchone()[0]
+        table.add_row(f"LIKE '% {word} %' (table scan)", f"{found:,}", f"{(time.perf_counter() - start) * 1000:,.1f}")
+        scenarios = [(f"{w} (rank)", f"q={w}", counts[w]) for w in counts]
+        scenarios += [(f"{vocabulary[0]} (recent)", f"q={vocabulary[0]}&order=recent", counts[vocabulary[0]]),
+                      (f"{vocabulary[99]} {vocabulary[4999]} (rank)", f"q={vocabulary[99]}+{vocabulary[4999]}", None),
+                      (f"prefix '{vocabulary[99][:3]}' (rank)", f"q={vocabulary[99][:3]}", None),
+                      (f"prefix '{vocabulary[99][:3]}' (recent)", f"q={vocabulary[99][:3]}&order=recent", None)]
+        for label, query, matches in scenarios:
+            us, _, _ = asyncio.run(_poll(f"/search?type=activity&{query}", polls, conditional=False))
+            table.add_row(label, "" if matches is None else f"{matches:,}", f"{us / 1000:,.2f}")
+    finally:
+        conn.close()
+        backend.db.close()
+    console.print(table)
+
+
+if __name__ == "__main__":
+    app()
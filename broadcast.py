@@ -0,0 +1,281 @@
+"""
+Event bus between uvicorn workers.
+
+Each worker keeps its own WebSocket clients, log tails, response cache and
+webhook index, so an event has to reach every worker, not only the one
+that handled the request. Routes publish() events on named channels and
+each worker applies them through the handlers registered with subscribe().
+
+    local  one process: publish() calls the handlers directly (default)
+    unix   several workers joined over a Unix-domain socket
+
+With "unix", the first worker to take the lock file next to the socket
+becomes the relay and the others connect to it. Every event goes through
+the relay, which forwards it to each worker in arrival order, the sender
+included. All workers therefore apply events in the same order. If the
+relay's worker exits, the others reconnect and one of them takes over.
+While a worker is between relays, its events reach its own handlers only.
+
+Handlers registered with own=False skip events their own process
+published. Use it for state the route already updated synchronously,
+such as cache invalidations.
+
+Callbacks registered with on_reconnect() run each time a worker joins a
+relay or becomes one. Events sent while it was between relays never
+reach it, so state kept current by events (the response cache) has to
+be dropped there.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from db import DB_FILE
+
+BACKEND = os.environ.get("HOOKER_BROADCAST", "local")
+SOCKET_PATH = os.environ.get("HOOKER_BROADCAST_SOCKET",
+                             os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), "hooker-broadcast.sock"))
+# A worker whose unsent events exceed this is dropped by the relay and reconnects
+PEER_BUFFER_BYTES = int(os.environ.get("HOOKER_BROADCAST_BUFFER", str(16 * 1024 * 1024)))
+RECONNECT_SECONDS = 0.1
+BACKENDS = ("local", "unix")
+
+_HEADER = struct.Struct("!I")
+
+Handler = Callable[[object], None]
+
+log = logging.getLogger(__name__)
+
+
+class LocalBus:
+    """Single-process bus: publish() runs the handlers on the event loop"""
+
+    def __init__(self):
+        self.origin = os.getpid()
+        self._handlers: Dict[str, List[Tuple[Handler, bool]]] = {}
+        self._reconnect_handlers: List[Callable[[], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, channel: str, handler: Handler, own: bool = True):
+        self._handlers.setdefault(channel, []).append((handler, own))
+
+    def on_reconnect(self, handler: Callable[[], None]):
+        """Run handler() whenever this worker (re)joins the bus; never called for a single process"""
+        self._reconnect_handlers.append(handler)
+
+    async def start(self):
+        self.origin = os.getpid()
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._loop = None
+
+    def publish(self, channel: str, payload):
+        """Send an event to every worker; safe to call from threadpool routes"""
+        loop = self._loop
+        if loop is not None and not self._on_loop(loop):
+            loop.call_soon_threadsafe(self._send, channel, payload)
+        else:
+            self._send(channel, payload)
+
+    @staticmethod
+    def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def _send(self, channel: str, payload):
+        self.published += 1
+        self._deliver(self.origin, channel, payload)
+
+    def _deliver(self, origin: int, channel: str, payload):
+        for handler, own in self._handlers.get(channel, ()):
+            if origin == self.origin and not own:
+                continue
+            try:
+                handler(payload)
+            except Exception:
+                log.exception("Broadcast handler failed on %s", channel)
+        self.delivered += 1
+
+    def stats(self) -> dict:
+        return {"backend": "local", "published": self.published, "delivered": self.delivered}
+
+
+class UnixSocketBus(LocalBus):
+    """Workers joined through a relay on a Unix-domain socket (see the module docstring)"""
+
+    def __init__(self, path: str = SOCKET_PATH, peer_buffer: int = PEER_BUFFER_BYTES):
+        super().__init__()
+        self.path = path
+        self.peer_buffer = peer_buffer
+        self.ready = asyncio.Event()
+        self.relaying = False
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._peers: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.relayed = 0
+        self.local_only = 0
+        self.dropped_peers = 0
+        self.reconnects = 0
+
+    async def start(self):
+        await super().start()
+        self.ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await super().stop()
+
+    # --- Sending ---
+    def _send(self, channel: str, payload):
+        self.published += 1
+        frame = orjson.dumps([self.origin, channel, payload])
+        if self.relaying:
+            self._relay(frame)
+        elif self._writer is not None:
+            self._writer.write(_HEADER.pack(len(frame)) + frame)
+        else:
+            self.local_only += 1
+            self._deliver(self.origin, channel, payload)
+
+    def _relay(self, frame: bytes):
+        """Forward one event to every connected worker, then apply it here"""
+        self.relayed += 1
+        data = _HEADER.pack(len(frame)) + frame
+        for writer in list(self._peers):
+            if writer.transport.get_write_buffer_size() > self.peer_buffer:
+                # Too far behind; it reconnects and misses what was dropped
+                self.dropped_peers += 1
+                self._peers.pop(writer).cancel()
+                writer.close()
+                continue
+            writer.write(data)
+        self._deliver(*orjson.loads(frame))
+
+    # --- Connection management ---
+    async def _run(self):
+        while True:
+            if self._take_lock():
+                await self._serve()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                # Lock held but socket not bound yet, or the relay just went away
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            self._writer = writer
+            self._joined()
+            try:
+                while True:
+                    frame = await _read_frame(reader)
+                    if frame is None:
+                        break
+                    self._deliver(*orjson.loads(frame))
+            finally:
+                self._writer = None
+                self.ready.clear()
+                writer.close()
+            self.reconnects += 1
+
+    def _joined(self):
+        self.ready.set()
+        for handler in self._reconnect_handlers:
+            try:
+                handler()
+            except Exception:
+                log.exception("Broadcast reconnect handler failed")
+
+    def _take_lock(self) -> bool:
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _serve(self):
+        # Whoever held the lock before is gone; its socket file is stale
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._peer, self.path)
+        self.relaying = True
+        self._joined()
+        try:
+            await asyncio.Future()
+        finally:
+            self.relaying = False
+            self._server.close()
+            for writer, task in list(self._peers.items()):
+                task.cancel()
+                writer.close()
+            self._peers.clear()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def _peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers[writer] = asyncio.current_task()
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                if frame is None:
+                    break
+                self._relay(frame)
+        finally:
+            self._peers.pop(writer, None)
+            writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "unix",
+            "path": self.path,
+            "relay": self.relaying,
+            "connected": self.relaying or self._writer is not None,
+            "peers": len(self._peers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "relayed": self.relayed,
+            "local_only": self.local_only,
+            "dropped_peers": self.dropped_peers,
+            "reconnects": self.reconnects,
+        }
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    try:
+        (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        return await reader.readexactly(size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+def create_bus(backend: str = BACKEND, path: str = SOCKET_PATH) -> LocalBus:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown broadcast backend {backend!r}, expected one of {BACKENDS}")
+    return UnixSocketBus(path) if backend == "unix" else LocalBus()
@@ -0,0 +1,123 @@
+"""
+Version-stamped response cache for the polled list endpoints.
+
+Each cached table has a version counter that its write routes bump after
+committing. A list route looks its request URL up first; an entry is only
+served while it carries the table's current version, so a write makes
+every cached page of that table stale at once without walking the cache.
+On a miss the route runs as usual and hands its rendered body to store(),
+which keeps the bytes.
+
+ETags are a hash of the body, so they stay valid across restarts and
+workers, and a matching If-None-Match is answered with 304 Not Modified.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+CACHE_ENABLED = os.environ.get("HOOKER_RESPONSE_CACHE", "1") != "0"
+MAX_ENTRIES = int(os.environ.get("HOOKER_RESPONSE_CACHE_ENTRIES", "512"))
+# Response headers kept alongside the body (pagination)
+KEPT_HEADERS = ("X-Next-Cursor", "Link")
+
+
+class _Entry:
+    __slots__ = ("version", "body", "etag", "headers")
+
+    def __init__(self, version: int, body: bytes, etag: str, headers: Dict[str, str]):
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self.headers = headers
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+class ResponseCache:
+    """Serialized list responses keyed by (table, request URL)"""
+
+    def __init__(self, enabled: bool = CACHE_ENABLED, max_entries: int = MAX_ENTRIES):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        # Added to every table's version; clear() bumps it
+        self._epoch = 0
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self, table: str) -> int:
+        """Read before querying, then pass to store()"""
+        return self._epoch + self._versions.get(table, 0)
+
+    def invalidate(self, *tables: str):
+        """Call after a write to `tables` has committed"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self):
+        """Drop every entry and make queries still in flight stale, e.g. after invalidations were missed"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def lookup(self, table: str, request: Request) -> Optional[Response]:
+        """The cached response for this request if it is still current, else None"""
+        if not self.enabled:
+            return None
+        key = (table, str(request.url))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != self._epoch + self._versions.get(table, 0):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._respond(request, entry)
+
+    def store(self, table: str, request: Request, version: int, body: bytes, response: Response) -> Response:
+        """Cache a rendered JSON body (plus pagination headers) and respond"""
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        entry = _Entry(version, body, etag, headers)
+        if self.enabled:
+            key = (table, str(request.url))
+            with self._lock:
+                # A write that landed mid-query already made this version stale
+                if version == self._epoch + self._versions.get(table, 0):
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return self._respond(request, entry)
+
+    def _respond(self, request: Request, entry: _Entry) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache", **entry.headers}
+        if _etag_matches(request, entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "versions": dict(self._versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Keep the test suite away from the real hooker.db: backend creates its
+# schema at import time, so this has to happen before anything imports it.
+os.environ.setdefault("HOOKER_DB", os.path.join(tempfile.mkdtemp(prefix="hooker-test-"), "hooker.db"))
@@ -0,0 +1,157 @@
+"""
+Shared SQLite connection layer for Hooker.
+
+One writer connection (serialized behind a lock) plus a bounded pool of
+read-only connections, all running in WAL mode so readers never block the
+writer and vice versa.
+
+Async code (routes, the activity writer, the webhook dispatcher) goes
+through read() and write(), which run a function on a dedicated executor:
+one thread per pooled reader and a single writer thread, so queries never
+wait for a connection and never block the event loop or Starlette's
+threadpool.
+"""
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DB_FILE = os.environ.get("HOOKER_DB", "hooker.db")
+READER_POOL_SIZE = int(os.environ.get("HOOKER_DB_READERS", "8"))
+
+# Tuned for a single-node dashboard backend: WAL + NORMAL sync is durable
+# across application crashes and only loses the last commits on power loss.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative = KiB, so 64 MiB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+def connect(path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open a connection with Hooker's PRAGMAs applied"""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None if read_only else "DEFERRED")
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class Database:
+    """Bounded reader pool + single writer connection"""
+
+    def __init__(self, path: str = DB_FILE, readers: int = READER_POOL_SIZE):
+        self.path = path
+        self.pool_size = readers
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=readers)
+        self._writer: sqlite3.Connection = None
+        self._write_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._created = 0
+        self._read_executor: ThreadPoolExecutor = None
+        self._write_executor: ThreadPoolExecutor = None
+
+    def open(self):
+        with self._open_lock:
+            if self._writer is None:
+                # The writer goes first so journal_mode=WAL is set before any reader attaches
+                self._writer = connect(self.path)
+            if self._read_executor is None:
+                self._read_executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix="hooker-db-read")
+                self._write_executor = ThreadPoolExecutor(1, thread_name_prefix="hooker-db-write")
+        return self
+
+    def close(self):
+        with self._open_lock:
+            executors, self._read_executor, self._write_executor = (self._read_executor, self._write_executor), None, None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True)
+        with self._open_lock:
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+            if self._writer is not None:
+                with self._write_lock:
+                    self._writer.close()
+                self._writer = None
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._open_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return connect(self.path, read_only=True)
+        return self._readers.get()
+
+    @contextmanager
+    def reader(self):
+        """Borrow a pooled read-only connection"""
+        if self._writer is None:
+            self.open()
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Exclusive access to the writer; commits on success, rolls back on error"""
+        if self._writer is None:
+            self.open()
+        with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def _snapshot(self, fn, args):
+        with self.reader() as conn:
+            conn.execute("BEGIN")
+            try:
+                return fn(conn, *args)
+            finally:
+                conn.execute("COMMIT")
+
+    def _transaction(self, fn, args):
+        with self.writer() as conn:
+            return fn(conn, *args)
+
+    async def read(self, fn, *args):
+        """fn(conn, *args) on a pooled reader in the DB executor, inside one read snapshot"""
+        if self._read_executor is None:
+            self.open()
+        return await asyncio.get_running_loop().run_in_executor(self._read_executor, self._snapshot, fn, args)
+
+    async def write(self, fn, *args):
+        """fn(conn, *args) on the writer thread, in a transaction committed when it returns"""
+        if self._write_executor is None:
+            self.open()
+        return await asyncio.get_running_loop().run_in_executor(self._write_executor, self._transaction, fn, args)
+
+
+db = Database()
+
+
+async def get_db() -> Database:
+    """FastAPI dependency returning the shared database"""
+    return db
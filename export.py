@@ -0,0 +1,85 @@
+"""
+Streaming exports for /activity/export, /tasks/export and /subagents/export.
+
+Rows are read in keyset-ordered chunks (each chunk is a short read on a
+pooled connection, resuming after the last key of the previous one) and
+encoded as they go, so memory stays at one chunk however many rows are
+exported and no read transaction is held open across the whole export.
+Output is NDJSON or CSV, optionally gzip-compressed on the fly.
+"""
+
+import csv
+import io
+import os
+import zlib
+from dataclasses import fields
+from operator import attrgetter
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from db import Database
+from records import fetch_records, render_lines
+
+CHUNK_ROWS = int(os.environ.get("HOOKER_EXPORT_CHUNK", "5000"))
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def iter_chunks(db: Database, record_class, table: str, order: Sequence[str], conditions: List[str],
+                params: list, chunk: Optional[int] = None) -> Iterator[list]:
+    """Yield lists of records matching `conditions`, ascending by the `order` key columns"""
+    chunk = chunk or CHUNK_ROWS
+    key = ", ".join(order)
+    marks = ", ".join("?" * len(order))
+    after = None
+    while True:
+        where = list(conditions)
+        args = list(params)
+        if after is not None:
+            where.append(f"({key}) > ({marks})")
+            args.extend(after)
+        query = f"SELECT {record_class.COLUMNS} FROM {table}"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {key} LIMIT ?"
+        args.append(chunk)
+        with db.reader() as conn:
+            rows = fetch_records(conn, record_class, query, args)
+        if rows:
+            yield rows
+        if len(rows) < chunk:
+            return
+        after = [getattr(rows[-1], column) for column in order]
+
+
+def ndjson_lines(chunks: Iterable[list]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield render_lines(rows)
+
+
+def csv_lines(chunks: Iterable[list], record_class) -> Iterator[bytes]:
+    """CSV with a header row; JSON columns are written as their JSON text"""
+    names = [f.name for f in fields(record_class)]
+    getter = attrgetter(*names)
+    raw = [i for i, name in enumerate(names) if name.startswith("_")]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name.lstrip("_") for name in names])
+    for rows in chunks:
+        for record in rows:
+            values = list(getter(record))
+            for i in raw:
+                values[i] = values[i].decode()
+            writer.writerow(values)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzipped(lines: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for data in lines:
+        out = compressor.compress(data)
+        if out:
+            yield out
+    yield compressor.flush()
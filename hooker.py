@@ -2,7 +2,7 @@ import typer
 import requests
 from rich.console import Console
 from rich.table import Table
-from typing import Optional
+from typing import List, Optional
 
 app = typer.Typer()
 console = Console()
@@ -21,26 +21,37 @@ def add(title: str, assignee: str = "Morty", priority: str = "NORMAL"):
     except Exception as e:
         console.print(f"[red]Error:[/red] {e}")
 
+def iter_pages(path: str, params: dict, page_size: int = 100):
+    """Yield one page of results at a time, following the API's X-Next-Cursor header."""
+    params = {**params, "limit": page_size}
+    while True:
+        r = requests.get(f"{API_URL}{path}", params=params)
+        r.raise_for_status()
+        yield r.json()
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return
+        params["cursor"] = cursor
+
 @app.command()
-def list(status: Optional[str] = None):
+def list(status: Optional[str] = None, page_size: int = 100):
     """List all tasks."""
     try:
         params = {"status": status} if status else {}
-        r = requests.get(f"{API_URL}/tasks", params=params)
-        r.raise_for_status()
-        tasks = r.json()
-        
-        table = Table(title="Hooker Tasks")
-        table.add_column("ID", style="cyan")
-        table.add_column("Title", style="magenta")
-        table.add_column("Status", style="green")
-        table.add_column("Assignee", style="yellow")
-        table.add_column("Priority")
         
-        for t in tasks:
-            table.add_row(str(t['id']), t['title'], t['status'], t['assignee'], t['priority'])
+        for page_no, tasks in enumerate(iter_pages("/tasks", params, page_size)):
+            # Fixed widths keep the columns aligned from one page to the next
+            table = Table(title="Hooker Tasks" if page_no == 0 else None, show_header=page_no == 0)
+            table.add_column("ID", style="cyan", width=6)
+            table.add_column("Title", style="magenta", width=40)
+            table.add_column("Status", style="green", width=8)
+            table.add_column("Assignee", style="yellow", width=12)
+            table.add_column("Priority", width=10)
             
-        console.print(table)
+            for t in tasks:
+                table.add_row(str(t['id']), t['title'], t['status'], t['assignee'], t['priority'])
+                
+            console.print(table)
     except Exception as e:
         console.print(f"[red]Error connecting to Hooker API. Is it running?[/red]")
 
@@ -55,5 +66,54 @@ def update(task_id: int, status: str):
     except Exception as e:
         console.print(f"[red]Error:[/red] {e}")
 
+def selection(ids: Optional[List[int]], status: Optional[str], assignee: Optional[str],
+              tag: Optional[List[str]], any_tag: bool) -> dict:
+    """Request body naming the tasks a bulk command applies to."""
+    body = {}
+    if ids:
+        body["ids"] = ids
+    if status or assignee or tag:
+        body["filter"] = {"status": status, "assignee": assignee, "tag": tag or [],
+                          "tag_mode": "any" if any_tag else "all"}
+    if not body:
+        raise typer.BadParameter("Pass --id or at least one of --status, --assignee, --tag")
+    return body
+
+@app.command("bulk-update")
+def bulk_update(ids: Optional[List[int]] = typer.Option(None, "--id", help="Task id (repeatable)"),
+                status: Optional[str] = typer.Option(None, help="Only tasks with this status"),
+                assignee: Optional[str] = typer.Option(None, help="Only tasks assigned to this person"),
+                tag: Optional[List[str]] = typer.Option(None, help="Only tasks with this tag (repeatable)"),
+                any_tag: bool = typer.Option(False, help="Match any --tag instead of all"),
+                set_status: Optional[str] = None, set_assignee: Optional[str] = None, set_priority: Optional[str] = None):
+    """Update many tasks at once, e.g. --status DOING --set-status DONE."""
+    changes = {k: v for k, v in {"status": set_status, "assignee": set_assignee, "priority": set_priority}.items() if v}
+    if not changes:
+        raise typer.BadParameter("Pass at least one of --set-status, --set-assignee, --set-priority")
+    try:
+        r = requests.patch(f"{API_URL}/tasks/bulk", json={**selection(ids, status, assignee, tag, any_tag), "set": changes})
+        r.raise_for_status()
+        console.print(f"[green]{r.json()['count']} task(s) updated[/green]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error:[/red] {e}")
+
+@app.command("bulk-delete")
+def bulk_delete(ids: Optional[List[int]] = typer.Option(None, "--id", help="Task id (repeatable)"),
+                status: Optional[str] = typer.Option(None, help="Only tasks with this status"),
+                assignee: Optional[str] = typer.Option(None, help="Only tasks assigned to this person"),
+                tag: Optional[List[str]] = typer.Option(None, help="Only tasks with this tag (repeatable)"),
+                any_tag: bool = typer.Option(False, help="Match any --tag instead of all"),
+                yes: bool = typer.Option(False, "--yes", help="Skip the confirmation")):
+    """Delete many tasks at once, e.g. --status DONE --tag sprint-9."""
+    body = selection(ids, status, assignee, tag, any_tag)
+    if not yes:
+        typer.confirm("Delete every matching task?", abort=True)
+    try:
+        r = requests.delete(f"{API_URL}/tasks/bulk", json=body)
+        r.raise_for_status()
+        console.print(f"[green]{r.json()['count']} task(s) deleted[/green]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error:[/red] {e}")
+
 if __name__ == "__main__":
     app()
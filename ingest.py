@@ -0,0 +1,149 @@
+"""
+Group-commit ingestion for the activity log.
+
+POST /activity puts rows on an asyncio queue; a single writer task drains
+it and commits up to BATCH_SIZE rows (or whatever arrived within FLUSH_MS)
+in one executemany + commit, so fsync cost is shared by the whole batch.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from db import Database
+from partitions import ActivityStore
+
+BATCH_SIZE = int(os.environ.get("HOOKER_INGEST_BATCH", "500"))
+FLUSH_MS = float(os.environ.get("HOOKER_INGEST_FLUSH_MS", "5"))
+MAX_QUEUE = int(os.environ.get("HOOKER_INGEST_QUEUE", "20000"))
+DURABLE = os.environ.get("HOOKER_INGEST_DURABLE", "1") not in ("0", "false", "no")
+
+log = logging.getLogger(__name__)
+
+class IngestQueueFull(Exception):
+    """Raised when the ingestion queue is at capacity"""
+
+
+class ActivityWriter:
+    """Single consumer that batches activity inserts into group commits"""
+
+    def __init__(self, db: Database, store: Optional[ActivityStore] = None, batch_size: int = BATCH_SIZE,
+                 flush_ms: float = FLUSH_MS, max_queue: int = MAX_QUEUE, durable: bool = DURABLE):
+        self.db = db
+        self.store = store or ActivityStore()
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_queue = max_queue
+        self.durable = durable
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Counters for /stats/ingest
+        self.enqueued = 0
+        self.committed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_commit_ms = 0.0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued, then stop the writer"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def submit(self, row: tuple, durable: Optional[bool] = None) -> Optional[asyncio.Future]:
+        """
+        Queue one activity_log row. Returns a future resolved after the row
+        is committed in durable mode, or None in fire-and-forget mode.
+        """
+        if self._queue is None:
+            raise RuntimeError("ActivityWriter is not running")
+        if durable is None:
+            durable = self.durable
+        waiter = asyncio.get_running_loop().create_future() if durable else None
+        try:
+            self._queue.put_nowait((row, waiter))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise IngestQueueFull()
+        self.enqueued += 1
+        return waiter
+
+    async def _collect(self, first) -> list:
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_ms / 1000
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch = await self._collect(await self._queue.get())
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+                # Drain anything queued behind the sentinel
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not None:
+                        batch.append(item)
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                await self.db.write(self.store.insert, [row for row, _ in batch])
+            except Exception as e:
+                self.failed += len(batch)
+                log.exception("Activity ingest batch of %d rows failed", len(batch))
+                for _, waiter in batch:
+                    if waiter is not None and not waiter.done():
+                        waiter.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.committed += len(batch)
+            self.last_batch_size = len(batch)
+            self.last_commit_ms = (time.perf_counter() - start) * 1000
+            for _, waiter in batch:
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_queue,
+            "durable": self.durable,
+            "batch_size": self.batch_size,
+            "flush_ms": self.flush_ms,
+            "enqueued": self.enqueued,
+            "committed": self.committed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_size": round(self.committed / self.batches, 1) if self.batches else 0,
+            "last_batch_size": self.last_batch_size,
+            "last_commit_ms": round(self.last_commit_ms, 3),
+        }
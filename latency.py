@@ -0,0 +1,198 @@
+"""
+Sliding-window duration_ms percentiles per (actor, action).
+
+Every inserted activity is added to a DDSketch (see sketches.py) for its
+minute and its hour. Those sketches are merged into latency_sketches every
+FLUSH_SECONDS; minute buckets are kept for two hours and hour buckets for a
+week, so a window query merges at most a couple of hundred small sketches
+per (actor, action) instead of reading the raw rows.
+
+After each flush the rolling p95 over SLOW_WINDOW is recomputed for the
+keys that changed. A new successful entry slower than its action's p95
+(once SLOW_MIN_SAMPLES entries are known) is stored with status "slow".
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from db import Database
+from sketches import DDSketch
+
+FLUSH_SECONDS = float(os.environ.get("HOOKER_LATENCY_FLUSH", "10"))
+SLOW_WINDOW = int(os.environ.get("HOOKER_SLOW_WINDOW", "3600"))
+SLOW_MIN_SAMPLES = int(os.environ.get("HOOKER_SLOW_MIN_SAMPLES", "20"))
+SLOW_QUANTILE = 0.95
+SLOW_STATUS = "slow"
+
+MINUTE, HOUR = 60, 3600
+# Bucket size -> how long buckets of that size are kept, in seconds
+RETAIN = {MINUTE: 2 * HOUR, HOUR: 7 * 24 * HOUR}
+WINDOWS = {"5m": 300, "15m": 900, "1h": HOUR, "6h": 6 * HOUR, "24h": 24 * HOUR, "7d": 7 * 24 * HOUR}
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+Key = Tuple[str, str, int, int]  # actor, action, resolution, bucket_start
+
+
+def resolution_for(window: int) -> int:
+    """The finest bucket size still retained for the whole window"""
+    return MINUTE if window <= RETAIN[MINUTE] else HOUR
+
+
+def epoch_seconds(timestamp: str) -> float:
+    """Seconds since the epoch for a naive UTC ISO timestamp"""
+    return (datetime.datetime.fromisoformat(timestamp) - _EPOCH).total_seconds()
+
+
+class LatencyBatch:
+    """Sketch deltas from one insert; folded into the tracker by commit()"""
+
+    def __init__(self, tracker: "LatencyTracker"):
+        self.tracker = tracker
+        self.deltas: Dict[Key, DDSketch] = {}
+
+    def add(self, actor: str, action: str, when: float, duration_ms: Optional[int]):
+        for resolution in RETAIN:
+            key = (actor, action, resolution, int(when // resolution * resolution))
+            sketch = self.deltas.get(key)
+            if sketch is None:
+                sketch = self.deltas[key] = DDSketch()
+            sketch.add(duration_ms or 0)
+
+    def observe(self, rows: Iterable[tuple]) -> Iterator[tuple]:
+        """Pass activity rows (partitions.COLUMNS order) through, sketching each duration"""
+        for row in rows:
+            self.add(row[2], row[3], epoch_seconds(row[1]), row[6])
+            yield row
+
+    def commit(self):
+        self.tracker.merge(self.deltas)
+        self.deltas = {}
+
+
+class LatencyTracker:
+    """Pending sketch deltas, their flush into latency_sketches, and the slow thresholds"""
+
+    def __init__(self, slow_window: int = SLOW_WINDOW, min_samples: int = SLOW_MIN_SAMPLES):
+        self.slow_window = slow_window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._pending: Dict[Key, DDSketch] = {}
+        # (actor, action) -> rolling p95 in ms
+        self.thresholds: Dict[Tuple[str, str], float] = {}
+        self.flagged = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    def batch(self) -> LatencyBatch:
+        return LatencyBatch(self)
+
+    def merge(self, deltas: Dict[Key, DDSketch]):
+        with self._lock:
+            for key, sketch in deltas.items():
+                if key in self._pending:
+                    self._pending[key].merge(sketch)
+                else:
+                    self._pending[key] = sketch
+
+    def classify(self, actor: str, action: str, status: str, duration_ms: int) -> str:
+        """`status`, or "slow" for a successful entry above its action's rolling p95"""
+        if status != "success":
+            return status
+        threshold = self.thresholds.get((actor, action))
+        if threshold is not None and duration_ms > threshold:
+            self.flagged += 1
+            return SLOW_STATUS
+        return status
+
+    # --- Writes ---
+
+    def flush(self, db: Database, now: Optional[float] = None) -> int:
+        """Merge pending sketches into latency_sketches, prune expired buckets, refresh thresholds"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        now = time.time() if now is None else now
+        start = time.perf_counter()
+        try:
+            with db.writer() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for key, sketch in pending.items():
+                    row = conn.execute("""SELECT sketch FROM latency_sketches
+                                          WHERE actor = ? AND action = ? AND resolution = ? AND bucket_start = ?""",
+                                       key).fetchone()
+                    if row:
+                        sketch = DDSketch.from_bytes(row[0]).merge(sketch)
+                    conn.execute("INSERT OR REPLACE INTO latency_sketches VALUES (?, ?, ?, ?, ?)",
+                                 (*key, sketch.to_bytes()))
+                for resolution, retain in RETAIN.items():
+                    conn.execute("DELETE FROM latency_sketches WHERE resolution = ? AND bucket_start < ?",
+                                 (resolution, int(now - retain)))
+                for actor, action in {(actor, action) for actor, action, _, _ in pending}:
+                    self._refresh(conn, actor, action, now)
+        except Exception:
+            self.merge(pending)
+            raise
+        if pending:
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+        return len(pending)
+
+    def _refresh(self, conn: sqlite3.Connection, actor: str, action: str, now: float):
+        sketch = DDSketch()
+        for (data,) in conn.execute("""SELECT sketch FROM latency_sketches
+                                       WHERE actor = ? AND action = ? AND resolution = ? AND bucket_start >= ?""",
+                                    (actor, action, resolution_for(self.slow_window), int(now - self.slow_window))):
+            sketch.merge(DDSketch.from_bytes(data))
+        if sketch.count >= self.min_samples:
+            self.thresholds[(actor, action)] = sketch.quantile(SLOW_QUANTILE)
+        else:
+            self.thresholds.pop((actor, action), None)
+
+    def load(self, db: Database, now: Optional[float] = None):
+        """Rebuild the slow thresholds from the stored sketches (at startup)"""
+        now = time.time() if now is None else now
+        with db.reader() as conn:
+            # Deduplicated here rather than with DISTINCT, which needs a temp B-tree
+            keys = {tuple(row) for row in conn.execute("""SELECT actor, action FROM latency_sketches
+                                                          WHERE resolution = ? AND bucket_start >= ?""",
+                                                       (resolution_for(self.slow_window), int(now - self.slow_window)))}
+            for actor, action in keys:
+                self._refresh(conn, actor, action, now)
+
+    # --- Reads ---
+
+    def query(self, conn: sqlite3.Connection, window: int, actor: Optional[str] = None,
+              action: Optional[str] = None, now: Optional[float] = None) -> list:
+        """p50/p90/p95/p99 per (actor, action) over the last `window` seconds"""
+        now = time.time() if now is None else now
+        query = "SELECT actor, action, sketch FROM latency_sketches WHERE resolution = ? AND bucket_start >= ?"
+        resolution = resolution_for(window)
+        params = [resolution, int(now - window) // resolution * resolution]
+        if actor:
+            query += " AND actor = ?"
+            params.append(actor)
+        if action:
+            query += " AND action = ?"
+            params.append(action)
+        merged: Dict[Tuple[str, str], DDSketch] = {}
+        for name, act, data in conn.execute(query, params):
+            merged.setdefault((name, act), DDSketch()).merge(DDSketch.from_bytes(data))
+        return [{
+            "actor": name,
+            "action": act,
+            "count": sketch.count,
+            **{f"p{int(q * 100)}_ms": round(sketch.quantile(q)) for q in (0.5, 0.9, 0.95, 0.99)},
+            "slow_threshold_ms": None if (name, act) not in self.thresholds else round(self.thresholds[(name, act)]),
+        } for (name, act), sketch in sorted(merged.items())]
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "tracked": len(self.thresholds),
+            "flagged_slow": self.flagged,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
@@ -0,0 +1,194 @@
+"""
+Append-only sub-agent logs.
+
+stdout and stderr are stored as byte chunks in subagent_logs, keyed by
+(agent_id, stream, start) where start is the chunk's byte offset in the
+stream. An append tops up the last chunk until it holds CHUNK_BYTES and
+then starts new ones, so it costs the same however long the log already
+is, and subagents only carries the running sizes (stdout_bytes,
+stderr_bytes). A range read seeks to the chunk containing the offset and
+reads forward; the database is memory-mapped (db.PRAGMAS), so those pages
+come straight from the mapping.
+
+LogTails fans appended chunks out to live-tail WebSockets. Each tail has
+a bounded queue; a tail that falls behind is marked lagging and catches up
+from the table instead of holding an unbounded backlog.
+"""
+
+import asyncio
+import os
+import sqlite3
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from realtime import QUEUE_SIZE
+
+CHUNK_BYTES = int(os.environ.get("HOOKER_LOG_CHUNK", str(64 * 1024)))
+MAX_READ_BYTES = int(os.environ.get("HOOKER_LOG_MAX_READ", str(1024 * 1024)))
+STREAMS = ("stdout", "stderr")
+
+
+class LogNotFound(Exception):
+    """No sub-agent with that id"""
+
+
+def _size_column(stream: str) -> str:
+    if stream not in STREAMS:
+        raise ValueError(f"Log stream must be one of {STREAMS}, not {stream!r}")
+    return f"{stream}_bytes"
+
+
+def size(conn: sqlite3.Connection, agent_id: str, stream: str) -> int:
+    row = conn.execute(f"SELECT {_size_column(stream)} FROM subagents WHERE id = ?", (agent_id,)).fetchone()
+    if row is None:
+        raise LogNotFound(agent_id)
+    return row[0]
+
+
+def append(conn: sqlite3.Connection, agent_id: str, stream: str, data: bytes) -> int:
+    """Append `data` to a stream inside the caller's write transaction; returns the offset it starts at"""
+    start = size(conn, agent_id, stream)
+    if not data:
+        return start
+    view = memoryview(data)
+    last = conn.execute("""SELECT id, start, length(data) FROM subagent_logs
+                           WHERE agent_id = ? AND stream = ? ORDER BY start DESC LIMIT 1""",
+                        (agent_id, stream)).fetchone()
+    if last and last[2] < CHUNK_BYTES:
+        # || yields TEXT, and length() of TEXT counts characters: keep the chunk a BLOB
+        room = CHUNK_BYTES - last[2]
+        conn.execute("UPDATE subagent_logs SET data = CAST(data || ? AS BLOB) WHERE id = ?", (bytes(view[:room]), last[0]))
+        view = view[room:]
+    offset = start + len(data) - len(view)
+    for i in range(0, len(view), CHUNK_BYTES):
+        conn.execute("INSERT INTO subagent_logs (agent_id, stream, start, data) VALUES (?, ?, ?, ?)",
+                     (agent_id, stream, offset + i, bytes(view[i:i + CHUNK_BYTES])))
+    conn.execute(f"UPDATE subagents SET {_size_column(stream)} = ? WHERE id = ?", (start + len(data), agent_id))
+    return start
+
+
+def replace(conn: sqlite3.Connection, agent_id: str, stream: str, data: bytes):
+    """Overwrite a whole stream (the PUT stdout/stderr behaviour)"""
+    size(conn, agent_id, stream)
+    conn.execute("DELETE FROM subagent_logs WHERE agent_id = ? AND stream = ?", (agent_id, stream))
+    conn.execute(f"UPDATE subagents SET {_size_column(stream)} = 0 WHERE id = ?", (agent_id,))
+    append(conn, agent_id, stream, data)
+
+
+def read(conn: sqlite3.Connection, agent_id: str, stream: str, offset: int = 0,
+         limit: int = MAX_READ_BYTES, tail: Optional[int] = None) -> Tuple[bytes, int, int]:
+    """
+    Up to `limit` bytes from `offset`, or from `tail` bytes before the end;
+    returns (data, the offset it starts at, stream size). Run inside one read
+    snapshot so the size and the chunks agree.
+    """
+    total = size(conn, agent_id, stream)
+    if tail is not None:
+        offset = total - tail
+    offset = min(max(offset, 0), total)
+    end = min(offset + limit, total)
+    if end <= offset:
+        return b"", offset, total
+    chunks = conn.execute("""SELECT start, data FROM subagent_logs
+                             WHERE agent_id = ? AND stream = ? AND start < ? AND start >= COALESCE(
+                                 (SELECT MAX(start) FROM subagent_logs WHERE agent_id = ? AND stream = ? AND start <= ?), 0)
+                             ORDER BY start""", (agent_id, stream, end, agent_id, stream, offset))
+    out = bytearray()
+    for start, data in chunks:
+        out += data[max(offset - start, 0):end - start]
+    return bytes(out), offset, total
+
+
+class LogTail:
+    """One live-tail subscriber; `position` is the next byte offset it has not sent yet"""
+
+    __slots__ = ("agent_id", "stream", "queue", "position", "lagging")
+
+    def __init__(self, agent_id: str, stream: str, position: int = 0):
+        self.agent_id = agent_id
+        self.stream = stream
+        self.queue: "asyncio.Queue[Tuple[int, bytes]]" = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.position = position
+        self.lagging = False
+
+    def take(self, offset: int, data: bytes) -> bytes:
+        """The part of an appended piece past `position` (pieces can overlap what was already read from the table)"""
+        if offset > self.position:
+            # A gap means pieces were dropped: catch up from the table instead
+            self.lagging = True
+            return b""
+        data = data[self.position - offset:]
+        self.position += len(data)
+        return data
+
+
+class LogTails:
+    """
+    Live-tail subscribers per (agent_id, stream). Subscribe before reading
+    the backlog and call publish() after each append commits; take() then
+    drops whatever the backlog read already covered.
+    """
+
+    def __init__(self):
+        self._tails: Dict[Tuple[str, str], Set[LogTail]] = {}
+        self.published = 0
+        self.lagged = 0
+
+    def subscribe(self, agent_id: str, stream: str) -> LogTail:
+        _size_column(stream)
+        tail = LogTail(agent_id, stream)
+        self._tails.setdefault((agent_id, stream), set()).add(tail)
+        return tail
+
+    def unsubscribe(self, tail: LogTail):
+        tails = self._tails.get((tail.agent_id, tail.stream))
+        if tails is not None:
+            tails.discard(tail)
+            if not tails:
+                del self._tails[(tail.agent_id, tail.stream)]
+
+    def publish(self, agent_id: str, stream: str, offset: int, data: bytes):
+        for tail in self._tails.get((agent_id, stream), ()):
+            if tail.lagging:
+                continue
+            try:
+                tail.queue.put_nowait((offset, data))
+                self.published += 1
+            except asyncio.QueueFull:
+                tail.lagging = True
+                self.lagged += 1
+
+    async def follow(self, tail: LogTail, catch_up: Callable[[int], Awaitable[Tuple[bytes, int, int]]],
+                     send: Callable[[int, bytes], Awaitable[None]]):
+        """
+        Send the stream from tail.position on, then every append, until
+        cancelled. catch_up(offset) reads (data, offset, size) from the
+        table; it is used for the backlog and whenever the tail lagged.
+        """
+        while True:
+            while True:
+                data, tail.position, total = await catch_up(tail.position)
+                if data:
+                    await send(tail.position, data)
+                    tail.position += len(data)
+                if not data or tail.position >= total:
+                    break
+            while not tail.lagging:
+                offset, data = await tail.queue.get()
+                data = tail.take(offset, data)
+                if data:
+                    await send(tail.position - len(data), data)
+            # Dropped pieces are re-read from the table
+            while not tail.queue.empty():
+                tail.queue.get_nowait()
+            tail.lagging = False
+
+    def stats(self) -> dict:
+        return {
+            "tails": sum(len(tails) for tails in self._tails.values()),
+            "published": self.published,
+            "lagged": self.lagged,
+        }
+
+
+def text(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
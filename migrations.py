@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for Hooker.
+
+The schema version lives in PRAGMA user_version. init_db() creates the
+base tables (version 0); each entry in MIGRATIONS moves the database one
+version forward and is applied exactly once, in order.
+"""
+
+import sqlite3
+import sys
+
+from db import DB_FILE
+
+
+def feed_triggers(table: str, entity: str = None):
+    """Triggers recording every insert, update and delete on `table` in the change feed as `entity`"""
+    entity = entity or table
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_feed AFTER {event} ON {table}
+            BEGIN INSERT INTO changes (entity, entity_id, op) VALUES ('{entity}', {row}.id, '{op}'); END"""
+        for event, row, op in (("INSERT", "NEW", "upsert"), ("UPDATE", "NEW", "upsert"), ("DELETE", "OLD", "delete"))
+    ]
+
+
+def fts_schema(table: str, columns, unindexed=(), content_rowid: str = "rowid", weights=()):
+    """
+    An external-content FTS5 index <table>_fts over `columns` (ranked with
+    the bm25 `weights`), kept in sync with `table` by triggers. `unindexed`
+    columns are read back from `table` but not searched.
+    """
+    fts = f"{table}_fts"
+    names = list(columns) + list(unindexed)
+    fields = ", ".join(names)
+    new = ", ".join(f"NEW.{name}" for name in names)
+    old = ", ".join(f"OLD.{name}" for name in names)
+    remove = f"INSERT INTO {fts} ({fts}, rowid, {fields}) VALUES ('delete', OLD.{content_rowid}, {old});"
+    add = f"INSERT INTO {fts} (rowid, {fields}) VALUES (NEW.{content_rowid}, {new});"
+    statements = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5
+            ({", ".join(list(columns) + [f"{name} UNINDEXED" for name in unindexed])},
+             content='{table}', content_rowid='{content_rowid}',
+             tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {remove} END",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {", ".join(columns)} ON {table}
+            BEGIN {remove} {add} END""",
+    ]
+    if weights:
+        statements.append(f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25({', '.join(map(str, weights))})')")
+    return statements
+
+
+def fts_rebuild(table: str) -> str:
+    """Re-read every row of `table` into its FTS index"""
+    return f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')"
+
+
+# Searched columns, read-back columns and bm25 weights of the /search indexes
+TASKS_FTS = fts_schema("tasks", ("title", "description", "tags"), ("created_at",), "id", (10, 1, 4))
+COMPONENTS_FTS = fts_schema("components", ("part_number", "description", "tags"), ("created_at",), "id", (10, 2, 4))
+
+
+def tag_index(table: str, join: str, key: str) -> list:
+    """
+    Join table `join` (tag_id, `key`) mirroring the JSON tags array of
+    `table`, kept in step by triggers and backfilled from existing rows.
+    tags.<table> counts the rows carrying each tag.
+    """
+    def items(row: str) -> str:
+        return f"json_each(CASE WHEN json_valid({row}.tags) THEN {row}.tags ELSE '[]' END) AS item"
+
+    def add(row: str) -> str:
+        return f"""INSERT OR IGNORE INTO tags (name) SELECT item.value FROM {items(row)}
+                   WHERE item.type = 'text' AND item.value != '';
+                   INSERT OR IGNORE INTO {join} (tag_id, {key})
+                   SELECT tags.id, {row}.id FROM {items(row)} JOIN tags ON tags.name = item.value
+                   WHERE item.type = 'text';"""
+
+    return [
+        f'''CREATE TABLE IF NOT EXISTS {join}
+            (tag_id INTEGER NOT NULL,
+             {key} INTEGER NOT NULL,
+             PRIMARY KEY (tag_id, {key})) WITHOUT ROWID''',
+        f"CREATE INDEX IF NOT EXISTS idx_{join}_{key} ON {join}({key}, tag_id)",
+        f"""CREATE TRIGGER IF NOT EXISTS {join}_count_insert AFTER INSERT ON {join}
+            BEGIN UPDATE tags SET {table} = {table} + 1 WHERE id = NEW.tag_id; END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {join}_count_delete AFTER DELETE ON {join}
+            BEGIN UPDATE tags SET {table} = {table} - 1 WHERE id = OLD.tag_id; END""",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_tags_insert AFTER INSERT ON {table} BEGIN {add('NEW')} END",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_tags_update AFTER UPDATE OF tags ON {table}
+            BEGIN DELETE FROM {join} WHERE {key} = OLD.id; {add('NEW')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_tags_delete AFTER DELETE ON {table}
+            BEGIN DELETE FROM {join} WHERE {key} = OLD.id; END""",
+        f"""INSERT OR IGNORE INTO tags (name) SELECT item.value FROM {table}, {items(table)}
+            WHERE item.type = 'text' AND item.value != ''""",
+        f"""INSERT OR IGNORE INTO {join} (tag_id, {key})
+            SELECT tags.id, {table}.id FROM {table}, {items(table)} JOIN tags ON tags.name = item.value
+            WHERE item.type = 'text'""",
+    ]
+
+
+def partition_activity(conn: sqlite3.Connection):
+    """Move activity_log into per-period tables (see partitions.py)"""
+    # Imported here: partitions builds on this module's feed_triggers
+    from partitions import ActivityStore
+    ActivityStore().migrate(conn)
+
+
+def search_activity(conn: sqlite3.Connection):
+    """FTS indexes for the existing activity partitions (new ones get theirs from partition_schema)"""
+    from partitions import ActivityStore, partition_schema
+    for partition in ActivityStore().partitions(conn):
+        for statement in partition_schema(partition.name):
+            conn.execute(statement)
+        conn.execute(fts_rebuild(partition.name))
+
+
+def chunk_subagent_logs(conn: sqlite3.Connection):
+    """Chunked sub-agent logs (see logs.py); existing stdout/stderr become each stream's first chunks"""
+    import logs
+    conn.execute('''CREATE TABLE IF NOT EXISTS subagent_logs
+                    (id INTEGER PRIMARY KEY,
+                     agent_id TEXT NOT NULL,
+                     stream TEXT NOT NULL,
+                     start INTEGER NOT NULL,
+                     data BLOB NOT NULL)''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_subagent_logs_agent_stream_start ON subagent_logs (agent_id, stream, start)")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(subagents)")}
+    for stream in logs.STREAMS:
+        if f"{stream}_bytes" not in columns:
+            conn.execute(f"ALTER TABLE subagents ADD COLUMN {stream}_bytes INTEGER NOT NULL DEFAULT 0")
+        if stream in columns:
+            for agent_id, text in conn.execute(f"SELECT id, {stream} FROM subagents WHERE {stream} != ''").fetchall():
+                logs.append(conn, agent_id, stream, text.encode("utf-8"))
+            conn.execute(f"UPDATE subagents SET {stream} = NULL WHERE {stream} IS NOT NULL")
+
+
+def analytics_rollups(conn: sqlite3.Connection):
+    """Rollup tables for /stats, backfilled from the existing activity and tasks"""
+    from partitions import ActivityStore
+    from rollups import Rollup
+
+    # migrate_v3.py may already have created analytics_snapshots without the rollup columns
+    conn.execute('''CREATE TABLE IF NOT EXISTS analytics_snapshots
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     date TEXT UNIQUE NOT NULL,
+                     tasks_completed INTEGER DEFAULT 0,
+                     avg_completion_time_ms INTEGER DEFAULT 0,
+                     total_activities INTEGER DEFAULT 0,
+                     agents_active TEXT,
+                     most_active_agent TEXT,
+                     errors_count INTEGER DEFAULT 0,
+                     created_at TEXT)''')
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(analytics_snapshots)")}
+    for column, declaration in (("completion_ms_total", "INTEGER DEFAULT 0"), ("p50_duration_ms", "INTEGER"),
+                                ("p95_duration_ms", "INTEGER"), ("duration_sketch", "BLOB"), ("updated_at", "TEXT")):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE analytics_snapshots ADD COLUMN {column} {declaration}")
+    conn.execute('''CREATE TABLE IF NOT EXISTS analytics_actors
+                    (date TEXT NOT NULL,
+                     actor TEXT NOT NULL,
+                     activities INTEGER DEFAULT 0,
+                     errors_count INTEGER DEFAULT 0,
+                     tasks_completed INTEGER DEFAULT 0,
+                     completion_ms_total INTEGER DEFAULT 0,
+                     duration_sketch BLOB,
+                     PRIMARY KEY (date, actor)) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_analytics_actors_actor_date ON analytics_actors (actor, date)")
+    # Set when a task moves to DONE; for tasks already done the last update is the best guess
+    if "completed_at" not in {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}:
+        conn.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT")
+    conn.execute("UPDATE tasks SET completed_at = updated_at WHERE status = 'DONE' AND completed_at IS NULL")
+    Rollup().rebuild(conn, ActivityStore())
+
+
+
+def scheduler_columns(conn: sqlite3.Connection):
+    """overdue_at, plus the due-date columns tasks tables from before recurring tasks lack"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+    for column, definition in (("due_date", "TEXT"), ("recurring", "INTEGER DEFAULT 0"), ("recurrence", "TEXT"),
+                               ("overdue_at", "TEXT")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+
+
+MIGRATIONS = [
+    (1, "Indexes for activity, task and sub-agent listings", [
+        "CREATE INDEX IF NOT EXISTS idx_activity_timestamp ON activity_log (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_actor_timestamp ON activity_log (actor, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_status_timestamp ON activity_log (status, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)",
+        "CREATE INDEX IF NOT EXISTS idx_subagents_started_at ON subagents (started_at)",
+        "CREATE INDEX IF NOT EXISTS idx_subagents_status_started_at ON subagents (status, started_at)",
+    ]),
+    (2, "Keyset pagination: add the id tie-breaker to listing indexes", [
+        "DROP INDEX IF EXISTS idx_activity_timestamp",
+        "DROP INDEX IF EXISTS idx_activity_actor_timestamp",
+        "DROP INDEX IF EXISTS idx_activity_status_timestamp",
+        "DROP INDEX IF EXISTS idx_subagents_started_at",
+        "DROP INDEX IF EXISTS idx_subagents_status_started_at",
+        "CREATE INDEX IF NOT EXISTS idx_activity_timestamp_id ON activity_log (timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_actor_timestamp_id ON activity_log (actor, timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_status_timestamp_id ON activity_log (status, timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_subagents_started_at_id ON subagents (started_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_subagents_status_started_at_id ON subagents (status, started_at, id)",
+    ]),
+    (3, "Webhook delivery outbox", [
+        '''CREATE TABLE IF NOT EXISTS webhook_outbox
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            webhook_id INTEGER,
+            url TEXT NOT NULL,
+            event TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            delivered_at REAL)''',
+        "CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt ON webhook_outbox (status, next_attempt_at)",
+    ]),
+    (4, "Change feed for /sync", [
+        # entity_id has no declared type so integer and text keys keep their own type
+        '''CREATE TABLE IF NOT EXISTS changes
+           (rev INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id NOT NULL,
+            op TEXT NOT NULL)''',
+        # Keep the newest 100k changes, trimming in steps of 1000
+        '''CREATE TRIGGER IF NOT EXISTS changes_prune AFTER INSERT ON changes
+           WHEN NEW.rev % 1000 = 0
+           BEGIN DELETE FROM changes WHERE rev <= NEW.rev - 100000; END''',
+    ] + feed_triggers("tasks") + feed_triggers("activity_log") + feed_triggers("subagents")),
+    (5, "Partition activity_log by day or week", [
+        partition_activity,
+    ]),
+    (6, "Analytics rollups for /stats", [
+        analytics_rollups,
+    ]),
+    (7, "Latency sketches for /stats/latency", [
+        '''CREATE TABLE IF NOT EXISTS latency_sketches
+           (actor TEXT NOT NULL,
+            action TEXT NOT NULL,
+            resolution INTEGER NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            sketch BLOB,
+            PRIMARY KEY (actor, action, resolution, bucket_start)) WITHOUT ROWID''',
+        "CREATE INDEX IF NOT EXISTS idx_latency_resolution ON latency_sketches(resolution, bucket_start)",
+    ]),
+    (8, "Full-text search indexes for /search", TASKS_FTS + [fts_rebuild("tasks")] + COMPONENTS_FTS + [
+        fts_rebuild("components"),
+        search_activity,
+    ]),
+    (9, "Tag index for ?tag= filters and facets", [
+        '''CREATE TABLE IF NOT EXISTS tags
+           (id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            tasks INTEGER NOT NULL DEFAULT 0,
+            components INTEGER NOT NULL DEFAULT 0)''',
+    ] + tag_index("tasks", "task_tags", "task_id") + tag_index("components", "component_tags", "component_id")),
+    (10, "Chunked append-only sub-agent logs", [
+        chunk_subagent_logs,
+    ]),
+    (11, "Row versions for If-Match updates", [
+        "ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE components ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE subagents ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+    ]),
+    (12, "Index for bulk task operations filtered by assignee", [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_assignee ON tasks(assignee)",
+    ]),
+    (13, "Overdue stamps and due-date index for the scheduler", [
+        scheduler_columns,
+        "CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(due_date) WHERE due_date IS NOT NULL",
+    ]),
+    (14, "Delivery leases for the webhook outbox", [
+        "ALTER TABLE webhook_outbox ADD COLUMN claimed_at REAL",
+        # Claimed before leases existed: let the next poll hand them out again
+        "UPDATE webhook_outbox SET status = 'pending' WHERE status = 'delivering'",
+    ]),
+    (15, "Keep the change feed by age instead of by count", [
+        # sync.prune() records (rev, time) here and drops changes older than the window
+        '''CREATE TABLE IF NOT EXISTS change_marks
+           (rev INTEGER PRIMARY KEY,
+            at REAL NOT NULL)''',
+        "DROP TRIGGER IF EXISTS changes_prune",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection, verbose: bool = False) -> int:
+    """Bring the schema up to SCHEMA_VERSION; returns the number of migrations applied"""
+    version = current_version(conn)
+    applied = 0
+    for target, name, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            # IMMEDIATE, then re-check: with several workers starting at once only one applies each step
+            conn.execute("BEGIN IMMEDIATE")
+            if current_version(conn) >= target:
+                conn.execute("ROLLBACK")
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            # PRAGMA does not accept bound parameters
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        applied += 1
+        if verbose:
+            print(f"✅ v{target}: {name}")
+    return applied
+
+
+def migrate():
+    """Run migrations"""
+    conn = sqlite3.connect(DB_FILE, isolation_level=None)
+    print(f"🔄 Migrating {DB_FILE} from schema v{current_version(conn)} to v{SCHEMA_VERSION}...")
+    try:
+        applied = apply_migrations(conn, verbose=True)
+        print(f"\n✅ Migration complete! ({applied} applied)")
+        return True
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    success = migrate()
+    sys.exit(0 if success else 1)
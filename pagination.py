@@ -0,0 +1,53 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row on a page, JSON-encoded and
+base64url'd so clients treat it as opaque. The next page is fetched with
+a `WHERE (key...) < (?...)` range on an index, so page N costs the same
+as page 1.
+"""
+
+import base64
+import json
+from typing import Callable, List, Optional
+
+from fastapi import HTTPException, Request, Response
+
+
+def encode_cursor(*key) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], *types: type) -> Optional[list]:
+    """
+    Decode a cursor holding one key value per type in `types` (e.g. str, str
+    for timestamp + id), or None when no cursor was given. Anything else is
+    a 400, so a forged cursor never reaches the keyset query.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # bool is an int to isinstance(); it is never a valid key
+    if (not isinstance(key, list) or len(key) != len(types) or
+            any(isinstance(value, bool) or not isinstance(value, kind) for value, kind in zip(key, types))):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def paginate(rows: List, limit: int, key: Callable, request: Request, response: Response) -> List:
+    """
+    Trim the limit+1 rows fetched by a list route to one page and advertise
+    the next page via the X-Next-Cursor and Link headers.
+    """
+    if len(rows) <= limit:
+        return rows
+    rows = rows[:limit]
+    cursor = encode_cursor(*key(rows[-1]))
+    response.headers["X-Next-Cursor"] = cursor
+    response.headers["Link"] = f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
+    return rows
@@ -0,0 +1,262 @@
+"""
+Time-partitioned activity log.
+
+Activity rows live in one table per day or week (activity_YYYYMMDD, named
+after the first day it covers), listed in the activity_partitions registry
+with the [starts, ends) date range each one holds. Inserts are routed by
+timestamp, creating the partition on first use; reads only touch the
+partitions overlapping the requested time range, newest first for the
+listing so a page is usually served by a single partition.
+
+Retention drops whole partitions once they fall out of the window, which
+costs the same whether they hold ten rows or ten million and leaves no
+free-list churn behind a huge DELETE. With an archive directory set, a
+partition is first written out as gzipped NDJSON. On databases created
+with auto_vacuum=INCREMENTAL (new ones are) the freed pages are then handed
+back to the filesystem, so the file shrinks without a full VACUUM.
+
+`activity_log` is kept as a read-only view over the newest VIEW_LIMIT
+partitions for lookups by id, /sync and ad-hoc queries. Dropped partitions
+do not produce change-feed deletes.
+"""
+
+import datetime
+import os
+import re
+import sqlite3
+from itertools import groupby
+from typing import Iterable, List, NamedTuple, Optional
+
+from db import Database
+from export import gzipped, iter_chunks, ndjson_lines
+from migrations import feed_triggers, fts_schema
+from records import ActivityRecord, fetch_records
+
+GRANULARITIES = ("day", "week")
+PARTITION_BY = os.environ.get("HOOKER_ACTIVITY_PARTITION", "week")
+RETENTION_DAYS = int(os.environ.get("HOOKER_ACTIVITY_RETENTION_DAYS", "0"))
+ARCHIVE_DIR = os.environ.get("HOOKER_ACTIVITY_ARCHIVE_DIR") or None
+RETENTION_INTERVAL = float(os.environ.get("HOOKER_ACTIVITY_RETENTION_INTERVAL", "3600"))
+# SQLite's default cap on terms in a compound SELECT
+VIEW_LIMIT = 500
+
+COLUMNS = "id, timestamp, actor, action, status, description, duration_ms, metadata, created_at"
+_NAME = re.compile(r"activity_\d{8}")
+
+
+class Partition(NamedTuple):
+    name: str
+    starts: str
+    ends: str
+
+
+def period(day: datetime.date, granularity: str):
+    """The [start, end) dates of the day or ISO week containing `day`"""
+    if granularity == "day":
+        return day, day + datetime.timedelta(days=1)
+    start = day - datetime.timedelta(days=day.weekday())
+    return start, start + datetime.timedelta(days=7)
+
+
+def partition_schema(name: str) -> List[str]:
+    """Table, listing indexes, change-feed triggers and search index for one partition"""
+    if not _NAME.fullmatch(name):
+        raise ValueError(f"Invalid partition name {name!r}")
+    return [
+        f'''CREATE TABLE IF NOT EXISTS {name}
+            (id TEXT PRIMARY KEY,
+             timestamp TEXT NOT NULL,
+             actor TEXT NOT NULL,
+             action TEXT NOT NULL,
+             status TEXT DEFAULT 'pending',
+             description TEXT,
+             duration_ms INTEGER DEFAULT 0,
+             metadata TEXT,
+             created_at TEXT)''',
+        f"CREATE INDEX IF NOT EXISTS {name}_timestamp_id ON {name} (timestamp, id)",
+        f"CREATE INDEX IF NOT EXISTS {name}_actor_timestamp_id ON {name} (actor, timestamp, id)",
+        f"CREATE INDEX IF NOT EXISTS {name}_status_timestamp_id ON {name} (status, timestamp, id)",
+    ] + feed_triggers(name, entity="activity_log") + activity_fts(name)
+
+
+def activity_fts(name: str) -> List[str]:
+    """The /search index of one partition"""
+    return fts_schema(name, ("description", "actor", "action"), ("id", "timestamp"), weights=(1, 4, 2))
+
+
+class ActivityStore:
+    """Routes activity_log reads and writes to per-period tables"""
+
+    def __init__(self, granularity: str = PARTITION_BY, retention_days: int = RETENTION_DAYS,
+                 archive_dir: Optional[str] = ARCHIVE_DIR, observers=()):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Activity partitions must be one of {GRANULARITIES}, not {granularity!r}")
+        self.granularity = granularity
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        # Objects with batch() (rollups.Rollup, latency.LatencyTracker) fed every inserted row
+        self.observers = list(observers)
+
+    # --- Routing ---
+
+    def partitions(self, conn: sqlite3.Connection, since: Optional[str] = None, until: Optional[str] = None,
+                   newest_first: bool = False) -> List[Partition]:
+        """Partitions overlapping [since, until) (ISO dates or timestamps, either may be open)"""
+        query = "SELECT name, starts, ends FROM activity_partitions WHERE 1=1"
+        params = []
+        if until:
+            query += " AND starts < ?"
+            params.append(until)
+        if since:
+            query += " AND ends > ?"
+            params.append(since)
+        query += " ORDER BY starts DESC" if newest_first else " ORDER BY starts"
+        return [Partition(*row) for row in conn.execute(query, params).fetchall()]
+
+    def select(self, conn: sqlite3.Connection, record_class, conditions: List[str], params: list, limit: int,
+               since: Optional[str] = None, until: Optional[str] = None, newest_first: bool = True) -> list:
+        """
+        Up to `limit` records matching `conditions`, ordered by (timestamp, id),
+        walking the partitions in time order and stopping once the page is
+        full. Run inside one read transaction for a consistent page.
+        """
+        direction = "DESC" if newest_first else "ASC"
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        found = []
+        for partition in self.partitions(conn, since, until, newest_first):
+            query = (f"SELECT {record_class.COLUMNS} FROM {partition.name}{where} "
+                     f"ORDER BY timestamp {direction}, id {direction} LIMIT ?")
+            found.extend(fetch_records(conn, record_class, query, [*params, limit - len(found)]))
+            if len(found) >= limit:
+                break
+        return found
+
+    # --- Writes (writer connection) ---
+
+    def partition_for(self, conn: sqlite3.Connection, day: str) -> Optional[Partition]:
+        """The existing partition holding `day` (YYYY-MM-DD), if any"""
+        row = conn.execute("SELECT name, starts, ends FROM activity_partitions WHERE starts <= ? AND ends > ? "
+                           "ORDER BY starts DESC LIMIT 1", (day, day)).fetchone()
+        return Partition(*row) if row else None
+
+    def create_partition(self, conn: sqlite3.Connection, day: str) -> Partition:
+        """
+        Create the partition for `day`. Its range is the configured period,
+        clipped to its neighbours so partitions never overlap even after the
+        granularity changes.
+        """
+        start, end = (d.isoformat() for d in period(datetime.date.fromisoformat(day), self.granularity))
+        before = conn.execute("SELECT MAX(ends) FROM activity_partitions WHERE starts <= ?", (day,)).fetchone()[0]
+        after = conn.execute("SELECT MIN(starts) FROM activity_partitions WHERE starts > ?", (day,)).fetchone()[0]
+        if before and before > start:
+            start = before
+        if after and after < end:
+            end = after
+        partition = Partition("activity_" + start.replace("-", ""), start, end)
+        for statement in partition_schema(partition.name):
+            conn.execute(statement)
+        conn.execute("INSERT INTO activity_partitions (name, starts, ends) VALUES (?, ?, ?)", partition)
+        return partition
+
+    def insert(self, conn: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+        """
+        Insert activity rows (COLUMNS order) into their partitions; `rows` may
+        be a generator and is consumed lazily, one run of same-day rows per
+        executemany. Returns the number of rows inserted.
+        """
+        count = 0
+        created = False
+        batches = [observer.batch() for observer in self.observers]
+        for day, group in groupby(rows, key=lambda row: row[1][:10]):
+            partition = self.partition_for(conn, day)
+            if partition is None:
+                partition = self.create_partition(conn, day)
+                created = True
+            for batch in batches:
+                group = batch.observe(group)
+            cursor = conn.executemany(f"INSERT INTO {partition.name} ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                      group)
+            count += cursor.rowcount
+        if created:
+            self.rebuild_view(conn)
+        for batch in batches:
+            batch.commit()
+        return count
+
+    def rebuild_view(self, conn: sqlite3.Connection):
+        """Point the activity_log view at the newest VIEW_LIMIT partitions"""
+        names = [row[0] for row in conn.execute("SELECT name FROM activity_partitions ORDER BY starts DESC LIMIT ?",
+                                                (VIEW_LIMIT,))]
+        if names:
+            body = " UNION ALL ".join(f"SELECT {COLUMNS} FROM {name}" for name in reversed(names))
+        else:
+            body = "SELECT " + ", ".join(f"NULL AS {column}" for column in COLUMNS.split(", ")) + " WHERE 0"
+        conn.execute("DROP VIEW IF EXISTS activity_log")
+        conn.execute(f"CREATE VIEW activity_log AS {body}")
+
+    def migrate(self, conn: sqlite3.Connection):
+        """Move the rows of the old activity_log table into partitions and replace it with the view"""
+        conn.execute('''CREATE TABLE IF NOT EXISTS activity_partitions
+                        (name TEXT PRIMARY KEY,
+                         starts TEXT NOT NULL UNIQUE,
+                         ends TEXT NOT NULL)''')
+        days = [row[0] for row in conn.execute("SELECT DISTINCT substr(timestamp, 1, 10) FROM activity_log ORDER BY 1")]
+        for day in days:
+            if self.partition_for(conn, day) is None:
+                self.create_partition(conn, day)
+        for partition in self.partitions(conn):
+            conn.execute(f"INSERT INTO {partition.name} ({COLUMNS}) SELECT {COLUMNS} FROM activity_log "
+                         "WHERE timestamp >= ? AND timestamp < ?", (partition.starts, partition.ends))
+        conn.execute("DROP TABLE activity_log")
+        self.rebuild_view(conn)
+
+    # --- Retention ---
+
+    def expired(self, conn: sqlite3.Connection, today: Optional[datetime.date] = None) -> List[Partition]:
+        """Partitions ending before the retention window"""
+        if self.retention_days <= 0:
+            return []
+        today = today or datetime.datetime.utcnow().date()
+        cutoff = (today - datetime.timedelta(days=self.retention_days)).isoformat()
+        return [partition for partition in self.partitions(conn) if partition.ends <= cutoff]
+
+    def drop(self, conn: sqlite3.Connection, name: str):
+        conn.execute("DELETE FROM activity_partitions WHERE name = ?", (name,))
+        conn.execute(f"DROP TABLE IF EXISTS {name}_fts")
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        self.rebuild_view(conn)
+
+    def archive(self, db: Database, partition: Partition) -> str:
+        """Write a partition to <archive_dir>/<name>.ndjson.gz; returns the path"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{partition.name}.ndjson.gz")
+        chunks = iter_chunks(db, ActivityRecord, partition.name, ("timestamp", "id"), [], [])
+        with open(path + ".tmp", "wb") as f:
+            for data in gzipped(ndjson_lines(chunks)):
+                f.write(data)
+        os.replace(path + ".tmp", path)
+        return path
+
+    def enforce_retention(self, db: Database, today: Optional[datetime.date] = None) -> List[str]:
+        """Archive (if configured) and drop expired partitions, then compact; returns their names"""
+        with db.reader() as conn:
+            expired = self.expired(conn, today)
+        for partition in expired:
+            if self.archive_dir:
+                self.archive(db, partition)
+            with db.writer() as conn:
+                self.drop(conn, partition.name)
+        if expired:
+            with db.writer() as conn:
+                # A no-op unless auto_vacuum is INCREMENTAL. executescript steps the
+                # pragma to completion; execute() would free a single page.
+                conn.executescript("PRAGMA incremental_vacuum")
+        return [partition.name for partition in expired]
+
+    def stats(self, conn: sqlite3.Connection) -> dict:
+        return {
+            "granularity": self.granularity,
+            "retention_days": self.retention_days,
+            "archive_dir": self.archive_dir,
+            "partitions": [partition._asdict() for partition in self.partitions(conn, newest_first=True)],
+        }
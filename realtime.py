@@ -0,0 +1,224 @@
+"""
+WebSocket fan-out for real-time dashboard updates.
+
+Each connected client gets a bounded send queue drained by its own writer
+task, so broadcast() never waits on a socket: it serializes the message
+once and appends the same string to every queue. When a client falls
+behind, SLOW_CONSUMER_POLICY decides what happens:
+
+    drop_oldest  discard the oldest queued message (default)
+    coalesce     replace the backlog with a single {"type": "resync"} notice
+                 telling the client to refetch
+    disconnect   close the socket with 1013 (try again later)
+
+Sockets whose send fails are removed automatically.
+
+Clients start subscribed to "*" (everything). Sending
+
+    {"action": "subscribe", "topics": ["actor:Morty", "status:error"]}
+
+narrows the feed to messages tagged with any of those topics;
+"unsubscribe" removes topics and re-subscribing to "*" restores the full
+feed. Messages are tagged by topics_for(): type:<type>, actor:<actor>,
+status:<status> and, for sub-agent events, subagent:<id>.
+"""
+
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+QUEUE_SIZE = int(os.environ.get("HOOKER_WS_QUEUE", "256"))
+SLOW_CONSUMER_POLICY = os.environ.get("HOOKER_WS_SLOW_POLICY", "drop_oldest")
+POLICIES = ("drop_oldest", "coalesce", "disconnect")
+ALL_TOPICS = "*"
+MAX_TOPICS_PER_CLIENT = 100
+
+
+def topics_for(message: dict) -> Set[str]:
+    """Topics a broadcast message is routed by"""
+    kind = message.get("type", "")
+    data = message.get("data")
+    items = data if isinstance(data, list) else [data] if isinstance(data, dict) else []
+    topics = {f"type:{kind}"}
+    for item in items:
+        if kind.startswith("subagent") and item.get("id"):
+            topics.add(f"subagent:{item['id']}")
+        if item.get("actor"):
+            topics.add(f"actor:{item['actor']}")
+        if item.get("status"):
+            topics.add(f"status:{item['status']}")
+    return topics
+
+
+class _Client:
+    __slots__ = ("websocket", "queue", "ready", "task", "dropped", "topics")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: deque = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.topics: Set[str] = set()
+
+
+class ConnectionManager:
+    """Tracks connected dashboards and fans messages out to them"""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, policy: str = SLOW_CONSUMER_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy {policy!r}, expected one of {POLICIES}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.clients: Dict[WebSocket, _Client] = {}
+        self.subscribers: Dict[str, Set[_Client]] = {}
+        self.sent = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    @property
+    def active_connections(self):
+        return set(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self.attach(websocket)
+
+    def attach(self, websocket: WebSocket):
+        """Start fan-out to an already-accepted socket"""
+        client = _Client(websocket)
+        client.task = asyncio.create_task(self._writer(client))
+        self.clients[websocket] = client
+        self._subscribe(client, [ALL_TOPICS])
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            self._unsubscribe(client, list(client.topics))
+            if client.task is not None:
+                client.task.cancel()
+
+    # --- Topic index ---
+    def _subscribe(self, client: _Client, topics: Iterable[str]):
+        for topic in topics:
+            if topic not in client.topics:
+                client.topics.add(topic)
+                self.subscribers.setdefault(topic, set()).add(client)
+
+    def _unsubscribe(self, client: _Client, topics: Iterable[str]):
+        for topic in topics:
+            client.topics.discard(topic)
+            members = self.subscribers.get(topic)
+            if members is not None:
+                members.discard(client)
+                if not members:
+                    del self.subscribers[topic]
+
+    def handle_frame(self, websocket: WebSocket, text: str):
+        """Apply a subscribe/unsubscribe frame from a client; anything else is a keep-alive"""
+        client = self.clients.get(websocket)
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            return
+        if client is None or not isinstance(frame, dict) or frame.get("action") not in ("subscribe", "unsubscribe"):
+            return
+        topics = frame.get("topics")
+        if not isinstance(topics, list) or not all(isinstance(t, str) for t in topics):
+            self._offer(client, json.dumps({"type": "error", "detail": "topics must be a list of strings"}))
+            return
+
+        if frame["action"] == "subscribe":
+            # Subscribing to specific topics leaves the "*" firehose
+            keep = client.topics if ALL_TOPICS in topics else client.topics - {ALL_TOPICS}
+            if len(keep | set(topics)) > MAX_TOPICS_PER_CLIENT:
+                self._offer(client, json.dumps({"type": "error", "detail": f"at most {MAX_TOPICS_PER_CLIENT} topics"}))
+                return
+            if ALL_TOPICS not in topics:
+                self._unsubscribe(client, [ALL_TOPICS])
+            self._subscribe(client, topics)
+        else:
+            self._unsubscribe(client, topics)
+        self._offer(client, json.dumps({"type": "subscribed", "topics": sorted(client.topics)}))
+
+    def publish(self, message: dict, topics: Optional[Set[str]] = None) -> int:
+        """
+        Queue `message` for every client subscribed to one of its topics
+        (or to "*") without waiting; returns the number of recipients.
+        """
+        if topics is None:
+            topics = topics_for(message)
+        recipients = set(self.subscribers.get(ALL_TOPICS, ()))
+        for topic in topics:
+            members = self.subscribers.get(topic)
+            if members:
+                recipients |= members
+        if not recipients:
+            return 0
+        text = json.dumps(message)
+        for client in recipients:
+            self._offer(client, text)
+        return len(recipients)
+
+    async def broadcast(self, message: dict):
+        self.publish(message)
+
+    def _offer(self, client: _Client, text: str):
+        if len(client.queue) >= self.queue_size:
+            client.dropped += 1
+            self.dropped += 1
+            if self.policy == "disconnect":
+                self._evict(client)
+                return
+            if self.policy == "coalesce":
+                client.queue.clear()
+                client.queue.append(json.dumps({"type": "resync", "dropped": client.dropped}))
+            else:
+                client.queue.popleft()
+        client.queue.append(text)
+        client.ready.set()
+
+    def _evict(self, client: _Client):
+        self.evicted += 1
+        self.disconnect(client.websocket)
+        asyncio.create_task(self._close(client.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def _writer(self, client: _Client):
+        try:
+            while True:
+                if not client.queue:
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+                await client.websocket.send_text(client.queue.popleft())
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead or closed socket: stop tracking it
+            if self.clients.get(client.websocket) is client:
+                del self.clients[client.websocket]
+                self._unsubscribe(client, list(client.topics))
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "topics": len(self.subscribers),
+            "queued": sum(len(c.queue) for c in self.clients.values()),
+            "queue_size": self.queue_size,
+            "policy": self.policy,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+        }
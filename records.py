@@ -0,0 +1,205 @@
+"""
+Compact row records and a pre-rendered JSON path for the hot list routes.
+
+Instead of sqlite3.Row -> dict -> json.loads -> pydantic -> JSON, list
+routes select straight into __slots__ dataclasses via a cursor row_factory
+and render the page with orjson in one pass. Columns that already hold
+JSON text (tags, metadata) are never parsed: SQLite checks them with
+json_valid() and they are spliced into the output as-is. orjson skips
+underscore-prefixed dataclass fields, which is where that raw JSON lives.
+
+project() derives a record class holding a subset of the fields, for the
+?fields= parameter: its COLUMNS selects only those columns, so unwanted
+data is never read from the table.
+"""
+
+from dataclasses import dataclass, fields, make_dataclass
+from functools import lru_cache
+from operator import attrgetter
+from typing import Callable, ClassVar, FrozenSet, Iterable, List, Optional, Tuple
+
+import orjson
+from fastapi import Response
+
+
+def _json_column(name: str, empty: str) -> str:
+    """Select a JSON text column as bytes, replacing NULL or malformed values with `empty`"""
+    return f"CAST(CASE WHEN json_valid({name}) THEN {name} ELSE '{empty}' END AS BLOB)"
+
+
+@dataclass(slots=True)
+class TaskRecord:
+    COLUMNS: ClassVar[str] = ("id, title, description, status, assignee, priority, due_date, recurrence, "
+                              "created_at, updated_at, overdue_at, version, " + _json_column("tags", "[]") +
+                              ", CAST(CASE WHEN recurring THEN 'true' ELSE 'false' END AS BLOB)")
+    id: int
+    title: str
+    description: Optional[str]
+    status: str
+    assignee: Optional[str]
+    priority: str
+    due_date: Optional[str]
+    recurrence: Optional[str]
+    created_at: str
+    updated_at: str
+    overdue_at: Optional[str]
+    version: int
+    _tags: bytes
+    _recurring: bytes
+
+
+@dataclass(slots=True)
+class ComponentRecord:
+    COLUMNS: ClassVar[str] = ("id, part_number, description, stock, datasheet_url, created_at, version, " +
+                              _json_column("tags", "[]"))
+    id: int
+    part_number: str
+    description: Optional[str]
+    stock: int
+    datasheet_url: Optional[str]
+    created_at: str
+    version: int
+    _tags: bytes
+
+
+@dataclass(slots=True)
+class ActivityRecord:
+    COLUMNS: ClassVar[str] = ("id, timestamp, actor, action, status, description, duration_ms, " +
+                              _json_column("metadata", "{}"))
+    id: str
+    timestamp: str
+    actor: str
+    action: str
+    status: str
+    description: Optional[str]
+    duration_ms: int
+    _metadata: bytes
+
+
+@dataclass(slots=True)
+class SubAgentRecord:
+    COLUMNS: ClassVar[str] = "id, name, status, started_at, completed_at, stdout_bytes, stderr_bytes, created_at, version"
+    id: str
+    name: str
+    status: str
+    started_at: str
+    completed_at: Optional[str]
+    stdout_bytes: int
+    stderr_bytes: int
+    created_at: str
+    version: int
+
+
+def field_names(record_class) -> List[str]:
+    """The JSON names of a record's fields, in output order"""
+    return [f.name.lstrip("_") for f in fields(record_class)]
+
+
+def _split_columns(columns: str) -> List[str]:
+    """COLUMNS split at its top-level commas, one SQL expression per field"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(columns):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(columns[start:i].strip())
+            start = i + 1
+    parts.append(columns[start:].strip())
+    return parts
+
+
+@lru_cache(maxsize=256)
+def _project(record_class, names: FrozenSet[str]):
+    chosen = [(f, column) for f, column in zip(fields(record_class), _split_columns(record_class.COLUMNS))
+              if f.name.lstrip("_") in names]
+    projected = make_dataclass(f"{record_class.__name__}Projection", [(f.name, f.type) for f, _ in chosen], slots=True)
+    projected.COLUMNS = ", ".join(column for _, column in chosen)
+    return projected
+
+
+def project(record_class, names: Iterable[str]):
+    """
+    A record class with only the fields in `names` (JSON names, so "tags"
+    for _tags), in record_class order. Raises ValueError on unknown names.
+    """
+    names = frozenset(names)
+    known = field_names(record_class)
+    unknown = names.difference(known)
+    if unknown:
+        raise ValueError(f"Unknown field(s) {', '.join(sorted(unknown))}; choose from {', '.join(known)}")
+    if names.issuperset(known):
+        return record_class
+    return _project(record_class, names)
+
+
+def row_factory(record_class):
+    """A cursor row_factory building `record_class` from a SELECT of its COLUMNS"""
+    def build(cursor, row):
+        return record_class(*row)
+    return build
+
+
+def fetch_records(conn, record_class, query: str, params=()) -> list:
+    """Run a SELECT of record_class.COLUMNS and return the rows as records"""
+    cursor = conn.cursor()
+    cursor.row_factory = row_factory(record_class)
+    return cursor.execute(query, params).fetchall()
+
+
+def _splice_template(record_class) -> Tuple[Optional[bytes], Optional[Callable]]:
+    """A %-template appending each raw-JSON field to the dumped object, and a getter for those fields"""
+    raw = [f.name for f in fields(record_class) if f.name.startswith("_")]
+    if not raw:
+        return None, None
+    getter = attrgetter(*raw)
+    if len(raw) == 1:
+        # attrgetter returns a bare value for a single name
+        single = getter
+        getter = lambda record: (single(record),)  # noqa: E731
+    template = b"%b" + b"".join(f',"{name[1:]}":%b'.encode() for name in raw) + b"}"
+    return template, getter
+
+
+_TEMPLATES = {cls: _splice_template(cls) for cls in (TaskRecord, ComponentRecord, ActivityRecord, SubAgentRecord)}
+
+
+def _template(record_class) -> Tuple[Optional[bytes], Optional[Callable]]:
+    template = _TEMPLATES.get(record_class)
+    if template is None:
+        # A projected record class, seen for the first time
+        template = _TEMPLATES[record_class] = _splice_template(record_class)
+    return template
+
+
+def _rendered(records: List) -> List[bytes]:
+    """Each record as a JSON object, raw JSON fields spliced in"""
+    template, getter = _template(type(records[0]))
+    dumps = orjson.dumps
+    if template is None:
+        return [dumps(record) for record in records]
+    return [template % (dumps(record)[:-1], *getter(record)) for record in records]
+
+
+def render(records: List) -> bytes:
+    """JSON array of records"""
+    if not records:
+        return b"[]"
+    if _template(type(records[0]))[0] is None:
+        return orjson.dumps(records)
+    return b"[" + b",".join(_rendered(records)) + b"]"
+
+
+def render_lines(records: List) -> bytes:
+    """Newline-delimited JSON, one record per line"""
+    if not records:
+        return b""
+    return b"\n".join(_rendered(records)) + b"\n"
+
+
+def json_response(body: bytes, response: Optional[Response] = None) -> Response:
+    """A pre-rendered JSON response carrying any headers the route set on `response`"""
+    headers = dict(response.headers) if response is not None else {}
+    headers.pop("content-length", None)
+    return Response(content=body, media_type="application/json", headers=headers)
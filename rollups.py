@@ -0,0 +1,316 @@
+"""
+Incremental analytics rollups behind GET /stats.
+
+Every activity insert and every task moving to DONE is folded into
+in-memory deltas keyed by (day, actor); a background worker flushes them
+every FLUSH_SECONDS into two small tables:
+
+  analytics_actors     one row per (date, actor): activity and error counts,
+                       tasks completed by that assignee, and a duration_ms
+                       sketch (see sketches.py)
+  analytics_snapshots  one row per date: the same totals across actors,
+                       average task completion time, p50/p95 duration_ms,
+                       active agents and the most active one
+
+Flushes add to the stored counters and merge the sketches, so /stats reads
+a row per day (per day and actor for the leaderboard) however large the
+raw history is. Deltas not yet flushed are not visible; rebuild()
+recomputes everything from the raw tables.
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import orjson
+
+from db import Database
+from sketches import DDSketch
+
+FLUSH_SECONDS = float(os.environ.get("HOOKER_ROLLUP_INTERVAL", "5"))
+COMPLETED_STATUS = "DONE"
+ERROR_STATUS = "error"
+
+
+class _Counts:
+    __slots__ = ("activities", "errors", "tasks_completed", "completion_ms", "sketch")
+
+    def __init__(self):
+        self.activities = 0
+        self.errors = 0
+        self.tasks_completed = 0
+        self.completion_ms = 0
+        self.sketch = DDSketch()
+
+    def merge(self, other: "_Counts"):
+        self.activities += other.activities
+        self.errors += other.errors
+        self.tasks_completed += other.tasks_completed
+        self.completion_ms += other.completion_ms
+        self.sketch.merge(other.sketch)
+
+
+def _merge_into(target: Dict, deltas: Dict):
+    for key, counts in deltas.items():
+        if key in target:
+            target[key].merge(counts)
+        else:
+            target[key] = counts
+
+
+def bucket_start(day: str, bucket: str) -> str:
+    """First day of the day/week/month bucket holding `day` (YYYY-MM-DD)"""
+    if bucket == "day":
+        return day
+    date = datetime.date.fromisoformat(day)
+    if bucket == "week":
+        return (date - datetime.timedelta(days=date.weekday())).isoformat()
+    return date.replace(day=1).isoformat()
+
+
+def completion_ms(created_at: Optional[str], completed_at: str) -> int:
+    try:
+        elapsed = datetime.datetime.fromisoformat(completed_at) - datetime.datetime.fromisoformat(created_at)
+    except (TypeError, ValueError):
+        return 0
+    return max(0, int(elapsed.total_seconds() * 1000))
+
+
+def _count_completion(tasks: Dict, deltas: Dict, created_at: Optional[str], completed_at: str,
+                      assignee: Optional[str]):
+    """Add one completed task to the day totals and, when assigned, to its assignee's row"""
+    day = completed_at[:10]
+    elapsed = completion_ms(created_at, completed_at)
+    targets = [(tasks, day)] + ([(deltas, (day, assignee))] if assignee else [])
+    for target, key in targets:
+        counts = target.setdefault(key, _Counts())
+        counts.tasks_completed += 1
+        counts.completion_ms += elapsed
+
+
+class RollupBatch:
+    """Deltas from one insert; folded into the rollup by commit() once the rows are written"""
+
+    def __init__(self, rollup: "Rollup"):
+        self.rollup = rollup
+        self.deltas: Dict[Tuple[str, str], _Counts] = {}
+
+    def add(self, day: str, actor: str, status: str, duration_ms: Optional[int], count: int = 1):
+        counts = self.deltas.get((day, actor))
+        if counts is None:
+            counts = self.deltas[(day, actor)] = _Counts()
+        counts.activities += count
+        if status == ERROR_STATUS:
+            counts.errors += count
+        counts.sketch.add(duration_ms or 0, count)
+
+    def observe(self, rows: Iterable[tuple]) -> Iterator[tuple]:
+        """Pass activity rows (partitions.COLUMNS order) through, counting each one"""
+        for row in rows:
+            self.add(row[1][:10], row[2], row[4], row[6])
+            yield row
+
+    def commit(self):
+        self.rollup.merge(self.deltas)
+        self.deltas = {}
+
+
+class Rollup:
+    """In-memory deltas plus the flush into analytics_actors / analytics_snapshots"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], _Counts] = {}
+        # Task completions per day, assigned or not
+        self._tasks: Dict[str, _Counts] = {}
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    def batch(self) -> RollupBatch:
+        return RollupBatch(self)
+
+    def merge(self, deltas: Dict[Tuple[str, str], _Counts], tasks: Optional[Dict[str, _Counts]] = None):
+        with self._lock:
+            _merge_into(self._pending, deltas)
+            if tasks:
+                _merge_into(self._tasks, tasks)
+
+    def task_completed(self, task: dict):
+        """Count a task that just moved to DONE (call after the update committed)"""
+        deltas, tasks = {}, {}
+        _count_completion(tasks, deltas, task.get("created_at"), task["completed_at"], task.get("assignee"))
+        self.merge(deltas, tasks)
+
+    # --- Writes ---
+
+    def flush(self, db: Database) -> int:
+        """Write pending deltas; returns the number of (day, actor) rows touched"""
+        with self._lock:
+            pending, tasks = self._pending, self._tasks
+            self._pending, self._tasks = {}, {}
+        if not pending and not tasks:
+            return 0
+        start = time.perf_counter()
+        try:
+            with db.writer() as conn:
+                # Read-modify-write of the sketches: take the write lock up front
+                conn.execute("BEGIN IMMEDIATE")
+                self._write(conn, pending, tasks)
+        except Exception:
+            # Keep the deltas for the next flush
+            self.merge(pending, tasks)
+            raise
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        return len(pending)
+
+    def _write(self, conn: sqlite3.Connection, pending: Dict, tasks: Dict):
+        now = datetime.datetime.utcnow().isoformat()
+        for (day, actor), counts in pending.items():
+            row = conn.execute("SELECT duration_sketch FROM analytics_actors WHERE date = ? AND actor = ?",
+                               (day, actor)).fetchone()
+            sketch = DDSketch.from_bytes(row[0] if row else None).merge(counts.sketch)
+            conn.execute("""INSERT INTO analytics_actors
+                            (date, actor, activities, errors_count, tasks_completed, completion_ms_total, duration_sketch)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (date, actor) DO UPDATE SET
+                              activities = activities + excluded.activities,
+                              errors_count = errors_count + excluded.errors_count,
+                              tasks_completed = tasks_completed + excluded.tasks_completed,
+                              completion_ms_total = completion_ms_total + excluded.completion_ms_total,
+                              duration_sketch = excluded.duration_sketch""",
+                         (day, actor, counts.activities, counts.errors, counts.tasks_completed, counts.completion_ms,
+                          sketch.to_bytes()))
+        for day, counts in tasks.items():
+            conn.execute("""INSERT INTO analytics_snapshots (date, tasks_completed, completion_ms_total, created_at)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT (date) DO UPDATE SET
+                              tasks_completed = tasks_completed + excluded.tasks_completed,
+                              completion_ms_total = completion_ms_total + excluded.completion_ms_total""",
+                         (day, counts.tasks_completed, counts.completion_ms, now))
+        for day in sorted({day for day, _ in pending} | set(tasks)):
+            self._refresh_day(conn, day, now)
+
+    def _refresh_day(self, conn: sqlite3.Connection, day: str, now: str):
+        """Recompute a day's activity totals from its (few) analytics_actors rows"""
+        rows = conn.execute("SELECT actor, activities, errors_count, duration_sketch FROM analytics_actors WHERE date = ?",
+                            (day,)).fetchall()
+        rows.sort(key=lambda row: (-row[1], row[0]))
+        sketch = DDSketch()
+        for row in rows:
+            sketch.merge(DDSketch.from_bytes(row[3]))
+        active = [row[0] for row in rows if row[1]]
+        p50, p95 = sketch.quantile(0.5), sketch.quantile(0.95)
+        conn.execute("""INSERT INTO analytics_snapshots
+                        (date, total_activities, errors_count, agents_active, most_active_agent,
+                         p50_duration_ms, p95_duration_ms, duration_sketch, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (date) DO UPDATE SET
+                          total_activities = excluded.total_activities,
+                          errors_count = excluded.errors_count,
+                          agents_active = excluded.agents_active,
+                          most_active_agent = excluded.most_active_agent,
+                          p50_duration_ms = excluded.p50_duration_ms,
+                          p95_duration_ms = excluded.p95_duration_ms,
+                          duration_sketch = excluded.duration_sketch,
+                          updated_at = excluded.updated_at""",
+                     (day, sum(row[1] for row in rows), sum(row[2] for row in rows), orjson.dumps(active).decode(),
+                      active[0] if active else None, None if p50 is None else round(p50),
+                      None if p95 is None else round(p95), sketch.to_bytes(), now, now))
+        conn.execute("""UPDATE analytics_snapshots
+                        SET avg_completion_time_ms = CASE WHEN tasks_completed THEN completion_ms_total / tasks_completed
+                                                          ELSE 0 END
+                        WHERE date = ?""", (day,))
+
+    def rebuild(self, conn: sqlite3.Connection, store):
+        """
+        Recompute both tables from the activity partitions and DONE tasks.
+        Tasks deleted after completion are no longer counted.
+        """
+        batch = self.batch()
+        for partition in store.partitions(conn):
+            # Identical (actor, status, duration) rows collapse into one counted sketch entry
+            for day, actor, status, duration_ms, count in conn.execute(
+                    f"""SELECT substr(timestamp, 1, 10), actor, status, duration_ms, COUNT(*) FROM {partition.name}
+                        GROUP BY 1, 2, 3, 4"""):
+                batch.add(day, actor, status, duration_ms, count)
+        tasks: Dict[str, _Counts] = {}
+        for created_at, completed_at, assignee in conn.execute(
+                "SELECT created_at, completed_at, assignee FROM tasks WHERE status = ? AND completed_at IS NOT NULL",
+                (COMPLETED_STATUS,)):
+            _count_completion(tasks, batch.deltas, created_at, completed_at, assignee)
+        conn.execute("DELETE FROM analytics_actors")
+        conn.execute("DELETE FROM analytics_snapshots")
+        self._write(conn, batch.deltas, tasks)
+
+    # --- Reads ---
+
+    def query(self, conn: sqlite3.Connection, since: str, until: str, bucket: str = "day",
+              actor: Optional[str] = None) -> dict:
+        """Aggregates per bucket over dates [since, until), plus totals for the whole range"""
+        if actor:
+            rows = conn.execute("""SELECT date, activities, errors_count, tasks_completed, completion_ms_total,
+                                          duration_sketch FROM analytics_actors
+                                   WHERE actor = ? AND date >= ? AND date < ? ORDER BY date""",
+                                (actor, since, until)).fetchall()
+            leaders = [(row[0], actor, row[1]) for row in rows]
+        else:
+            rows = conn.execute("""SELECT date, total_activities, errors_count, tasks_completed, completion_ms_total,
+                                          duration_sketch FROM analytics_snapshots
+                                   WHERE date >= ? AND date < ? ORDER BY date""", (since, until)).fetchall()
+            leaders = conn.execute("SELECT date, actor, activities FROM analytics_actors WHERE date >= ? AND date < ?",
+                                   (since, until)).fetchall()
+
+        buckets: Dict[str, dict] = {}
+        total = {"counts": _Counts(), "actors": {}}
+        for date, activities, errors, completed, completion_total, sketch in rows:
+            key = bucket_start(date, bucket)
+            if key not in buckets:
+                buckets[key] = {"counts": _Counts(), "actors": {}}
+            for target in (buckets[key], total):
+                counts = target["counts"]
+                counts.activities += activities or 0
+                counts.errors += errors or 0
+                counts.tasks_completed += completed or 0
+                counts.completion_ms += completion_total or 0
+                counts.sketch.merge(DDSketch.from_bytes(sketch))
+        for date, name, activities in leaders:
+            key = bucket_start(date, bucket)
+            for target in (buckets.get(key), total):
+                if target is not None and activities:
+                    target["actors"][name] = target["actors"].get(name, 0) + activities
+
+        return {
+            "bucket": bucket,
+            "since": since,
+            "until": until,
+            "actor": actor,
+            "buckets": [{"start": key, **_summary(value)} for key, value in buckets.items()],
+            "totals": _summary(total),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending) + len(self._tasks),
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
+
+
+def _summary(bucket: dict) -> dict:
+    counts: _Counts = bucket["counts"]
+    actors: Dict[str, int] = bucket["actors"]
+    p50, p95 = counts.sketch.quantile(0.5), counts.sketch.quantile(0.95)
+    return {
+        "tasks_completed": counts.tasks_completed,
+        "avg_completion_time_ms": counts.completion_ms // counts.tasks_completed if counts.tasks_completed else 0,
+        "total_activities": counts.activities,
+        "errors_count": counts.errors,
+        "p50_duration_ms": None if p50 is None else round(p50),
+        "p95_duration_ms": None if p95 is None else round(p95),
+        "agents_active": len(actors),
+        "most_active_agent": min(actors, key=lambda name: (-actors[name], name)) if actors else None,
+    }
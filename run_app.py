@@ -1,7 +1,17 @@
+import os
+
 import uvicorn
-from backend import app
+
+# More than one worker shares WebSocket and cache events over the Unix-socket bus (broadcast.py)
+WORKERS = int(os.environ.get("HOOKER_WORKERS", "1"))
 
 if __name__ == "__main__":
     print("🚀 Starting Hooker on http://localhost:8000")
     print("📊 Kanban Dashboard: http://localhost:8000/static/index.html")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if WORKERS > 1:
+        print(f"👷 {WORKERS} workers")
+        os.environ["HOOKER_BROADCAST"] = "unix"
+        uvicorn.run("backend:app", host="0.0.0.0", port=8000, workers=WORKERS)
+    else:
+        from backend import app
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,309 @@
+"""
+Due dates and recurring tasks.
+
+Every task with a due_date that still needs action sits in a min-heap
+keyed on its fire time:
+- the due date's end for a date ("2026-03-01" fires at midnight after it)
+- the due time itself for a timestamp
+
+One background task sleeps until the earliest entry. When it wakes, it
+handles every due task in one write transaction, up to BATCH_SIZE
+of them:
+
+  recurring  the next occurrence is created as a new TODO task with the
+             due date moved forward by its recurrence (daily, weekly or
+             monthly; missed periods are skipped), and the fired task
+             stops recurring so only the newest occurrence repeats
+  not DONE   overdue_at is stamped
+
+The routes report every task change through schedule() and discard(),
+so keeping the heap current is O(log n) per change, with no periodic
+scan. Replaced entries stay in the heap and are skipped when they
+surface. The heap is rebuilt once these outnumber the live entries.
+
+Each fired task is claimed with an If-Match style version check
+(updates.update_returning). When several workers run a scheduler, only
+one of them handles each occurrence.
+"""
+
+import asyncio
+import calendar
+import datetime
+import heapq
+import logging
+import os
+import sqlite3
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db import Database
+from updates import VersionConflict, update_returning
+
+ENABLED = os.environ.get("HOOKER_SCHEDULER", "1") not in ("0", "false", "no")
+BATCH_SIZE = int(os.environ.get("HOOKER_SCHEDULER_BATCH", "500"))
+# Upper bound on one sleep, so a wall-clock jump is noticed eventually
+MAX_SLEEP_SECONDS = 60.0
+COMPLETED_STATUS = "DONE"
+ENTRY_FIELDS = ("id", "due_date", "status", "recurring", "recurrence", "overdue_at", "version")
+
+log = logging.getLogger(__name__)
+
+
+def _add_months(value, months: int):
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+# recurrence -> the due date `n` periods on (counted from the original, so Jan 31 monthly stays on month ends)
+RECURRENCES: Dict[str, Callable] = {
+    "daily": lambda value, n: value + datetime.timedelta(days=n),
+    "weekly": lambda value, n: value + datetime.timedelta(weeks=n),
+    "monthly": _add_months,
+}
+
+
+def parse_due(due_date: Optional[str]):
+    """A due_date as a date (YYYY-MM-DD) or naive UTC datetime; None if it does not parse"""
+    if not due_date:
+        return None
+    try:
+        if len(due_date) == 10:
+            return datetime.date.fromisoformat(due_date)
+        value = datetime.datetime.fromisoformat(due_date)
+    except ValueError:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def fire_time(due) -> datetime.datetime:
+    """When a due date has passed: the end of a date, or the timestamp itself"""
+    if isinstance(due, datetime.datetime):
+        return due
+    return datetime.datetime.combine(due + datetime.timedelta(days=1), datetime.time())
+
+
+def next_due(due_date: str, recurrence: str, now: datetime.datetime) -> Optional[str]:
+    """The first occurrence after `due_date` that is not yet due at `now`, in the same format"""
+    step = RECURRENCES.get((recurrence or "").lower())
+    due = parse_due(due_date)
+    if step is None or due is None:
+        return None
+    periods = 1
+    while fire_time(step(due, periods)) <= now:
+        periods += 1
+    return step(due, periods).isoformat()
+
+
+class Scheduler:
+    """Min-heap of task fire times plus the loop that acts on them (see the module docstring)"""
+
+    def __init__(self, db: Database, clock: Callable[[], datetime.datetime] = datetime.datetime.utcnow,
+                 notify: Optional[Callable] = None, on_fired: Optional[Callable] = None, batch: int = BATCH_SIZE):
+        self.db = db
+        self.clock = clock
+        # notify(conn, event, data) runs inside the firing transaction (webhooks);
+        # on_fired(claimed, spawned) after it commits
+        self.notify = notify
+        self.on_fired = on_fired
+        self.batch = batch
+        self._heap: List[Tuple[datetime.datetime, int, int]] = []
+        self._pending: Dict[int, Tuple[datetime.datetime, int, bool, bool]] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+        self.spawned = 0
+        self.overdue = 0
+        self.conflicts = 0
+
+    # --- Heap maintenance ---
+    def load(self, db: Optional[Database] = None):
+        """Fill the heap from the tasks table (once, at startup)"""
+        with (db or self.db).reader() as conn:
+            rows = conn.execute(f"""SELECT {', '.join(ENTRY_FIELDS)} FROM tasks WHERE due_date IS NOT NULL
+                                    AND ((overdue_at IS NULL AND status IS NOT ?) OR recurring = 1)""",
+                                (COMPLETED_STATUS,)).fetchall()
+        self._heap, self._pending = [], {}
+        for row in rows:
+            self.schedule(dict(row))
+
+    def schedule(self, task: dict):
+        """Add, move or drop the entry for a created or updated task row"""
+        task_id = task["id"]
+        due = parse_due(task.get("due_date"))
+        spawn = bool(task.get("recurring")) and (task.get("recurrence") or "").lower() in RECURRENCES
+        overdue = task.get("status") != COMPLETED_STATUS and task.get("overdue_at") is None
+        if due is None or not (spawn or overdue):
+            self.discard(task_id)
+            return
+        fire_at, version = fire_time(due), task.get("version") or 1
+        if self._pending.get(task_id) == (fire_at, version, spawn, overdue):
+            return
+        earliest = self._heap[0][0] if self._heap else None
+        self._pending[task_id] = (fire_at, version, spawn, overdue)
+        heapq.heappush(self._heap, (fire_at, task_id, version))
+        self._compact()
+        if self._wake is not None and (earliest is None or fire_at < earliest):
+            self._wake.set()
+
+    def discard(self, task_id: int):
+        # The heap entry is skipped when it surfaces
+        self._pending.pop(task_id, None)
+
+    def apply(self, change: dict):
+        """Bus handler: {"upsert": [task rows], "delete": [ids]} from any worker"""
+        for task in change.get("upsert", ()):
+            self.schedule(task)
+        for task_id in change.get("delete", ()):
+            self.discard(task_id)
+
+    def _live(self, entry) -> bool:
+        fire_at, task_id, version = entry
+        pending = self._pending.get(task_id)
+        return pending is not None and pending[:2] == (fire_at, version)
+
+    def _compact(self):
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._pending):
+            self._heap = [entry for entry in self._heap if self._live(entry)]
+            heapq.heapify(self._heap)
+
+    def next_fire(self) -> Optional[datetime.datetime]:
+        while self._heap and not self._live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime.datetime) -> List[Tuple[datetime.datetime, int, int, bool, bool]]:
+        """Take up to `batch` entries due at `now`: (fire time, task id, version, spawn, overdue)"""
+        due = []
+        while len(due) < self.batch:
+            fire_at = self.next_fire()
+            if fire_at is None or fire_at > now:
+                break
+            _, task_id, version = heapq.heappop(self._heap)
+            _, _, spawn, overdue = self._pending.pop(task_id)
+            due.append((fire_at, task_id, version, spawn, overdue))
+        return due
+
+    def _restore(self, due: list):
+        """Put back entries taken by pop_due() whose transaction did not commit"""
+        for fire_at, task_id, version, spawn, overdue in due:
+            # A change reported in the meantime is newer than the popped entry
+            if task_id not in self._pending:
+                self._pending[task_id] = (fire_at, version, spawn, overdue)
+                heapq.heappush(self._heap, (fire_at, task_id, version))
+
+    # --- Firing ---
+    def fire(self, conn: sqlite3.Connection, due: list, now: datetime.datetime):
+        """
+        Claim and act on `due` inside one write transaction. Returns the
+        claimed rows, the new occurrences, and the current entry fields of
+        the tasks that changed since they were scheduled.
+        """
+        stamp = now.isoformat()
+        claimed, spawned, stale = [], [], []
+        for _, task_id, version, spawn, overdue in due:
+            changes = {"updated_at": stamp}
+            if overdue:
+                changes["overdue_at"] = stamp
+            if spawn:
+                changes["recurring"] = 0
+            try:
+                row = update_returning(conn, "tasks", task_id, changes, expected=version)
+            except VersionConflict:
+                # Edited since it was scheduled, or another worker claimed it first
+                self.conflicts += 1
+                stale.append(dict(conn.execute(f"SELECT {', '.join(ENTRY_FIELDS)} FROM tasks WHERE id = ?",
+                                               (task_id,)).fetchone()))
+                continue
+            if row is None:
+                continue
+            claimed.append(dict(row))
+            if spawn:
+                c = conn.execute("""INSERT INTO tasks (title, description, status, assignee, priority, tags, due_date,
+                                                       recurring, recurrence, created_at, updated_at)
+                                    VALUES (?, ?, 'TODO', ?, ?, ?, ?, 1, ?, ?, ?) RETURNING *""",
+                                 (row["title"], row["description"], row["assignee"], row["priority"], row["tags"],
+                                  next_due(row["due_date"], row["recurrence"], now), row["recurrence"], stamp, stamp))
+                spawned.append(dict(c.fetchall()[0]))
+        if self.notify is not None:
+            for task in spawned:
+                self.notify(conn, "task_created", task)
+            overdue_ids = [task["id"] for task in claimed if task["overdue_at"] == stamp]
+            if overdue_ids:
+                self.notify(conn, "tasks_overdue", {"count": len(overdue_ids), "ids": overdue_ids})
+        return claimed, spawned, stale
+
+    async def run_due(self) -> int:
+        """Fire everything due now, a batch per transaction; returns how many tasks were claimed"""
+        handled = 0
+        while True:
+            now = self.clock()
+            due = self.pop_due(now)
+            if not due:
+                return handled
+            try:
+                claimed, spawned, stale = await self.db.write(self.fire, due, now)
+            except BaseException:
+                # e.g. SQLITE_BUSY: the batch is retried on the next pass. If the
+                # write did commit after all (cancelled mid-flight), the version claims
+                # fail on the retry and the tasks are rescheduled from their rows.
+                self._restore(due)
+                raise
+            handled += len(claimed)
+            self.fired += len(claimed)
+            self.spawned += len(spawned)
+            self.overdue += sum(1 for task in claimed if task["overdue_at"] == now.isoformat())
+            for task in stale:
+                self.schedule(task)
+            if not claimed:
+                continue
+            # on_fired reports the claimed tasks and new occurrences to every worker's scheduler
+            if self.on_fired is not None:
+                self.on_fired(claimed, spawned)
+            else:
+                self.apply({"upsert": claimed + spawned})
+
+    # --- Loop ---
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wake = None
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            fire_at = self.next_fire()
+            delay = MAX_SLEEP_SECONDS if fire_at is None else (fire_at - self.clock()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), min(delay, MAX_SLEEP_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run_due()
+            except Exception:
+                log.exception("Scheduler batch failed; retrying")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        fire_at = self.next_fire()
+        return {
+            "pending": len(self._pending),
+            "heap": len(self._heap),
+            "next_fire": fire_at.isoformat() if fire_at else None,
+            "fired": self.fired,
+            "spawned": self.spawned,
+            "overdue": self.overdue,
+            "conflicts": self.conflicts,
+        }
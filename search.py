@@ -0,0 +1,118 @@
+"""
+Full-text search behind GET /search.
+
+Tasks, components and every activity partition have an external-content
+FTS5 index (see migrations.fts_schema) that triggers keep in step with
+each write, so the text itself is stored once. Every word of the query is
+matched as a prefix and all of them must appear; hits are ranked by bm25
+with title-like columns weighted up, or listed newest first. Ranking
+scores the newest RANK_CANDIDATES matches of each index, which keeps
+common words from costing a bm25 evaluation per matching row.
+
+bm25 scores depend on each index's own row count and term frequencies,
+so scores from different indexes are not comparable. Ranked results are
+therefore ranked within each index and then interleaved: first the best
+hit of each type, then the second best, and so on. Activity partitions
+are interleaved the same way, newest partition first.
+
+Each activity partition is searched on its own: ranked searches take the
+best `limit` of every partition in range, newest-first searches stop at
+the first partitions that fill the page. Activity indexes are keyed by the
+partition's rowid, which incremental_vacuum never changes; after a full
+VACUUM run reindex().
+"""
+
+import itertools
+import os
+import re
+import sqlite3
+from typing import List, Optional, Sequence
+
+from migrations import fts_rebuild
+
+RANK_CANDIDATES = int(os.environ.get("HOOKER_SEARCH_CANDIDATES", "500"))
+TYPES = ("task", "component", "activity")
+ORDERS = ("rank", "recent")
+_WORD = re.compile(r"\w+")
+
+# type -> (index, id, title and timestamp expressions)
+_SOURCES = {
+    "task": ("tasks_fts", "rowid", "title", "created_at"),
+    "component": ("components_fts", "rowid", "part_number", "created_at"),
+    "activity": (None, "id", "actor || ': ' || action", "timestamp"),
+}
+
+
+def match_expression(q: str) -> Optional[str]:
+    """Every word of `q` as a quoted prefix term, all required; None if `q` has no words"""
+    return " ".join(f'"{word}"*' for word in _WORD.findall(q)) or None
+
+
+def _hits(conn: sqlite3.Connection, kind: str, fts: str, match: str, order: str, limit: int,
+          conditions: Sequence[str] = (), params: Sequence = ()) -> list:
+    _, key, title, stamp = _SOURCES[kind]
+    conditions, params = [f"{fts} MATCH ?", *conditions], [match, *params]
+    if order == "rank":
+        # bm25 costs a little per match, so only the newest RANK_CANDIDATES are scored
+        cutoff = conn.execute(f"SELECT rowid FROM {fts} WHERE {' AND '.join(conditions)} "
+                              "ORDER BY rowid DESC LIMIT 1 OFFSET ?", [*params, RANK_CANDIDATES - 1]).fetchone()
+        if cutoff:
+            conditions.append("rowid >= ?")
+            params.append(cutoff[0])
+    # Selecting rank makes bm25 count every match of every term, so newest-first skips it
+    rows = conn.execute(f"""SELECT {key}, {title}, snippet({fts}, -1, '<mark>', '</mark>', '…', 12),
+                                   {"rank" if order == "rank" else "NULL"}, {stamp}
+                            FROM {fts} WHERE {' AND '.join(conditions)}
+                            ORDER BY {"rank" if order == "rank" else "rowid DESC"} LIMIT ?""",
+                        [*params, limit]).fetchall()
+    return [{"type": kind, "id": row[0], "title": row[1], "snippet": row[2],
+             "score": None if row[3] is None else round(-row[3], 4), "timestamp": row[4]} for row in rows]
+
+
+def _interleave(ranked: Sequence[list]) -> list:
+    """The first hit of every list, then the second of every list, and so on"""
+    return [hit for tier in itertools.zip_longest(*ranked) for hit in tier if hit is not None]
+
+
+def search(conn: sqlite3.Connection, store, q: str, types: Sequence[str] = TYPES, limit: int = 20,
+           order: str = "rank", since: Optional[str] = None, until: Optional[str] = None) -> List[dict]:
+    """
+    The best `limit` hits for `q` across `types`, ranked within each type
+    and interleaved, or newest first. `since`/`until` (ISO timestamps)
+    narrow the activity searched.
+    """
+    match = match_expression(q)
+    if match is None:
+        return []
+    ranked = []
+    for kind in ("task", "component"):
+        if kind in types:
+            ranked.append(_hits(conn, kind, _SOURCES[kind][0], match, order, limit))
+    if "activity" in types:
+        conditions, params = [], []
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        pages, found = [], 0
+        for partition in store.partitions(conn, since, until, newest_first=True):
+            page = _hits(conn, "activity", f"{partition.name}_fts", match, order, limit, conditions, params)
+            pages.append(page)
+            found += len(page)
+            # Older partitions only hold older rows
+            if order == "recent" and found >= limit:
+                break
+        ranked.append(_interleave(pages))
+    if order == "rank":
+        return _interleave(ranked)[:limit]
+    hits = [hit for page in ranked for hit in page]
+    hits.sort(key=lambda hit: hit["timestamp"] or "", reverse=True)
+    return hits[:limit]
+
+
+def reindex(conn: sqlite3.Connection, store):
+    """Rebuild every search index from its table"""
+    for table in ("tasks", "components", *(partition.name for partition in store.partitions(conn))):
+        conn.execute(fts_rebuild(table))
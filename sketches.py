@@ -0,0 +1,70 @@
+"""
+Mergeable quantile sketches for duration_ms.
+
+A DDSketch-style log histogram: a positive value v is counted in bucket
+ceil(log_gamma(v)), so every quantile read back is within ALPHA (relative)
+of the true value, and two sketches merge by adding bucket counts. Daily
+sketches can therefore be summed into weeks or months without the raw rows.
+"""
+
+import math
+from typing import Dict, Optional
+
+import orjson
+
+ALPHA = 0.01
+_GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+class DDSketch:
+    """Relative-error quantile sketch over non-negative values"""
+
+    __slots__ = ("bins", "zeros", "count")
+
+    def __init__(self):
+        self.bins: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            index = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile (0 <= q <= 1), or None for an empty sketch"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.bins) / (_GAMMA + 1)
+
+    def to_bytes(self) -> bytes:
+        return orjson.dumps({"z": self.zeros, "b": sorted(self.bins.items())})
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "DDSketch":
+        sketch = cls()
+        if data:
+            state = orjson.loads(data)
+            sketch.zeros = state["z"]
+            sketch.bins = {index: count for index, count in state["b"]}
+            sketch.count = sketch.zeros + sum(sketch.bins.values())
+        return sketch
@@ -1,9 +1,12 @@
 #!/bin/bash
 
 # Hooker Start Script
-# Usage: ./start.sh [docker|local]
+# Usage: ./start.sh [docker|local] [workers]
+# With more than one worker, WebSocket and cache events are shared over the
+# Unix-socket broadcast bus (HOOKER_BROADCAST=unix).
 
 MODE=${1:-local}
+WORKERS=${2:-${HOOKER_WORKERS:-1}}
 
 if [ "$MODE" == "docker" ]; then
     echo "🐳 Starting Hooker in Docker..."
@@ -26,6 +29,12 @@ else
     # Run migration check
     python3 migrate.py
     
-    echo "✅ Starting server..."
-    uvicorn backend:app --host 0.0.0.0 --port 8000
+    if [ "$WORKERS" -gt 1 ]; then
+        echo "✅ Starting server with $WORKERS workers..."
+        export HOOKER_BROADCAST=unix
+        uvicorn backend:app --host 0.0.0.0 --port 8000 --workers "$WORKERS"
+    else
+        echo "✅ Starting server..."
+        uvicorn backend:app --host 0.0.0.0 --port 8000
+    fi
 fi
@@ -0,0 +1,94 @@
+"""
+Change feed behind GET /sync.
+
+Triggers installed by migration 4 (and on every activity partition, which
+report as activity_log) append a row to `changes` for every insert, update
+and delete on tasks, activity_log and subagents. The
+AUTOINCREMENT rowid of that table is the global revision: it only ever
+grows, so a client that remembers the last revision it saw can ask for
+everything after it with a single rowid range read.
+
+The feed keeps the changes of the last RETENTION_SECONDS. A count would
+shrink to seconds under bulk activity ingest, so the window is by time:
+every prune() records the current revision with the time in
+change_marks, and drops the changes up to the newest mark that has aged
+out. A client whose revision has fallen out of the window (or is ahead
+of the server, e.g. after the database was replaced) is told to reset
+and refetch in full.
+"""
+
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+TABLES = ("tasks", "activity_log", "subagents")
+MAX_CHANGES = 5000
+RETENTION_SECONDS = float(os.environ.get("HOOKER_SYNC_RETENTION", str(24 * 3600)))
+PRUNE_INTERVAL = float(os.environ.get("HOOKER_SYNC_PRUNE_INTERVAL", "60"))
+# Stay under SQLite's bound-parameter limit on old builds
+_ID_CHUNK = 500
+
+
+def current_revision(conn: sqlite3.Connection) -> int:
+    # The AUTOINCREMENT counter, which outlives pruning the table empty
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+
+def prune(conn: sqlite3.Connection, now: Optional[float] = None, retention: float = RETENTION_SECONDS) -> int:
+    """Mark the current revision and drop changes older than `retention` seconds; returns how many went"""
+    now = time.time() if now is None else now
+    conn.execute("INSERT OR IGNORE INTO change_marks (rev, at) VALUES (?, ?)", (current_revision(conn), now))
+    cutoff = conn.execute("SELECT MAX(rev) FROM change_marks WHERE at <= ?", (now - retention,)).fetchone()[0]
+    if cutoff is None:
+        return 0
+    conn.execute("DELETE FROM change_marks WHERE rev < ?", (cutoff,))
+    return conn.execute("DELETE FROM changes WHERE rev <= ?", (cutoff,)).rowcount
+
+
+def read_changes(conn: sqlite3.Connection, since: int, limit: int) -> dict:
+    """
+    Collapse up to `limit` changes after `since` to the latest operation per
+    row. Returns {"rev", "reset", "more", "upserts", "deleted"} where
+    upserts/deleted map table name -> list of ids. Call inside one read
+    transaction together with fetch_rows() so both see the same snapshot.
+    """
+    latest = current_revision(conn)
+    # Revisions are contiguous from the oldest kept change; an empty feed has kept none
+    oldest = conn.execute("SELECT MIN(rev) FROM changes").fetchone()[0]
+    if since > latest or (since < latest and (oldest is None or since < oldest - 1)):
+        return {"rev": latest, "reset": True, "more": False, "upserts": {}, "deleted": {}}
+
+    rows = conn.execute("SELECT rev, entity, entity_id, op FROM changes WHERE rev > ? ORDER BY rev LIMIT ?",
+                        (since, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    last_op: Dict[Tuple[str, object], str] = {}
+    for row in rows:
+        key = (row['entity'], row['entity_id'])
+        # Re-insert so dict order follows the latest change
+        last_op.pop(key, None)
+        last_op[key] = row['op']
+
+    upserts: Dict[str, List] = {}
+    deleted: Dict[str, List] = {}
+    for (entity, entity_id), op in last_op.items():
+        target = deleted if op == "delete" else upserts
+        target.setdefault(entity, []).append(entity_id)
+
+    return {"rev": rows[-1]['rev'] if more else latest, "reset": False, "more": more,
+            "upserts": upserts, "deleted": deleted}
+
+
+def fetch_rows(conn: sqlite3.Connection, table: str, ids: List) -> List[sqlite3.Row]:
+    """Current rows for `ids` by primary key; rows deleted since are simply absent"""
+    if table not in TABLES:
+        raise ValueError(f"Unknown feed entity {table!r}")
+    found = []
+    for start in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[start:start + _ID_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        found.extend(conn.execute(f"SELECT * FROM {table} WHERE id IN ({marks})", chunk).fetchall())
+    return found
@@ -0,0 +1,56 @@
+"""
+Tag filters and facets for /tasks and /components.
+
+tasks.tags and components.tags stay JSON arrays, served as-is by
+records.py. Triggers (see migrations.tag_index) mirror them into the tags
+table and the task_tags / component_tags join tables, and keep a per-tag
+row count. A ?tag= filter is then an index lookup per tag instead of
+json.loads on every row. Tag names match case-insensitively.
+"""
+
+import sqlite3
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+MODES = ("all", "any")
+
+# table -> (join table, key column)
+INDEXES = {"tasks": ("task_tags", "task_id"), "components": ("component_tags", "component_id")}
+
+
+def tag_filter(conn: sqlite3.Connection, table: str, names: Sequence[str],
+               mode: str = "all") -> Optional[Tuple[List[str], list]]:
+    """
+    Conditions (and their params) on `table`.id selecting the rows tagged
+    with all, or any, of `names`; None when no row can match.
+    """
+    join, key = INDEXES[table]
+    found = []
+    for name in dict.fromkeys(names):
+        row = conn.execute(f"SELECT id, {table} FROM tags WHERE name = ?", (name,)).fetchone()
+        if row and row[1]:
+            found.append(tuple(row))
+        elif mode == "all":
+            return None
+    if not found:
+        return None
+    if mode == "any":
+        return ([f"id IN (SELECT {key} FROM {join} WHERE tag_id IN ({', '.join('?' * len(found))}))"],
+                [tag_id for tag_id, _ in found])
+    # Rarest tag first, so the smallest id list drives the lookup
+    found.sort(key=lambda tag: tag[1])
+    return [f"id IN (SELECT {key} FROM {join} WHERE tag_id = ?)"] * len(found), [tag_id for tag_id, _ in found]
+
+
+def facets(conn: sqlite3.Connection, table: str, conditions: Sequence[str] = (), params: Sequence = ()) -> List[dict]:
+    """Tag counts over the rows of `table` matching `conditions` (all rows without any), most used first"""
+    join, key = INDEXES[table]
+    if not conditions:
+        # The per-tag counts kept by the triggers; tags is one row per distinct tag
+        counts = {name: count for name, count in conn.execute(f"SELECT name, {table} FROM tags") if count}
+    else:
+        counts = Counter(name for (name,) in conn.execute(
+            f"""SELECT tags.name FROM {join} JOIN tags ON tags.id = {join}.tag_id
+                WHERE {join}.{key} IN (SELECT id FROM {table} WHERE {' AND '.join(conditions)})""", params))
+    return [{"tag": name, "count": count}
+            for name, count in sorted(counts.items(), key=lambda item: (-item[1], item[0].lower()))]
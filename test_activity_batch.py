@@ -0,0 +1,80 @@
+"""
+POST /activity/batch and the NDJSON POST /activity/stream: per-item validation, one broadcast per request.
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+@pytest.fixture
+def broadcasts(monkeypatch):
+    sent = []
+    publish = backend.bus.publish
+
+    def recording(channel, payload):
+        if channel == "ws":
+            sent.append(payload)
+        publish(channel, payload)
+
+    monkeypatch.setattr(backend.bus, "publish", recording)
+    return sent
+
+
+def _entry(i, **fields):
+    return {"actor": "Batcher", "action": "bulk", "description": f"item {i}", **fields}
+
+
+def test_batch_inserts_valid_items_and_reports_the_rest(client, broadcasts):
+    items = [_entry(0), {"actor": "Batcher"}, _entry(2, duration_ms=7), "not an object", _entry(4)]
+    r = client.post("/activity/batch", json=items).json()
+    assert (r["inserted"], r["failed"]) == (3, 2)
+    assert [e["index"] for e in r["errors"]] == [1, 3]
+    assert r["errors"][1]["errors"] == ["Expected a JSON object"]
+
+    stored = [client.get(f"/activity/{activity_id}").json() for activity_id in r["ids"]]
+    assert [e["description"] for e in stored] == ["item 0", "item 2", "item 4"]
+    assert stored[1]["duration_ms"] == 7
+
+    assert [(m["type"], m["count"]) for m in broadcasts] == [("activity_batch_created", 3)]
+
+
+def test_stream_parses_chunked_ndjson(client, broadcasts):
+    lines = [json.dumps(_entry(i)) for i in range(50)]
+    lines[10] = "{broken json"
+    lines[20] = ""
+    body = ("\n".join(lines) + "\n").encode()
+
+    def chunks():
+        # Cut lines in half across chunk boundaries
+        for start in range(0, len(body), 37):
+            yield body[start:start + 37]
+
+    r = client.post("/activity/stream", content=chunks(), headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (r["inserted"], r["failed"]) == (48, 1)
+    assert [e["index"] for e in r["errors"]] == [10]
+    assert len(r["ids"]) == 48
+    assert client.get(f"/activity/{r['ids'][-1]}").json()["description"] == "item 49"
+    assert [(m["type"], m["count"]) for m in broadcasts] == [("activity_batch_created", 48)]
+    assert len(broadcasts[0]["data"]) == 48
+
+
+def test_stream_caps_the_error_list(client, broadcasts, monkeypatch):
+    monkeypatch.setattr(backend, "BATCH_MAX_ERRORS", 3)
+    body = "\n".join(["{}"] * 10 + [json.dumps(_entry(0))])
+    r = client.post("/activity/stream", content=body).json()
+    assert (r["inserted"], r["failed"]) == (1, 10)
+    assert [e["index"] for e in r["errors"]] == [0, 1, 2]
+
+    r = client.post("/activity/stream", content="\n".join(["[]"] * 5)).json()
+    assert (r["inserted"], r["failed"], len(r["errors"])) == (0, 5, 3)
+    assert broadcasts and broadcasts[-1]["count"] == 1
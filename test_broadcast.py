@@ -0,0 +1,137 @@
+"""
+Cross-worker event bus: ordered delivery between processes over the Unix socket relay.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+
+import pytest
+
+import broadcast
+from cache import ResponseCache
+
+WORKERS = 4
+EVENTS = 200
+
+
+def _worker(path: str, index: int, joined, done, results):
+    async def main():
+        bus = broadcast.UnixSocketBus(path)
+        seen = []
+        everything = asyncio.Event()
+
+        def record(event):
+            seen.append(tuple(event))
+            if len(seen) == WORKERS * EVENTS:
+                everything.set()
+
+        bus.subscribe("t", record)
+        await bus.start()
+        await asyncio.wait_for(bus.ready.wait(), 10)
+        # Everyone is connected before anyone publishes
+        await asyncio.to_thread(joined.wait, 10)
+        for i in range(EVENTS):
+            bus.publish("t", [index, i])
+            if i % 50 == 0:
+                await asyncio.sleep(0)
+        await asyncio.wait_for(everything.wait(), 20)
+        # The relay stays up until every worker has everything
+        await asyncio.to_thread(done.wait, 20)
+        await bus.stop()
+        return seen
+
+    results.put((index, asyncio.run(main())))
+
+
+def test_events_reach_every_process_in_one_order():
+    context = multiprocessing.get_context("fork")
+    path = os.path.join(tempfile.mkdtemp(prefix="hooker-bus-"), "bus.sock")
+    joined, done = context.Barrier(WORKERS), context.Barrier(WORKERS)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(path, i, joined, done, results)) for i in range(WORKERS)]
+    for process in processes:
+        process.start()
+    try:
+        seen = dict(results.get(timeout=60) for _ in processes)
+    finally:
+        for process in processes:
+            process.join(10)
+            if process.is_alive():
+                process.terminate()
+
+    orders = list(seen.values())
+    assert len(orders[0]) == WORKERS * EVENTS
+    assert all(order == orders[0] for order in orders)
+    for index in range(WORKERS):
+        assert [i for sender, i in orders[0] if sender == index] == list(range(EVENTS))
+
+
+def test_local_bus_skips_own_events_for_own_false_handlers():
+    bus = broadcast.LocalBus()
+    got = []
+    bus.subscribe("c", lambda payload: got.append(("all", payload)))
+    bus.subscribe("c", lambda payload: got.append(("others", payload)), own=False)
+    bus.publish("c", 1)
+    bus._deliver(bus.origin + 1, "c", 2)
+    assert got == [("all", 1), ("all", 2), ("others", 2)]
+    with pytest.raises(ValueError):
+        broadcast.create_bus("redis")
+
+
+def test_a_worker_takes_over_when_the_relay_exits():
+    path = os.path.join(tempfile.mkdtemp(prefix="hooker-bus-"), "bus.sock")
+
+    async def main():
+        buses = [broadcast.UnixSocketBus(path) for _ in range(3)]
+        seen = [[] for _ in buses]
+        for bus, got in zip(buses, seen):
+            bus.subscribe("t", got.append)
+            await bus.start()
+            await asyncio.wait_for(bus.ready.wait(), 5)
+        assert buses[0].relaying and not buses[1].relaying
+        await buses[0].stop()
+        # The survivors reconnect and one of them relays
+        for _ in range(100):
+            if any(bus.relaying for bus in buses[1:]) and all(bus.stats()["connected"] for bus in buses[1:]):
+                break
+            await asyncio.sleep(0.05)
+        buses[2].publish("t", "after")
+        for _ in range(100):
+            if seen[1] and seen[2]:
+                break
+            await asyncio.sleep(0.01)
+        for bus in buses[1:]:
+            await bus.stop()
+        return seen
+
+    seen = asyncio.run(main())
+    assert seen[1] == seen[2] == ["after"]
+
+
+def test_a_worker_that_rejoins_the_bus_drops_its_response_cache():
+    path = os.path.join(tempfile.mkdtemp(prefix="hooker-bus-"), "bus.sock")
+    cache = ResponseCache()
+
+    async def main():
+        relay, worker = broadcast.UnixSocketBus(path), broadcast.UnixSocketBus(path)
+        worker.subscribe("cache", lambda tables: cache.invalidate(*tables), own=False)
+        worker.on_reconnect(cache.clear)
+        for bus in (relay, worker):
+            await bus.start()
+            await asyncio.wait_for(bus.ready.wait(), 5)
+        before = cache.version("tasks")
+        # The relay exits; the worker takes over and missed whatever was sent meanwhile
+        await relay.stop()
+        for _ in range(100):
+            if worker.relaying:
+                break
+            await asyncio.sleep(0.05)
+        took_over = worker.relaying
+        await worker.stop()
+        return took_over, before
+
+    took_over, before = asyncio.run(main())
+    assert took_over
+    assert cache.version("tasks") != before
@@ -0,0 +1,87 @@
+"""
+PATCH/DELETE /tasks/bulk: one transaction and one event for many tasks.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+@pytest.fixture
+def events(monkeypatch):
+    webhooks, broadcasts = [], []
+    monkeypatch.setattr(backend, "trigger_webhooks", lambda conn, event, data: webhooks.append((event, data)))
+    publish = backend.bus.publish
+
+    def recording(channel, payload):
+        if channel == "ws":
+            broadcasts.append(payload)
+        publish(channel, payload)
+
+    monkeypatch.setattr(backend.bus, "publish", recording)
+    return webhooks, broadcasts
+
+
+def _task(client, **fields):
+    return client.post("/tasks", json={"title": "bulk", **fields}).json()
+
+
+def test_bulk_update_by_filter_emits_one_event(client, events):
+    webhooks, broadcasts = events
+    sprint = [_task(client, assignee="Bulk-A", tags=["sprint-9"]) for _ in range(5)]
+    other = _task(client, assignee="Bulk-A", tags=["sprint-10"])
+    webhooks.clear(); broadcasts.clear()
+
+    r = client.patch("/tasks/bulk", json={"filter": {"assignee": "Bulk-A", "tag": ["sprint-9"]},
+                                          "set": {"status": "DONE", "priority": "LOW"}})
+    assert r.json() == {"count": 5, "ids": [t["id"] for t in sprint]}
+    assert [event for event, _ in webhooks] == ["tasks_bulk_updated"]
+    assert webhooks[0][1]["changes"] == {"status": "DONE", "priority": "LOW"}
+    assert [m["type"] for m in broadcasts] == ["tasks_bulk_updated"]
+
+    tasks = {t["id"]: t for t in client.get("/tasks").json()}
+    assert all(tasks[t["id"]]["status"] == "DONE" and tasks[t["id"]]["version"] == 2 for t in sprint)
+    assert tasks[other["id"]]["status"] == "TODO"
+
+
+def test_bulk_update_by_ids_counts_completions_once(client, monkeypatch):
+    completed = []
+    monkeypatch.setattr(backend.rollup, "task_completed", completed.append)
+    done = _task(client)
+    client.put(f"/tasks/{done['id']}", json={"status": "DONE"})
+    fresh = [_task(client) for _ in range(3)]
+    completed.clear()
+
+    ids = [done["id"]] + [t["id"] for t in fresh] + [999999]
+    r = client.patch("/tasks/bulk", json={"ids": ids, "set": {"status": "DONE"}})
+    assert r.json()["count"] == 4
+    assert sorted(t["id"] for t in completed) == [t["id"] for t in fresh]
+
+
+def test_bulk_delete(client, events):
+    webhooks, _ = events
+    doomed = [_task(client, assignee="Bulk-D", tags=["cleanup"]) for _ in range(3)]
+    kept = _task(client, assignee="Bulk-D")
+    webhooks.clear()
+
+    r = client.request("DELETE", "/tasks/bulk", json={"filter": {"tag": ["cleanup", "nope"], "tag_mode": "any"}})
+    assert set(r.json()["ids"]) >= {t["id"] for t in doomed}
+    assert [event for event, _ in webhooks] == ["tasks_bulk_deleted"]
+    remaining = {t["id"] for t in client.get("/tasks").json()}
+    assert kept["id"] in remaining and not remaining & {t["id"] for t in doomed}
+
+    # Nothing matched: no event
+    assert client.request("DELETE", "/tasks/bulk", json={"filter": {"tag": ["never-used"]}}).json() == {"count": 0, "ids": []}
+    assert len(webhooks) == 1
+    # An empty selection is refused rather than taken as "all tasks"
+    assert client.request("DELETE", "/tasks/bulk", json={"filter": {}}).status_code == 422
+    assert client.patch("/tasks/bulk", json={"set": {"status": "DONE"}}).status_code == 422
+    # /tasks/{id} still works next to /tasks/bulk
+    assert client.delete(f"/tasks/{kept['id']}").status_code == 200
@@ -0,0 +1,72 @@
+"""
+The pooled WAL-mode connection layer: PRAGMAs, a bounded reader pool and a single writer.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+import pytest
+
+from db import Database
+
+
+@pytest.fixture
+def database():
+    database = Database(os.path.join(tempfile.mkdtemp(prefix="hooker-db-"), "t.db"), readers=2).open()
+    with database.writer() as conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+    yield database
+    database.close()
+
+
+def test_connections_are_wal_and_readers_are_read_only(database):
+    with database.writer() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    with database.reader() as conn:
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (1)")
+
+
+def test_writer_commits_on_success_and_rolls_back_on_error(database):
+    with database.writer() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pytest.raises(ValueError):
+        with database.writer() as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+            raise ValueError("rolled back")
+    with database.reader() as conn:
+        assert [v for (v,) in conn.execute("SELECT v FROM t")] == [1]
+
+
+def test_readers_see_the_last_commit_while_a_write_is_open(database):
+    with database.writer() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+    with database.writer() as conn:
+        conn.execute("INSERT INTO t VALUES (2)")
+        # WAL: the uncommitted row is invisible, and the read does not block
+        with database.reader() as reader:
+            assert reader.execute("SELECT count(*) FROM t").fetchone()[0] == 1
+
+
+def test_reader_pool_is_bounded(database):
+    held = [database._acquire_reader() for _ in range(database.pool_size)]
+    borrowed = threading.Event()
+
+    def borrow():
+        with database.reader():
+            borrowed.set()
+
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    # Every connection is out: the third borrower waits for one to come back
+    assert not borrowed.wait(0.2)
+    database._readers.put(held.pop())
+    assert borrowed.wait(5)
+    thread.join()
+    for conn in held:
+        database._readers.put(conn)
+    assert database._created == database.pool_size
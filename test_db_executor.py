@@ -0,0 +1,82 @@
+"""
+Async data access: queries run on the DB executor, never on the event loop.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+from db import Database
+
+
+@pytest.fixture
+def database():
+    database = Database(os.path.join(tempfile.mkdtemp(prefix="hooker-executor-"), "t.db"), readers=4).open()
+    with database.writer() as conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+    yield database
+    database.close()
+
+
+def test_reads_and_writes_run_on_their_own_threads(database):
+    def insert(conn, value):
+        conn.execute("INSERT INTO t VALUES (?)", (value,))
+        return threading.current_thread().name
+
+    def fail(conn):
+        conn.execute("INSERT INTO t VALUES (99)")
+        raise ValueError("rolled back")
+
+    def select(conn):
+        return threading.current_thread().name, [v for (v,) in conn.execute("SELECT v FROM t ORDER BY v")]
+
+    async def main():
+        writers = await asyncio.gather(*(database.write(insert, i) for i in range(20)))
+        with pytest.raises(ValueError):
+            await database.write(fail)
+        return set(writers), await database.read(select)
+
+    writers, (reader, values) = asyncio.run(main())
+    assert writers == {"hooker-db-write_0"}
+    assert reader.startswith("hooker-db-read")
+    assert values == list(range(20))
+
+
+def test_slow_queries_leave_the_loop_free(database):
+    def slow(conn):
+        time.sleep(0.2)
+        return conn.execute("SELECT count(*) FROM t").fetchone()[0]
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        probe = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        counts = await asyncio.gather(*(database.read(slow) for _ in range(4)))
+        elapsed = time.perf_counter() - start
+        probe.cancel()
+        return counts, elapsed, ticks
+
+    counts, elapsed, ticks = asyncio.run(main())
+    # One reader thread each, so the four run side by side while the loop keeps ticking
+    assert counts == [0] * 4 and elapsed < 0.6 and ticks >= 5
+
+
+def test_threadpool_size_is_configurable(monkeypatch):
+    monkeypatch.setattr(backend, "THREADPOOL_SIZE", 7)
+    with TestClient(backend.app) as client:
+        assert client.portal.call(lambda: anyio.to_thread.current_default_thread_limiter().total_tokens) == 7
+        assert client.get("/tasks").status_code == 200
@@ -0,0 +1,68 @@
+"""
+Streaming export tests for /activity/export, /tasks/export and /subagents/export.
+"""
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+import export
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Force several chunks so keyset resumption is exercised
+    monkeypatch.setattr(export, "CHUNK_ROWS", 2)
+
+
+def test_activity_export_streams_every_row_in_order(client, small_chunks):
+    actor = "exporter"
+    created = [client.post("/activity", json={"actor": actor, "action": "export", "description": f"row {i}",
+                                              "metadata": {"i": i}}).json() for i in range(5)]
+    r = client.get("/activity/export", params={"actor": actor})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [e["id"] for e in lines] == [e["id"] for e in created]
+    assert [e["metadata"] for e in lines] == [{"i": i} for i in range(5)]
+
+    since = created[2]["timestamp"]
+    r = client.get("/activity/export", params={"actor": actor, "since": since, "until": created[4]["timestamp"]})
+    assert [json.loads(line)["id"] for line in r.text.splitlines()] == [created[2]["id"], created[3]["id"]]
+
+
+def test_csv_export_quotes_values(client, small_chunks):
+    client.post("/tasks", json={"title": 'comma, "quote"', "assignee": "csv-export", "tags": ["a", "b"]})
+    r = client.get("/tasks/export", params={"format": "csv", "assignee": "csv-export"})
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert len(rows) == 1
+    assert rows[0]["title"] == 'comma, "quote"'
+    assert json.loads(rows[0]["tags"]) == ["a", "b"]
+    assert rows[0]["recurring"] == "false"
+
+
+def test_gzip_export(client):
+    client.post("/activity", json={"actor": "gzipper", "action": "export", "description": "compressed"})
+    r = client.get("/activity/export", params={"actor": "gzipper", "gzip": True},
+                   headers={"Accept-Encoding": "identity"})
+    assert r.headers["content-encoding"] == "gzip"
+    # httpx decodes Content-Encoding itself; the raw stream is a valid gzip member
+    assert json.loads(r.text)["description"] == "compressed"
+    assert gzip.decompress(b"".join(export.gzipped([b"a" * 1000, b"b"]))) == b"a" * 1000 + b"b"
+
+
+def test_empty_csv_export_has_header(client):
+    r = client.get("/subagents/export", params={"format": "csv", "status": "no-such-status"})
+    assert r.text.strip() == "id,name,status,started_at,completed_at,stdout_bytes,stderr_bytes,created_at,version"
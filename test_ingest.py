@@ -0,0 +1,145 @@
+"""
+Group-commit activity ingestion: batching, back-pressure, durable acks and draining on stop.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+
+import pytest
+
+from db import Database
+from ingest import ActivityWriter, IngestQueueFull
+
+
+class Store:
+    """Stands in for ActivityStore: records each batch, optionally blocking or failing"""
+
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = None
+
+    def insert(self, conn, rows):
+        self.gate.wait(5)
+        if self.fail is not None:
+            error, self.fail = self.fail, None
+            raise error
+        conn.executemany("INSERT INTO t VALUES (?)", rows)
+        self.batches.append([v for (v,) in rows])
+
+
+@pytest.fixture
+def database():
+    database = Database(os.path.join(tempfile.mkdtemp(prefix="hooker-ingest-"), "t.db")).open()
+    with database.writer() as conn:
+        conn.execute("CREATE TABLE t (v INTEGER)")
+    yield database
+    database.close()
+
+
+def _count(database):
+    with database.reader() as conn:
+        return conn.execute("SELECT count(*) FROM t").fetchone()[0]
+
+
+def test_rows_are_committed_in_batches_of_at_most_batch_size(database):
+    store = Store()
+
+    async def main():
+        writer = ActivityWriter(database, store, batch_size=3, flush_ms=200)
+        await writer.start()
+        waiters = [writer.submit((i,), durable=True) for i in range(7)]
+        await asyncio.gather(*waiters)
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(main())
+    assert store.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert stats["committed"] == 7 and stats["batches"] == 3
+
+
+def test_a_lone_row_is_flushed_at_the_deadline(database):
+    store = Store()
+
+    async def main():
+        writer = ActivityWriter(database, store, batch_size=100, flush_ms=50)
+        await writer.start()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.wait_for(writer.submit((1,), durable=True), 5)
+        elapsed = loop.time() - start
+        await writer.stop()
+        return elapsed
+
+    assert 0.04 <= asyncio.run(main()) < 2
+    assert store.batches == [[1]]
+
+
+def test_a_full_queue_rejects_new_rows(database):
+    async def main():
+        writer = ActivityWriter(database, Store(), max_queue=2)
+        await writer.start()
+        writer.submit((1,), durable=False)
+        writer.submit((2,), durable=False)
+        with pytest.raises(IngestQueueFull):
+            writer.submit((3,), durable=False)
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["enqueued"], stats["rejected"], stats["committed"]) == (2, 1, 2)
+
+
+def test_durable_acks_wait_for_the_commit(database):
+    store = Store()
+    store.gate.clear()
+
+    async def main():
+        writer = ActivityWriter(database, store, flush_ms=0)
+        await writer.start()
+        waiter = writer.submit((1,), durable=True)
+        await asyncio.sleep(0.1)
+        # The batch is stuck in insert: not committed, not acknowledged
+        assert not waiter.done() and _count(database) == 0
+        store.gate.set()
+        await asyncio.wait_for(waiter, 5)
+        assert _count(database) == 1
+        await writer.stop()
+
+    asyncio.run(main())
+
+
+def test_a_failed_batch_fails_its_waiters_and_the_writer_carries_on(database):
+    store = Store()
+    store.fail = RuntimeError("disk I/O error")
+
+    async def main():
+        writer = ActivityWriter(database, store, flush_ms=0)
+        await writer.start()
+        with pytest.raises(RuntimeError, match="disk I/O"):
+            await asyncio.wait_for(writer.submit((1,), durable=True), 5)
+        await asyncio.wait_for(writer.submit((2,), durable=True), 5)
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["failed"], stats["committed"]) == (1, 1)
+    assert store.batches == [[2]]
+
+
+def test_stop_drains_the_queue(database):
+    store = Store()
+
+    async def main():
+        writer = ActivityWriter(database, store, batch_size=10, flush_ms=200)
+        await writer.start()
+        for i in range(25):
+            writer.submit((i,), durable=False)
+        await writer.stop()
+
+    asyncio.run(main())
+    assert sorted(v for batch in store.batches for v in batch) == list(range(25))
+    assert _count(database) == 25
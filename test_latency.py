@@ -0,0 +1,70 @@
+"""
+Sliding-window latency percentiles behind GET /stats/latency, and the "slow" status.
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+from latency import HOUR, MINUTE, LatencyTracker
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+def test_percentiles_and_slow_status(client):
+    actor = "latency-agent"
+    client.post("/activity/batch", json=[{"actor": actor, "action": "build", "description": f"run {i}",
+                                          "duration_ms": i * 10} for i in range(1, 101)])
+    backend.latency.flush(backend.db)
+
+    stats = client.get("/stats/latency", params={"window": "5m", "actor": actor}).json()
+    [build] = stats["actions"]
+    assert build["count"] == 100
+    assert abs(build["p50_ms"] - 500) <= 10
+    assert abs(build["p90_ms"] - 900) <= 15
+    assert abs(build["p99_ms"] - 990) <= 15
+    assert abs(build["slow_threshold_ms"] - 950) <= 15
+
+    def status(duration_ms, status="success", action="build"):
+        return client.post("/activity", json={"actor": actor, "action": action, "description": "x",
+                                              "status": status, "duration_ms": duration_ms}).json()["status"]
+
+    assert status(2000) == "slow"
+    assert status(100) == "success"
+    assert status(2000, status="error") == "error"
+    # Too few samples for an untracked action to have a threshold
+    assert status(2000, action="deploy") == "success"
+    slow = client.get("/activity", params={"actor": actor, "status": "slow"}).json()
+    assert len(slow) == 1
+
+    assert client.get("/stats/latency", params={"window": "2m"}).status_code == 422
+
+
+def test_windows_read_the_retained_resolution(client):
+    tracker = LatencyTracker(slow_window=HOUR, min_samples=1)
+    now = time.time() // HOUR * HOUR + 30 * MINUTE
+    batch = tracker.batch()
+    batch.add("window-agent", "scan", now - 3 * HOUR, 100)
+    batch.add("window-agent", "scan", now - 10, 300)
+    batch.commit()
+    tracker.flush(backend.db, now=now)
+
+    with backend.db.reader() as conn:
+        resolutions = conn.execute("""SELECT resolution, COUNT(*) FROM latency_sketches
+                                      WHERE actor = 'window-agent' GROUP BY resolution""").fetchall()
+        # The three-hour-old minute bucket is pruned; its hour bucket is kept
+        assert [tuple(r) for r in resolutions] == [(MINUTE, 1), (HOUR, 2)]
+        [recent] = tracker.query(conn, 15 * MINUTE, actor="window-agent", now=now)
+        [day] = tracker.query(conn, 24 * HOUR, actor="window-agent", now=now)
+    assert recent["count"] == 1 and abs(recent["p50_ms"] - 300) <= 3
+    assert day["count"] == 2 and abs(day["p50_ms"] - 100) <= 1
+
+    restarted = LatencyTracker(slow_window=HOUR, min_samples=1)
+    restarted.load(backend.db, now=now)
+    assert restarted.classify("window-agent", "scan", "success", 400) == "slow"
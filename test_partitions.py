@@ -0,0 +1,115 @@
+"""
+Time-partitioned activity_log: migration, routing and retention.
+"""
+
+import datetime
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+import migrations
+from db import Database
+from partitions import ActivityStore
+from records import ActivityRecord
+
+# The pre-partitioning tables migrations 1-4 expect
+BASE_SCHEMA = [
+    "CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, description TEXT, status TEXT, "
+    "assignee TEXT, tags TEXT, created_at TEXT, updated_at TEXT)",
+    "CREATE TABLE components (id INTEGER PRIMARY KEY AUTOINCREMENT, part_number TEXT, description TEXT, "
+    "tags TEXT, created_at TEXT)",
+    "CREATE TABLE subagents (id TEXT PRIMARY KEY, name TEXT, status TEXT, started_at TEXT)",
+    """CREATE TABLE activity_log (id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, actor TEXT NOT NULL,
+                                  action TEXT NOT NULL, status TEXT DEFAULT 'pending', description TEXT,
+                                  duration_ms INTEGER DEFAULT 0, metadata TEXT, created_at TEXT)""",
+]
+
+
+def row(i: int, timestamp: str, actor: str = "Morty") -> tuple:
+    return (f"a-{i}", timestamp, actor, "test", "success", f"row {i}", i, "{}", timestamp)
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """A schema v4 database with rows in the old activity_log table"""
+    path = str(tmp_path / "hooker.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    with monkeypatch.context() as mp:
+        mp.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:4])
+        migrations.apply_migrations(conn)
+    conn.executemany("INSERT INTO activity_log VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [row(i, f"2026-03-{1 + i:02d}T12:00:00") for i in range(10)])
+    conn.close()
+    return path
+
+
+def test_migration_moves_rows_into_weekly_partitions(legacy_db):
+    conn = sqlite3.connect(legacy_db, isolation_level=None)
+    migrations.apply_migrations(conn)
+    store = ActivityStore(granularity="week")
+
+    # 2026-03-01 is a Sunday, so ten days span three ISO weeks
+    assert store.partitions(conn) == [("activity_20260223", "2026-02-23", "2026-03-02"),
+                                      ("activity_20260302", "2026-03-02", "2026-03-09"),
+                                      ("activity_20260309", "2026-03-09", "2026-03-16")]
+    assert conn.execute("SELECT type FROM sqlite_master WHERE name = 'activity_log'").fetchone()[0] == "view"
+    assert [r[0] for r in conn.execute("SELECT id FROM activity_log ORDER BY timestamp")] == [f"a-{i}" for i in range(10)]
+    assert conn.execute("SELECT COUNT(*) FROM activity_20260302").fetchone()[0] == 7
+
+    # Partitions keep feeding /sync under the logical table name
+    conn.execute("UPDATE activity_20260302 SET status = 'error' WHERE id = 'a-3'")
+    assert conn.execute("SELECT entity, entity_id, op FROM changes ORDER BY rev DESC LIMIT 1").fetchone() == \
+        ("activity_log", "a-3", "upsert")
+    conn.close()
+
+
+def test_reads_only_touch_overlapping_partitions(legacy_db):
+    conn = sqlite3.connect(legacy_db, isolation_level=None)
+    migrations.apply_migrations(conn)
+    store = ActivityStore(granularity="day")
+    # New rows land in day partitions fitted around the existing weekly ones
+    store.insert(conn, [row(100, "2026-03-16T08:00:00"), row(101, "2026-03-17T08:00:00")])
+    assert [p.name for p in store.partitions(conn, since="2026-03-16")] == ["activity_20260316", "activity_20260317"]
+
+    queried = []
+    conn.set_trace_callback(queried.append)
+    page = store.select(conn, ActivityRecord, ["actor = ?"], ["Morty"], 3)
+    assert [r.id for r in page] == ["a-101", "a-100", "a-9"]
+    assert " ".join(queried).count("FROM activity_2026") == 3
+
+    queried.clear()
+    page = store.select(conn, ActivityRecord, ["(timestamp, id) < (?, ?)"], ["2026-03-05T12:00:00", "a-4"], 2,
+                        until="2026-03-05T12:00:00")
+    assert [r.id for r in page] == ["a-3", "a-2"]
+    assert "activity_20260309" not in " ".join(queried)
+    conn.close()
+
+
+def test_retention_archives_and_drops_whole_partitions(legacy_db, tmp_path):
+    conn = sqlite3.connect(legacy_db, isolation_level=None)
+    migrations.apply_migrations(conn)
+    conn.close()
+    database = Database(legacy_db).open()
+    store = ActivityStore(granularity="week", retention_days=7, archive_dir=str(tmp_path / "archive"))
+
+    queried = []
+    with database.writer() as writer:
+        writer.set_trace_callback(queried.append)
+    dropped = store.enforce_retention(database, today=datetime.date(2026, 3, 16))
+    assert dropped == ["activity_20260223", "activity_20260302"]
+    assert not [sql for sql in queried if sql.startswith("DELETE FROM activity_2026")]
+
+    with gzip.open(tmp_path / "archive" / "activity_20260302.ndjson.gz") as f:
+        archived = [json.loads(line) for line in f]
+    assert [e["id"] for e in archived] == [f"a-{i}" for i in range(1, 8)]
+
+    with database.reader() as reader:
+        assert [p.name for p in store.partitions(reader)] == ["activity_20260309"]
+        assert reader.execute("SELECT COUNT(*) FROM activity_log").fetchone()[0] == 2
+        assert reader.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    database.close()
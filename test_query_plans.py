@@ -0,0 +1,230 @@
+"""
+Query planner audit.
+
+Drives every API route against a scratch database while tracing the SQL
+it issues, then runs EXPLAIN QUERY PLAN for each distinct statement on a
+database seeded with HOOKER_PLAN_ROWS activity rows (1M by default) and
+fails on full table scans or temp-B-tree sorts.
+"""
+
+import os
+import re
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+import db as db_module
+import export
+from records import ComponentRecord, TaskRecord
+
+PLAN_ROWS = int(os.environ.get("HOOKER_PLAN_ROWS", "1000000"))
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize(sql: str) -> str:
+    return " ".join(_LITERAL.sub("?", sql).split())
+
+
+# Listings that return a whole (small) table by design
+EXPECTED_FULL_READS = {
+    normalize(f"SELECT {TaskRecord.COLUMNS} FROM tasks ORDER BY id"),
+    normalize(f"SELECT {ComponentRecord.COLUMNS} FROM components ORDER BY id"),
+    "SELECT * FROM webhooks",
+    "SELECT id, url, events FROM webhooks",  # subscription index, loaded once at startup
+    "SELECT name, tasks FROM tags",  # one row per distinct tag, for unfiltered facets
+    "SELECT name, components FROM tags",
+    "SELECT seq FROM sqlite_sequence WHERE name = ?",  # one row per AUTOINCREMENT table (the /sync revision)
+}
+
+
+@pytest.fixture(scope="module")
+def api_queries(monkeypatch_module):
+    """Every distinct read/update/delete statement the API issues"""
+    seen = {}
+
+    def trace(sql):
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        if head in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            seen.setdefault(normalize(sql), sql)
+
+    original = db_module.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = original(*args, **kwargs)
+        conn.set_trace_callback(trace)
+        return conn
+
+    monkeypatch_module.setattr(db_module, "connect", traced_connect)
+    database = db_module.Database(os.environ["HOOKER_DB"])
+    backend.app.dependency_overrides[db_module.get_db] = lambda: database
+    try:
+        with TestClient(backend.app, raise_server_exceptions=False) as client:
+            _exercise_api(client, monkeypatch_module, database)
+    finally:
+        backend.app.dependency_overrides.pop(db_module.get_db, None)
+        database.close()
+    return seen
+
+
+def _exercise_api(client: TestClient, monkeypatch_module, database):
+    task = client.post("/tasks", json={"title": "plan", "tags": ["audit"]}).json()
+    client.post("/tasks", json={"title": "plan 2", "tags": ["audit", "plan"]})
+    client.get("/tasks")
+    _walk_pages(client, "/tasks", {"limit": 1})
+    _walk_pages(client, "/tasks", {"status": "TODO", "limit": 1})
+    _walk_pages(client, "/tasks", {"fields": "title,status", "limit": 1})
+    _walk_pages(client, "/tasks", {"tag": ["audit", "plan"], "limit": 1})
+    _walk_pages(client, "/tasks", {"tag": ["audit", "plan"], "tag_mode": "any", "status": "TODO", "limit": 1})
+    client.get("/tasks/tags")
+    client.get("/tasks/tags", params={"tag": "audit", "status": "TODO"})
+    client.put(f"/tasks/{task['id']}", json={"status": "DONE"})
+    client.put(f"/tasks/{task['id']}", json={"title": "stale"}, headers={"If-Match": '"1"'})
+    client.patch("/tasks/bulk", json={"ids": [task["id"]], "set": {"priority": "HIGH"}})
+    client.patch("/tasks/bulk", json={"filter": {"status": "DONE", "tag": ["audit"]}, "set": {"status": "DONE"}})
+    client.patch("/tasks/bulk", json={"filter": {"assignee": "nobody"}, "set": {"priority": "LOW"}})
+    client.request("DELETE", "/tasks/bulk", json={"filter": {"assignee": "nobody", "tag": ["audit"], "tag_mode": "any"}})
+    client.delete(f"/tasks/{task['id']}")
+    client.post("/tasks", json={"title": "plan due", "due_date": "2099-01-01", "recurring": True, "recurrence": "weekly"})
+    client.get("/stats/scheduler")
+
+    comp = client.post("/components", json={"part_number": "PLAN-1", "tags": ["smd"]}).json()
+    client.post("/components", json={"part_number": "PLAN-2", "tags": ["smd", "0603"]})
+    client.get("/components")
+    _walk_pages(client, "/components", {"limit": 1})
+    _walk_pages(client, "/components", {"tag": "smd", "limit": 1})
+    client.get("/components", params={"tag": ["0603", "0805"], "tag_mode": "any"})
+    client.get("/components/tags")
+    client.get("/components/tags", params={"tag": "smd"})
+    client.put(f"/components/{comp['id']}", json={"stock": 3}, headers={"If-Match": f'"{comp["version"]}"'})
+    client.delete(f"/components/{comp['id']}")
+
+    hook = client.post("/webhooks", json={"url": "http://127.0.0.1:9/hook"}).json()
+    client.get("/webhooks")
+    client.delete(f"/webhooks/{hook['id']}")
+
+    entry = client.post("/activity", json={"actor": "Morty", "action": "plan", "description": "audit"}).json()
+    client.post("/activity/batch", json=[{"actor": "Morty", "action": "plan", "description": "audit", "status": "error"}] * 2)
+    client.get(f"/activity/{entry['id']}")
+    client.get("/stats/activity")
+    client.get("/search", params={"q": "aud"})
+    client.get("/search", params={"q": "audit plan", "type": "activity", "order": "recent", "since": "2026-01-01"})
+    for params in ({}, {"status": "error"}, {"actor": "Morty"}, {"status": "error", "actor": "Morty"}):
+        _walk_pages(client, "/activity", {**params, "limit": 1})
+    _walk_pages(client, "/activity", {"fields": "actor,status", "limit": 1})
+
+    client.post("/subagents", json={"name": "planner"})
+    client.post("/subagents", json={"name": "planner 2"})
+    agent = client.get("/subagents").json()[0]
+    _walk_pages(client, "/subagents", {"limit": 1})
+    _walk_pages(client, "/subagents", {"status": "spawned", "limit": 1})
+    _walk_pages(client, "/subagents", {"fields": "name,status", "limit": 1})
+    client.get(f"/subagents/{agent['id']}")
+    client.put(f"/subagents/{agent['id']}", json={"status": "done"})
+    client.post(f"/subagents/{agent['id']}/logs", content=b"started\n")
+    client.post(f"/subagents/{agent['id']}/logs", content=b"done\n")
+    client.get(f"/subagents/{agent['id']}/logs", params={"offset": 3})
+    client.get(f"/subagents/{agent['id']}/logs", params={"tail": 4, "stream": "stderr"})
+
+    done = client.post("/tasks", json={"title": "plan 3", "assignee": "Morty"}).json()
+    client.put(f"/tasks/{done['id']}", json={"status": "DONE"})
+    backend.rollup.flush(database)
+    client.get("/stats")
+    client.get("/stats", params={"bucket": "week", "actor": "Morty", "since": "2026-01-01"})
+    backend.latency.flush(database)
+    client.get("/stats/latency")
+    client.get("/stats/latency", params={"window": "7d", "actor": "Morty", "action": "test"})
+
+    client.get("/sync")
+    monkeypatch_module.setattr(export, "CHUNK_ROWS", 1)
+    client.get("/tasks/export")
+    client.get("/tasks/export", params={"status": "DONE", "since": "2026-01-01"})
+    client.get("/activity/export", params={"format": "csv"})
+    client.get("/activity/export", params={"actor": "Morty", "since": "2026-01-01", "until": "2099-01-01"})
+    client.get("/activity/export", params={"status": "error"})
+    client.get("/subagents/export", params={"status": "done", "since": "2026-01-01"})
+    client.get("/subagents/export", params={"gzip": True})
+    client.get("/sync", params={"since": 0})
+    client.get("/sync", params={"since": 0, "limit": 1})
+
+
+def _walk_pages(client: TestClient, url: str, params: dict):
+    """Follow X-Next-Cursor to the end so cursor queries get traced too"""
+    pages = 0
+    while True:
+        r = client.get(url, params=params)
+        assert r.status_code == 200, r.text
+        pages += 1
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+        params = {**params, "cursor": cursor}
+
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as mp:
+        yield mp
+
+
+@pytest.fixture(scope="module")
+def seeded_db(tmp_path_factory):
+    """A copy of the live schema filled with PLAN_ROWS activity rows"""
+    path = str(tmp_path_factory.mktemp("plans") / "seeded.db")
+    src = sqlite3.connect(os.environ["HOOKER_DB"])
+    # FTS5 creates its own shadow tables (<index>_data, _idx, ...); leaving out the index triggers keeps the
+    # seed fast, and the search plans do not depend on what is indexed
+    schema = src.execute("""SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+                            AND name NOT GLOB '*_fts_*'""").fetchall()
+    version = src.execute("PRAGMA user_version").fetchone()[0]
+    src.close()
+
+    conn = sqlite3.connect(path)
+    for (sql,) in schema:
+        conn.execute(sql)
+    conn.execute(f"PRAGMA user_version = {version}")
+
+    series = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+    # Every activity partition the API touched gets the full seed; plans do not depend on the dates
+    partitions = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                                   "AND name GLOB 'activity_[0-9]*' AND name NOT GLOB '*_fts*'")]
+    assert partitions
+    for partition in partitions:
+        conn.execute(series + f"""INSERT INTO {partition} (id, timestamp, actor, action, status, description, duration_ms, metadata, created_at)
+                                  SELECT printf('seed-%d', i), strftime('%Y-%m-%dT%H:%M:%f', '2026-01-01', printf('+%d seconds', i)),
+                                         'Agent-' || (i % 50), 'seed', CASE i % 10 WHEN 0 THEN 'error' ELSE 'success' END,
+                                         'seeded', i % 5000, '{{}}', NULL FROM n""", (PLAN_ROWS,))
+    conn.execute(series + """INSERT INTO tasks (title, status, assignee, priority, tags, created_at, updated_at)
+                             SELECT 'task ' || i, CASE i % 4 WHEN 0 THEN 'DONE' ELSE 'TODO' END, 'Morty', 'NORMAL', '[]',
+                                    '2026-01-01', '2026-01-01' FROM n""", (PLAN_ROWS // 10,))
+    conn.execute(series + """INSERT INTO subagents (id, name, status, started_at, created_at)
+                             SELECT printf('agent-%d', i), 'agent ' || i, CASE i % 3 WHEN 0 THEN 'done' ELSE 'running' END,
+                                    strftime('%Y-%m-%dT%H:%M:%f', '2026-01-01', printf('+%d seconds', i)), NULL FROM n""", (PLAN_ROWS // 10,))
+    conn.execute(series + """INSERT INTO subagent_logs (agent_id, stream, start, data)
+                             SELECT printf('agent-%d', i % 100), 'stdout', (i / 100) * 65536, zeroblob(16) FROM n""", (PLAN_ROWS // 10,))
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_api_queries_were_captured(api_queries):
+    tables = " ".join(api_queries)
+    for table in ("tasks", "components", "webhooks", "activity_log", "subagents", "changes"):
+        assert table in tables
+
+
+def test_no_full_table_scans(api_queries, seeded_db):
+    offenders = []
+    for key, sql in sorted(api_queries.items()):
+        if key in EXPECTED_FULL_READS:
+            continue
+        plan = [row[3] for row in seeded_db.execute("EXPLAIN QUERY PLAN " + sql)]
+        # An unfiltered first page walks rowid order and stops at the LIMIT
+        bounded = " LIMIT " in key and " WHERE " not in key
+        bad = [step for step in plan
+               if (re.fullmatch(r"SCAN \w+", step) and not bounded) or step.startswith("USE TEMP B-TREE")]
+        if bad:
+            offenders.append(f"{key}\n    " + "\n    ".join(plan))
+    assert not offenders, "Queries without a usable index:\n" + "\n".join(offenders)
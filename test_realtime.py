@@ -0,0 +1,155 @@
+"""
+ConnectionManager fan-out tests using in-memory fake sockets.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from realtime import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.received = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise RuntimeError("socket is gone")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(text)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_message_is_serialized_once_and_shared():
+    async def scenario():
+        manager = ConnectionManager()
+        sockets = [FakeSocket() for _ in range(3)]
+        for ws in sockets:
+            await manager.connect(ws)
+        manager.publish({"type": "activity_created", "data": {"id": "a"}})
+        await settle()
+        texts = [ws.received[0] for ws in sockets]
+        assert json.loads(texts[0]) == {"type": "activity_created", "data": {"id": "a"}}
+        assert all(text is texts[0] for text in texts)
+
+    asyncio.run(scenario())
+
+
+def test_slow_client_does_not_delay_others():
+    async def scenario():
+        manager = ConnectionManager(queue_size=4)
+        slow, fast = FakeSocket(delay=10), FakeSocket()
+        await manager.connect(slow)
+        await manager.connect(fast)
+        for i in range(10):
+            manager.publish({"n": i})
+            await settle()
+        assert [json.loads(t)["n"] for t in fast.received] == list(range(10))
+        assert len(manager.clients[slow].queue) == 4
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "coalesce", "disconnect"])
+def test_slow_consumer_policies(policy):
+    async def scenario():
+        manager = ConnectionManager(queue_size=3, policy=policy)
+        slow = FakeSocket(delay=10)
+        await manager.connect(slow)
+        manager.publish({"n": 0})
+        await settle()  # writer picks up n=0 and blocks on the slow send
+        for i in range(1, 6):
+            manager.publish({"n": i})
+        await settle()
+
+        if policy == "disconnect":
+            assert slow not in manager.clients
+            assert slow.closed_with == 1013
+            assert manager.evicted == 1
+            return
+        queued = [json.loads(t) for t in manager.clients[slow].queue]
+        if policy == "drop_oldest":
+            assert queued == [{"n": 3}, {"n": 4}, {"n": 5}]
+        else:
+            assert queued[0]["type"] == "resync"
+            assert queued[-1] == {"n": 5}
+        assert manager.dropped > 0
+
+    asyncio.run(scenario())
+
+
+def test_dead_connections_are_removed():
+    async def scenario():
+        manager = ConnectionManager()
+        dead, alive = FakeSocket(fail=True), FakeSocket()
+        await manager.connect(dead)
+        await manager.connect(alive)
+        manager.publish({"n": 1})
+        await settle()
+        assert dead not in manager.clients
+        assert alive in manager.clients
+        assert manager.publish({"n": 2}) == 1
+
+    asyncio.run(scenario())
+
+
+def test_topic_subscriptions_filter_broadcasts():
+    async def scenario():
+        manager = ConnectionManager()
+        firehose, morty, agent = FakeSocket(), FakeSocket(), FakeSocket()
+        for ws in (firehose, morty, agent):
+            await manager.connect(ws)
+        manager.handle_frame(morty, json.dumps({"action": "subscribe", "topics": ["actor:Morty", "status:error"]}))
+        manager.handle_frame(agent, json.dumps({"action": "subscribe", "topics": ["subagent:abc"]}))
+        manager.handle_frame(agent, "ping")
+        await settle()
+        assert json.loads(morty.received.pop())["topics"] == ["actor:Morty", "status:error"]
+        assert json.loads(agent.received.pop())["topics"] == ["subagent:abc"]
+
+        assert manager.publish({"type": "activity_created", "data": {"actor": "Morty", "status": "success"}}) == 2
+        manager.publish({"type": "activity_created", "data": {"actor": "Filip", "status": "error"}})
+        manager.publish({"type": "activity_created", "data": {"actor": "Filip", "status": "success"}})
+        manager.publish({"type": "subagent_updated", "data": {"id": "abc", "status": "done"}})
+        await settle()
+
+        actors = lambda ws: [json.loads(t)["data"].get("actor") for t in ws.received]
+        assert len(firehose.received) == 4
+        assert actors(morty) == ["Morty", "Filip"]
+        assert [json.loads(t)["data"]["id"] for t in agent.received] == ["abc"]
+
+        manager.handle_frame(morty, json.dumps({"action": "unsubscribe", "topics": ["actor:Morty", "status:error"]}))
+        manager.handle_frame(agent, json.dumps({"action": "subscribe", "topics": ["*"]}))
+        await settle()
+        assert manager.publish({"type": "activity_created", "data": {"actor": "Morty"}}) == 2
+        assert "actor:Morty" not in manager.subscribers
+
+    asyncio.run(scenario())
+
+
+def test_invalid_subscribe_frame_is_rejected():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeSocket()
+        await manager.connect(ws)
+        manager.handle_frame(ws, json.dumps({"action": "subscribe", "topics": "actor:Morty"}))
+        await settle()
+        assert json.loads(ws.received[0])["type"] == "error"
+        assert manager.clients[ws].topics == {"*"}
+
+    asyncio.run(scenario())
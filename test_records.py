@@ -0,0 +1,75 @@
+"""
+The records + orjson list path must produce what the pydantic models would.
+"""
+
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+import backend
+from records import ActivityRecord, SubAgentRecord, TaskRecord, fetch_records, field_names, project, render
+
+
+def _conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""CREATE TABLE tasks (id INTEGER PRIMARY KEY, title TEXT, description TEXT, status TEXT, assignee TEXT,
+                    priority TEXT, tags TEXT, due_date TEXT, recurring INTEGER, recurrence TEXT, created_at TEXT, updated_at TEXT,
+                    version INTEGER DEFAULT 1, overdue_at TEXT)""")
+    conn.execute("""CREATE TABLE activity_log (id TEXT PRIMARY KEY, timestamp TEXT, actor TEXT, action TEXT, status TEXT,
+                    description TEXT, duration_ms INTEGER, metadata TEXT, created_at TEXT)""")
+    return conn
+
+
+def test_tasks_match_the_pydantic_model():
+    conn = _conn()
+    conn.executemany("INSERT INTO tasks VALUES (?, ?, ?, 'TODO', 'Morty', 'HIGH', ?, NULL, ?, NULL, 'c', 'u', 1, NULL)",
+                     [(1, 'plain', 'd', '["a", "ž"]', 1), (2, 'empty tags', None, None, 0),
+                      (3, 'broken tags', '', 'not json', 0), (4, 'quote "x"', 'multi\nline', '[]', 0)])
+    fast = json.loads(render(fetch_records(conn, TaskRecord, f"SELECT {TaskRecord.COLUMNS} FROM tasks ORDER BY id")))
+
+    conn.row_factory = sqlite3.Row
+    rows = [backend._task_row(row) for row in conn.execute("SELECT * FROM tasks ORDER BY id")]
+    adapter = TypeAdapter(list[backend.Task])
+    assert fast == adapter.dump_python(adapter.validate_python(rows))
+
+
+def test_activity_metadata_is_spliced_verbatim():
+    conn = _conn()
+    conn.execute("""INSERT INTO activity_log VALUES ('a', 't', 'Morty', 'x', 'success', 'd', 5, '{"k": [1, {"n": null}]}', NULL)""")
+    conn.execute("""INSERT INTO activity_log VALUES ('b', 't', 'Morty', 'x', 'error', 'd', 0, '{"k": NaN}', NULL)""")
+    fast = json.loads(render(fetch_records(conn, ActivityRecord, f"SELECT {ActivityRecord.COLUMNS} FROM activity_log ORDER BY id")))
+    assert [entry["metadata"] for entry in fast] == [{"k": [1, {"n": None}]}, {}]
+    assert render([]) == b"[]"
+
+
+def test_projection_selects_only_the_chosen_columns():
+    conn = _conn()
+    conn.execute("""INSERT INTO tasks VALUES (1, 'plain', 'd', 'TODO', 'Morty', 'HIGH', '["a"]', NULL, 1, NULL, 'c', 'u', 1, NULL)""")
+    slim = project(TaskRecord, ["tags", "id", "status"])
+    assert field_names(slim) == ["id", "status", "tags"]
+    assert slim.COLUMNS.startswith("id, status, CAST(")
+    assert json.loads(render(fetch_records(conn, slim, f"SELECT {slim.COLUMNS} FROM tasks"))) == \
+        [{"id": 1, "status": "TODO", "tags": ["a"]}]
+    assert project(TaskRecord, field_names(TaskRecord)) is TaskRecord
+    assert project(TaskRecord, ["status", "id"]) is project(TaskRecord, ["id", "status"])
+    with pytest.raises(ValueError, match="stdout"):
+        project(SubAgentRecord, ["id", "stdout"])
+
+
+def test_fields_parameter_on_listings():
+    with TestClient(backend.app) as client:
+        task = client.post("/tasks", json={"title": "projected", "tags": ["p"]}).json()
+        tasks = client.get("/tasks", params={"fields": "title,tags"}).json()
+        assert {"id": task["id"], "title": "projected", "tags": ["p"]} in tasks
+        assert all(set(t) == {"id", "title", "tags"} for t in tasks)
+
+        client.post("/activity", json={"actor": "Morty", "action": "probe", "description": "projected"})
+        entries = client.get("/activity", params={"fields": "actor", "limit": 1}).json()
+        assert set(entries[0]) == {"id", "timestamp", "actor"}
+
+        assert client.get("/subagents", params={"fields": "name, status"}).status_code == 200
+        r = client.get("/subagents", params={"fields": "name,stdout"})
+        assert r.status_code == 422 and "stdout" in r.json()["detail"]
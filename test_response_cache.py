@@ -0,0 +1,49 @@
+"""
+Response cache and ETag tests for the list endpoints.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+def test_unchanged_poll_is_not_modified(client):
+    client.post("/components", json={"part_number": "ETAG-1", "tags": ["cache"]})
+    first = client.get("/components")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    hits = backend.response_cache.hits
+    again = client.get("/components", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+    assert backend.response_cache.hits == hits + 1
+
+
+def test_write_invalidates_cached_listing(client):
+    task = client.post("/tasks", json={"title": "cached"}).json()
+    before = client.get("/tasks")
+    client.put(f"/tasks/{task['id']}", json={"status": "DONE"})
+
+    after = client.get("/tasks", headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert {t["id"]: t["status"] for t in after.json()}[task["id"]] == "DONE"
+
+
+def test_cached_pages_keep_their_cursor(client):
+    for i in range(3):
+        client.post("/tasks", json={"title": f"page {i}"})
+    first = client.get("/tasks", params={"limit": 2})
+    cached = client.get("/tasks", params={"limit": 2})
+    assert cached.json() == first.json()
+    assert cached.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+    assert cached.headers["Link"] == first.headers["Link"]
@@ -0,0 +1,79 @@
+"""
+Analytics rollups behind GET /stats, and the duration sketches they keep.
+"""
+
+import datetime
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+from sketches import ALPHA, DDSketch
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+def test_sketch_quantiles_merge_within_relative_error():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(5, 1.5) for _ in range(20000)] + [0] * 100
+    left, right = DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+    merged = DDSketch.from_bytes(left.merge(right).to_bytes())
+
+    values.sort()
+    assert merged.count == len(values)
+    for q in (0.5, 0.9, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(merged.quantile(q) - exact) <= ALPHA * exact * 1.01
+    assert merged.quantile(0) == 0
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_stats_roll_up_activity_and_completed_tasks(client):
+    actor = "rollup-agent"
+    for i in range(1, 101):
+        client.post("/activity", json={"actor": actor, "action": "rollup", "description": f"run {i}",
+                                       "status": "error" if i % 10 == 0 else "success", "duration_ms": i * 10})
+    task = client.post("/tasks", json={"title": "rolled up", "assignee": actor}).json()
+    client.put(f"/tasks/{task['id']}", json={"status": "DONE"})
+    client.put(f"/tasks/{task['id']}", json={"title": "still done"})
+    backend.rollup.flush(backend.db)
+
+    today = datetime.datetime.utcnow().date()
+    stats = client.get("/stats", params={"actor": actor}).json()
+    assert [b["start"] for b in stats["buckets"]] == [today.isoformat()]
+    totals = stats["totals"]
+    assert totals["total_activities"] == 100
+    assert totals["errors_count"] == 10
+    assert totals["tasks_completed"] == 1
+    assert totals["most_active_agent"] == actor
+    assert abs(totals["p50_duration_ms"] - 500) <= 10
+    assert abs(totals["p95_duration_ms"] - 950) <= 20
+
+    weekly = client.get("/stats", params={"bucket": "week"}).json()
+    monday = today - datetime.timedelta(days=today.weekday())
+    assert weekly["buckets"][-1]["start"] == monday.isoformat()
+    assert weekly["totals"]["total_activities"] >= 100
+    assert weekly["totals"]["tasks_completed"] >= 1
+
+    assert client.get("/stats", params={"bucket": "hour"}).status_code == 422
+
+
+def test_rebuild_matches_incremental_rollups(client):
+    client.post("/activity", json={"actor": "rebuild-agent", "action": "rollup", "description": "x", "duration_ms": 42})
+    backend.rollup.flush(backend.db)
+    # Other modules delete tasks they completed, which only the incremental counts remember
+    query = "SELECT * FROM analytics_actors WHERE actor IN ('rollup-agent', 'rebuild-agent') ORDER BY date, actor"
+    with backend.db.reader() as conn:
+        incremental = [tuple(row) for row in conn.execute(query)]
+    with backend.db.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        backend.rollup.rebuild(conn, backend.activity_store)
+    with backend.db.reader() as conn:
+        assert [tuple(row) for row in conn.execute(query)] == incremental
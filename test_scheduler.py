@@ -0,0 +1,166 @@
+"""
+The due-date scheduler: heap upkeep, overdue stamps and recurring occurrences on a fake clock.
+"""
+
+import asyncio
+import datetime
+import os
+import sqlite3
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+from db import Database
+from scheduler import Scheduler, next_due
+
+
+class Clock:
+    def __init__(self, now: str):
+        self.now = datetime.datetime.fromisoformat(now)
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def database():
+    # backend built the schema at import; far-future dates keep the app's own scheduler off these rows
+    database = Database(os.environ["HOOKER_DB"]).open()
+    yield database
+    database.close()
+
+
+def _insert(database, title, due_date, recurring=0, recurrence=None, status="TODO"):
+    with database.writer() as conn:
+        row = conn.execute("""INSERT INTO tasks (title, status, priority, tags, due_date, recurring, recurrence, created_at, updated_at)
+                              VALUES (?, ?, 'HIGH', '["cal"]', ?, ?, ?, 'c', 'u') RETURNING *""",
+                           (title, status, due_date, recurring, recurrence)).fetchone()
+    return dict(row)
+
+
+def _row(database, task_id):
+    with database.reader() as conn:
+        return dict(conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+
+def test_next_due_keeps_the_format_and_skips_missed_periods():
+    now = datetime.datetime(2099, 3, 10, 12)
+    assert next_due("2099-03-09", "daily", now) == "2099-03-10"
+    assert next_due("2099-02-20", "weekly", now) == "2099-03-13"
+    assert next_due("2099-01-31", "monthly", now) == "2099-03-31"
+    assert next_due("2099-03-10T09:30:00", "daily", now) == "2099-03-11T09:30:00"
+    assert next_due("2099-03-10", "yearly", now) is None
+
+
+def test_heap_follows_task_changes():
+    scheduler = Scheduler(None, clock=Clock("2099-01-01"))
+    scheduler.apply({"upsert": [
+        {"id": 1, "due_date": "2099-01-05", "status": "TODO", "version": 1},
+        {"id": 2, "due_date": "2099-01-03T08:00:00", "status": "TODO", "version": 1},
+        {"id": 3, "due_date": "2099-01-02", "status": "DONE", "version": 1},
+        {"id": 4, "due_date": "not a date", "status": "TODO", "version": 1},
+    ]})
+    assert scheduler.next_fire() == datetime.datetime(2099, 1, 3, 8)
+    assert scheduler.stats()["pending"] == 2
+
+    # Moving a task leaves its old entry behind, skipped when it surfaces
+    scheduler.schedule({"id": 2, "due_date": "2099-01-09", "status": "TODO", "version": 2})
+    assert scheduler.next_fire() == datetime.datetime(2099, 1, 6)
+    scheduler.apply({"delete": [1]})
+    assert scheduler.next_fire() == datetime.datetime(2099, 1, 10)
+    assert scheduler.pop_due(datetime.datetime(2099, 1, 9)) == []
+    assert scheduler.pop_due(datetime.datetime(2099, 1, 10)) == [(datetime.datetime(2099, 1, 10), 2, 2, False, True)]
+    assert scheduler.next_fire() is None
+
+
+def test_run_due_marks_overdue_and_spawns_the_next_occurrence(database):
+    fired = []
+    scheduler = Scheduler(database, clock=Clock("2099-06-01T00:00:01"), on_fired=lambda *rows: fired.append(rows))
+    late = _insert(database, "late", "2099-05-30")
+    weekly = _insert(database, "weekly", "2099-05-31", recurring=1, recurrence="weekly", status="DONE")
+    later = _insert(database, "later", "2099-06-01")
+    for task in (late, weekly, later):
+        scheduler.schedule(task)
+
+    assert asyncio.run(scheduler.run_due()) == 2
+    assert _row(database, late["id"])["overdue_at"] == "2099-06-01T00:00:01"
+    assert _row(database, later["id"])["overdue_at"] is None
+    old = _row(database, weekly["id"])
+    assert old["recurring"] == 0 and old["overdue_at"] is None and old["version"] == 2
+
+    (claimed, spawned), = fired
+    assert {task["id"] for task in claimed} == {late["id"], weekly["id"]}
+    new, = spawned
+    assert (new["title"], new["status"], new["due_date"], new["recurring"], new["tags"]) == \
+        ("weekly", "TODO", "2099-06-07", 1, '["cal"]')
+    assert scheduler.stats()["spawned"] == 1 and scheduler.stats()["overdue"] == 1
+
+
+def test_a_task_edited_after_scheduling_is_rescheduled_not_fired(database):
+    clock = Clock("2099-07-02")
+    scheduler = Scheduler(database, clock=clock)
+    task = _insert(database, "edited", "2099-07-01")
+    scheduler.schedule(task)
+    # Changed behind the scheduler's back: the version claim fails
+    with database.writer() as conn:
+        conn.execute("UPDATE tasks SET due_date = '2099-07-04', version = version + 1 WHERE id = ?", (task["id"],))
+
+    assert asyncio.run(scheduler.run_due()) == 0
+    assert _row(database, task["id"])["overdue_at"] is None
+    assert scheduler.stats()["conflicts"] == 1
+    assert scheduler.next_fire() == datetime.datetime(2099, 7, 5)
+
+    clock.now = datetime.datetime(2099, 7, 5)
+    assert asyncio.run(scheduler.run_due()) == 1
+    assert _row(database, task["id"])["overdue_at"] == "2099-07-05T00:00:00"
+
+
+def test_a_failed_batch_is_retried_on_the_next_pass(database):
+    scheduler = Scheduler(database, clock=Clock("2099-08-03"))
+    task = _insert(database, "retried", "2099-08-01")
+    scheduler.schedule(task)
+    fire = scheduler.fire
+    calls = []
+
+    def busy_once(conn, due, now):
+        calls.append(due)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return fire(conn, due, now)
+
+    scheduler.fire = busy_once
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(scheduler.run_due())
+    assert _row(database, task["id"])["overdue_at"] is None
+    assert scheduler.next_fire() == datetime.datetime(2099, 8, 2)
+
+    assert asyncio.run(scheduler.run_due()) == 1
+    assert _row(database, task["id"])["overdue_at"] == "2099-08-03T00:00:00"
+    assert len(calls) == 2
+
+
+def test_routes_keep_the_app_scheduler_current():
+    with TestClient(backend.app) as client:
+        task = client.post("/tasks", json={"title": "calendar", "due_date": "2099-08-01"}).json()
+        assert backend.scheduler._pending[task["id"]][0] == datetime.datetime(2099, 8, 2)
+        client.put(f"/tasks/{task['id']}", json={"due_date": "2099-09-01"})
+        assert backend.scheduler._pending[task["id"]][:2] == (datetime.datetime(2099, 9, 2), 2)
+        client.put(f"/tasks/{task['id']}", json={"status": "DONE"})
+        assert task["id"] not in backend.scheduler._pending
+
+        gone = client.post("/tasks", json={"title": "calendar", "due_date": "2099-08-01"}).json()
+        client.delete(f"/tasks/{gone['id']}")
+        assert gone["id"] not in backend.scheduler._pending
+
+        # Already past due: the loop wakes and stamps it
+        late = client.post("/tasks", json={"title": "calendar", "due_date": "2020-01-01"}).json()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            current, = [t for t in client.get("/tasks").json() if t["id"] == late["id"]]
+            if current["overdue_at"]:
+                break
+            time.sleep(0.05)
+        assert current["overdue_at"] and current["version"] == 2
+        assert client.get("/stats/scheduler").json()["overdue"] >= 1
@@ -0,0 +1,81 @@
+"""
+Full-text search over tasks, components and activity (GET /search).
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+import search
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+def _search(client, q, **params):
+    r = client.get("/search", params={"q": q, **params})
+    assert r.status_code == 200
+    return r.json()["results"]
+
+
+def test_match_expression_quotes_every_word_as_a_prefix():
+    assert search.match_expression('LM317 "3.3V" OR -x*') == '"LM317"* "3"* "3V"* "OR"* "x"*'
+    assert search.match_expression(" *() ") is None
+
+
+def test_ranked_prefix_search_with_snippets(client):
+    task = client.post("/tasks", json={"title": "Swap the flaky zetaregulator", "description": "Rail browns out",
+                                       "tags": ["power"]}).json()
+    client.post("/tasks", json={"title": "Bring-up notes", "description": "Check zetaregulator heat and the rail"})
+    client.post("/components", json={"part_number": "ZR1117", "description": "LDO zetaregulator 3.3V",
+                                     "tags": ["smd", "power"]})
+    client.post("/activity", json={"actor": "Morty", "action": "probe",
+                                   "description": "Measured zetaregulator ripple at 40mV"})
+
+    hits = _search(client, "zetareg")
+    assert {hit["type"] for hit in hits} == {"task", "component", "activity"}
+    # Ranked within each type, then interleaved: bm25 scores of different indexes do not compare
+    for kind in ("task", "component", "activity"):
+        scores = [hit["score"] for hit in hits if hit["type"] == kind]
+        assert scores == sorted(scores, reverse=True)
+    assert [hit["type"] for hit in hits[:3]] == ["task", "component", "activity"]
+    # A title hit outranks a description hit
+    tasks = _search(client, "zetareg", type="task")
+    assert [hit["id"] for hit in tasks] == [task["id"], task["id"] + 1]
+    assert tasks[0]["snippet"] == "Swap the flaky <mark>zetaregulator</mark>"
+
+    # Every word has to match
+    assert [hit["id"] for hit in _search(client, "zetareg rail", type="task")] == [task["id"], task["id"] + 1]
+    assert _search(client, "zetareg power", type="component")[0]["title"] == "ZR1117"
+    assert _search(client, "zetareg nowhere") == []
+
+    recent = _search(client, "zetareg", order="recent")
+    assert [hit["timestamp"] for hit in recent] == sorted((hit["timestamp"] for hit in recent), reverse=True)
+    assert client.get("/search", params={"q": "zetareg", "type": "webhook"}).status_code == 422
+
+
+def test_index_follows_updates_and_deletes(client):
+    task = client.post("/tasks", json={"title": "Order omegacaps"}).json()
+    client.put(f"/tasks/{task['id']}", json={"title": "Order thetacaps"})
+    assert _search(client, "omegacaps") == []
+    assert [hit["id"] for hit in _search(client, "thetacaps")] == [task["id"]]
+    # Status changes do not touch the index
+    client.put(f"/tasks/{task['id']}", json={"status": "DONE"})
+    assert len(_search(client, "thetacaps")) == 1
+
+    client.delete(f"/tasks/{task['id']}")
+    assert _search(client, "thetacaps") == []
+
+
+def test_activity_search_is_bounded_by_time(client):
+    client.post("/activity/batch", json=[{"actor": "Morty", "action": "probe", "description": f"kappascope run {i}"}
+                                         for i in range(5)])
+    assert len(_search(client, "kappascope", type="activity", limit=3, order="recent")) == 3
+    assert _search(client, "kappascope", since="2099-01-01") == []
+
+    with backend.db.writer() as conn:
+        search.reindex(conn, backend.activity_store)
+    assert len(_search(client, "kappascope", type="activity")) == 5
@@ -0,0 +1,129 @@
+"""
+Chunked sub-agent logs: appends, range and tail reads, and the live tail.
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+import logs
+import migrations
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(logs, "CHUNK_BYTES", 4)
+
+
+def _log(client, agent_id, **params):
+    r = client.get(f"/subagents/{agent_id}/logs", params=params)
+    assert r.status_code == 200
+    return r.content, int(r.headers["X-Log-Offset"]), int(r.headers["X-Log-Size"]), int(r.headers["X-Log-Next"])
+
+
+def test_migration_moves_logs_into_chunks(monkeypatch, small_chunks):
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute("""CREATE TABLE subagents (id TEXT PRIMARY KEY, name TEXT, status TEXT, started_at TEXT,
+                    completed_at TEXT, stdout TEXT, stderr TEXT, created_at TEXT)""")
+    conn.execute("INSERT INTO subagents (id, stdout, stderr) VALUES ('a', 'hello world', NULL), ('b', '', 'oops')")
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in migrations.MIGRATIONS if m[0] == 10])
+    migrations.apply_migrations(conn)
+
+    assert conn.execute("SELECT id, stdout, stdout_bytes, stderr, stderr_bytes FROM subagents ORDER BY id").fetchall() == \
+        [("a", None, 11, None, 0), ("b", None, 0, None, 4)]
+    assert conn.execute("SELECT start, data FROM subagent_logs WHERE agent_id = 'a' ORDER BY start").fetchall() == \
+        [(0, b"hell"), (4, b"o wo"), (8, b"rld")]
+
+    # Appends top up the last chunk before starting new ones
+    assert logs.append(conn, "a", "stdout", b"!!!") == 11
+    assert conn.execute("SELECT start, data FROM subagent_logs WHERE agent_id = 'a' ORDER BY start").fetchall()[-2:] == \
+        [(8, b"rld!"), (12, b"!!")]
+    for offset in range(15):
+        for limit in (1, 3, 6, 20):
+            assert logs.read(conn, "a", "stdout", offset, limit) == (b"hello world!!!"[offset:offset + limit], min(offset, 14), 14)
+    assert logs.read(conn, "a", "stdout", tail=5)[:2] == (b"ld!!!", 9)
+    with pytest.raises(logs.LogNotFound):
+        logs.read(conn, "nobody", "stdout")
+
+    logs.replace(conn, "a", "stdout", b"fresh")
+    assert logs.read(conn, "a", "stdout") == (b"fresh", 0, 5)
+
+
+def test_append_and_read_ranges(client, small_chunks):
+    agent = client.post("/subagents", json={"name": "logger"}).json()
+    assert (agent["stdout_bytes"], agent["stderr_bytes"]) == (0, 0)
+    for piece, offset in ((b"line one\n", 0), (b"line two\n", 9), (b"", 18)):
+        r = client.post(f"/subagents/{agent['id']}/logs", content=piece)
+        assert r.json() == {"stream": "stdout", "offset": offset, "size": offset + len(piece)}
+    client.post(f"/subagents/{agent['id']}/logs", params={"stream": "stderr"}, content="warn: ünïcode\n".encode())
+
+    assert _log(client, agent["id"]) == (b"line one\nline two\n", 0, 18, 18)
+    assert _log(client, agent["id"], offset=5, limit=8) == (b"one\nline", 5, 18, 13)
+    assert _log(client, agent["id"], tail=4) == (b"two\n", 14, 18, 18)
+    assert _log(client, agent["id"], offset=99) == (b"", 18, 18, 18)
+
+    # The listing carries sizes only; the detail view has the text
+    listed = next(a for a in client.get("/subagents").json() if a["id"] == agent["id"])
+    assert "stdout" not in listed and (listed["stdout_bytes"], listed["stderr_bytes"]) == (18, 16)
+    detail = client.get(f"/subagents/{agent['id']}").json()
+    assert (detail["stdout"], detail["stderr"]) == ("line one\nline two\n", "warn: ünïcode\n")
+
+    # A PUT with stdout still replaces the whole log
+    client.put(f"/subagents/{agent['id']}", json={"stdout": "fresh"})
+    assert _log(client, agent["id"]) == (b"fresh", 0, 5, 5)
+
+    assert client.post("/subagents/nobody/logs", content=b"x").status_code == 404
+    assert client.get(f"/subagents/{agent['id']}/logs", params={"stream": "stdin"}).status_code == 422
+
+
+def test_live_tail_sends_backlog_then_appends(client):
+    agent = client.post("/subagents", json={"name": "tailed"}).json()
+    client.post(f"/subagents/{agent['id']}/logs", content=b"0123456789")
+
+    with client.websocket_connect(f"/ws/subagents/{agent['id']}/logs?tail=4") as ws:
+        assert ws.receive_json() == {"type": "log", "stream": "stdout", "offset": 6, "data": "6789"}
+        client.post(f"/subagents/{agent['id']}/logs", content=b"abc")
+        client.post(f"/subagents/{agent['id']}/logs", params={"stream": "stderr"}, content=b"not tailed")
+        client.post(f"/subagents/{agent['id']}/logs", content=b"def")
+        assert ws.receive_json()["data"] == "abc"
+        assert ws.receive_json() == {"type": "log", "stream": "stdout", "offset": 13, "data": "def"}
+
+
+def test_lagging_tail_catches_up_from_the_table():
+    tails = logs.LogTails()
+    log = bytearray(b"abc")
+    sent = []
+
+    async def catch_up(position):
+        return bytes(log[position:position + 2]), position, len(log)
+
+    async def send(position, data):
+        sent.append((position, data))
+
+    async def run():
+        tail = tails.subscribe("a", "stdout")
+        follower = asyncio.create_task(tails.follow(tail, catch_up, send))
+        await asyncio.sleep(0)
+        # Appends published beyond the queue's room are dropped and re-read
+        for i in range(logs.QUEUE_SIZE + 5):
+            tails.publish("a", "stdout", len(log), b"x")
+            log.extend(b"x")
+        for _ in range(logs.QUEUE_SIZE + 20):
+            await asyncio.sleep(0)
+        follower.cancel()
+        return tail
+
+    tail = asyncio.run(run())
+    assert tails.lagged == 1
+    assert b"".join(data for _, data in sent) == bytes(log)
+    assert all(position == sum(len(d) for _, d in sent[:i]) for i, (position, _) in enumerate(sent))
+    assert tail.position == len(log)
@@ -0,0 +1,85 @@
+"""
+GET /sync change-feed tests.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+import sync
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+def current_rev(client):
+    body = client.get("/sync").json()
+    assert body["reset"] is True
+    return body["rev"]
+
+
+def test_changes_collapse_to_latest_state(client):
+    rev = current_rev(client)
+    kept = client.post("/tasks", json={"title": "kept", "tags": ["sync"]}).json()
+    gone = client.post("/tasks", json={"title": "gone"}).json()
+    client.put(f"/tasks/{kept['id']}", json={"status": "DONE"})
+    client.delete(f"/tasks/{gone['id']}")
+    entry = client.post("/activity", json={"actor": "Morty", "action": "sync", "description": "feed"}).json()
+
+    delta = client.get("/sync", params={"since": rev}).json()
+    assert delta["reset"] is False and delta["more"] is False
+    assert delta["rev"] == rev + 5
+    assert [(t["id"], t["status"], t["tags"]) for t in delta["tasks"]] == [(kept["id"], "DONE", ["sync"])]
+    assert delta["deleted"]["tasks"] == [gone["id"]]
+    assert [a["id"] for a in delta["activity"]] == [entry["id"]]
+
+    idle = client.get("/sync", params={"since": delta["rev"]}).json()
+    assert idle["rev"] == delta["rev"]
+    assert idle["tasks"] == idle["activity"] == idle["subagents"] == []
+
+
+def test_limit_pages_through_the_feed(client):
+    rev = current_rev(client)
+    ids = [client.post("/tasks", json={"title": f"page {i}"}).json()["id"] for i in range(3)]
+
+    seen = []
+    while True:
+        delta = client.get("/sync", params={"since": rev, "limit": 2}).json()
+        seen += [t["id"] for t in delta["tasks"]]
+        rev = delta["rev"]
+        if not delta["more"]:
+            break
+    assert seen == ids
+
+
+def test_unknown_revision_asks_for_reset(client):
+    rev = current_rev(client)
+    delta = client.get("/sync", params={"since": rev + 1000}).json()
+    assert delta["reset"] is True
+    assert delta["rev"] == rev
+
+
+def test_feed_is_pruned_by_age_not_count(client):
+    rev = current_rev(client)
+    with backend.db.writer() as conn:
+        assert sync.prune(conn, now=1000.0, retention=60) == 0
+    ids = [client.post("/tasks", json={"title": f"aged {i}"}).json()["id"] for i in range(3)]
+    with backend.db.writer() as conn:
+        # The mark taken at t=1000 is past the window at t=1061: everything up to it goes
+        assert sync.prune(conn, now=1030.0, retention=60) == 0
+        assert sync.prune(conn, now=1061.0, retention=60) > 0
+        assert sync.current_revision(conn) == rev + 3
+
+    assert client.get("/sync", params={"since": rev - 1}).json()["reset"] is True
+    delta = client.get("/sync", params={"since": rev}).json()
+    assert delta["reset"] is False and [t["id"] for t in delta["tasks"]] == ids
+
+    with backend.db.writer() as conn:
+        sync.prune(conn, now=1200.0, retention=60)
+        # Pruned empty: the revision still stands, and only clients behind it reset
+        assert conn.execute("SELECT count(*) FROM changes").fetchone()[0] == 0
+    assert client.get("/sync", params={"since": rev + 3}).json()["reset"] is False
+    assert client.get("/sync", params={"since": rev + 2}).json()["reset"] is True
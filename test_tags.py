@@ -0,0 +1,74 @@
+"""
+Normalized tag index behind ?tag= on /tasks and /components, and the tag facets.
+"""
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+import migrations
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+def _ids(client, url, **params):
+    r = client.get(url, params=params)
+    assert r.status_code == 200
+    return [item["id"] for item in r.json()]
+
+
+def test_migration_backfills_existing_tags(monkeypatch):
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, tags TEXT)")
+    conn.execute("CREATE TABLE components (id INTEGER PRIMARY KEY, tags TEXT)")
+    conn.execute("""INSERT INTO tasks VALUES (1, '["smd", "SMD", "0603"]'), (2, 'not json'), (3, NULL), (4, '[""]')""")
+    conn.execute("""INSERT INTO components VALUES (1, '["smd", 5]')""")
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in migrations.MIGRATIONS if m[0] == 9])
+    migrations.apply_migrations(conn)
+
+    assert conn.execute("SELECT name, tasks, components FROM tags ORDER BY id").fetchall() == \
+        [("smd", 1, 1), ("0603", 1, 0)]
+    assert conn.execute("SELECT tag_id, task_id FROM task_tags ORDER BY tag_id").fetchall() == [(1, 1), (2, 1)]
+
+    conn.execute("""UPDATE tasks SET tags = '["0603"]' WHERE id = 1""")
+    conn.execute("DELETE FROM components WHERE id = 1")
+    assert conn.execute("SELECT name, tasks, components FROM tags ORDER BY id").fetchall() == \
+        [("smd", 0, 0), ("0603", 1, 0)]
+
+
+def test_tag_filters_and_facets(client):
+    parts = [client.post("/components", json={"part_number": f"TAG-{i}", "tags": tags}).json()["id"]
+             for i, tags in enumerate([["ta-smd", "ta-0603"], ["ta-smd", "ta-0805"], ["ta-tht"], ["TA-SMD", "ta-0603"]])]
+
+    assert _ids(client, "/components", tag="ta-smd") == [parts[0], parts[1], parts[3]]
+    assert _ids(client, "/components", tag=["TA-SMD", "ta-0603"]) == [parts[0], parts[3]]
+    assert _ids(client, "/components", tag=["ta-0805", "ta-tht"], tag_mode="any") == [parts[1], parts[2]]
+    assert _ids(client, "/components", tag=["ta-smd", "ta-unknown"]) == []
+    assert _ids(client, "/components", tag=["ta-smd", "ta-unknown"], tag_mode="any") == [parts[0], parts[1], parts[3]]
+    assert _ids(client, "/components", tag="ta-smd", limit=2) == [parts[0], parts[1]]
+
+    facets = client.get("/components/tags", params={"tag": "ta-smd"}).json()
+    assert facets == [{"tag": "ta-smd", "count": 3}, {"tag": "ta-0603", "count": 2}, {"tag": "ta-0805", "count": 1}]
+    assert {"tag": "ta-tht", "count": 1} in client.get("/components/tags").json()
+
+    client.delete(f"/components/{parts[0]}")
+    assert _ids(client, "/components", tag=["ta-smd", "ta-0603"]) == [parts[3]]
+
+
+def test_task_tags_follow_updates(client):
+    task = client.post("/tasks", json={"title": "tagged", "tags": ["tt-firmware"]}).json()
+    other = client.post("/tasks", json={"title": "tagged too", "tags": ["tt-firmware", "tt-urgent"]}).json()
+    assert _ids(client, "/tasks", tag="tt-firmware") == [task["id"], other["id"]]
+
+    client.put(f"/tasks/{task['id']}", json={"tags": ["tt-urgent"], "status": "IN_PROGRESS"})
+    assert _ids(client, "/tasks", tag="tt-firmware") == [other["id"]]
+    assert _ids(client, "/tasks", tag="tt-urgent", status="IN_PROGRESS") == [task["id"]]
+    assert client.get("/tasks/tags", params={"tag": "tt-urgent"}).json() == \
+        [{"tag": "tt-urgent", "count": 2}, {"tag": "tt-firmware", "count": 1}]
+    assert client.get("/tasks", params={"tag": "x", "tag_mode": "both"}).status_code == 422
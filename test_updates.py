@@ -0,0 +1,78 @@
+"""
+Single-statement partial updates with If-Match row versions.
+"""
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+from updates import Expr, VersionConflict, parse_if_match, update_returning
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(backend.app) as c:
+        yield c
+
+
+def test_update_returning_bumps_the_version_in_one_statement():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, a TEXT, n INTEGER, version INTEGER NOT NULL DEFAULT 1)")
+    conn.execute("INSERT INTO t (id, a, n) VALUES (1, 'x', 5)")
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    assert update_returning(conn, "t", 1, {"a": "y", "n": Expr("n + ?", (2,))}, expected=1) == (1, "y", 7, 2)
+    assert len(statements) == 1 and "RETURNING" in statements[0]
+    with pytest.raises(VersionConflict) as conflict:
+        update_returning(conn, "t", 1, {"a": "z"}, expected=1)
+    assert conflict.value.current == 2
+    assert update_returning(conn, "t", 2, {"a": "z"}, expected=1) is None
+    assert update_returning(conn, "t", 1, {}, returning="version") == (3,)
+
+    assert [parse_if_match(h) for h in (None, "*", '"4"', 'W/"4"', "4")] == [None, None, 4, 4, 4]
+    with pytest.raises(ValueError):
+        parse_if_match('"abc"')
+
+
+def test_concurrent_board_moves_conflict(client):
+    task = client.post("/tasks", json={"title": "card"}).json()
+    assert task["version"] == 1
+
+    moved = client.put(f"/tasks/{task['id']}", json={"status": "IN_PROGRESS"}, headers={"If-Match": '"1"'})
+    assert moved.status_code == 200 and moved.json()["version"] == 2 and moved.headers["ETag"] == '"2"'
+    # A second board still showing version 1 loses instead of overwriting
+    stale = client.put(f"/tasks/{task['id']}", json={"status": "TODO"}, headers={"If-Match": '"1"'})
+    assert stale.status_code == 409 and stale.headers["ETag"] == '"2"'
+    assert next(t for t in client.get("/tasks").json() if t["id"] == task["id"])["status"] == "IN_PROGRESS"
+
+    # Without If-Match the last write wins, as before
+    assert client.put(f"/tasks/{task['id']}", json={"status": "TODO"}).json()["version"] == 3
+    assert client.put(f"/tasks/{task['id']}", json={"title": "x"}, headers={"If-Match": "v3"}).status_code == 400
+    assert client.put("/tasks/999999", json={"title": "x"}, headers={"If-Match": '"1"'}).status_code == 404
+
+
+def test_completed_at_is_stamped_on_the_transition_only(client, monkeypatch):
+    completed = []
+    monkeypatch.setattr(backend.rollup, "task_completed", completed.append)
+    task = client.post("/tasks", json={"title": "finish me"}).json()
+    client.put(f"/tasks/{task['id']}", json={"status": "DONE"})
+    client.put(f"/tasks/{task['id']}", json={"status": "DONE", "title": "renamed"})
+    assert [t["id"] for t in completed] == [task["id"]]
+
+
+def test_components_and_subagents(client):
+    comp = client.post("/components", json={"part_number": "R1", "stock": 10, "tags": ["smd"]}).json()
+    r = client.put(f"/components/{comp['id']}", json={"stock": 7, "tags": ["smd", "0603"]}, headers={"If-Match": '"1"'})
+    assert r.json()["stock"] == 7 and r.json()["tags"] == ["smd", "0603"] and r.json()["version"] == 2
+    assert client.put(f"/components/{comp['id']}", json={"stock": 1}, headers={"If-Match": '"1"'}).status_code == 409
+
+    agent = client.post("/subagents", json={"name": "worker"}).json()
+    r = client.put(f"/subagents/{agent['id']}", json={"status": "completed", "stdout": "done"}, headers={"If-Match": '"1"'})
+    assert (r.json()["status"], r.json()["stdout_bytes"], r.json()["version"]) == ("completed", 4, 2)
+    # A rejected update leaves the log alone too
+    r = client.put(f"/subagents/{agent['id']}", json={"stdout": "overwritten"}, headers={"If-Match": '"1"'})
+    assert r.status_code == 409
+    assert client.get(f"/subagents/{agent['id']}").json()["stdout"] == "done"
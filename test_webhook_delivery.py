@@ -0,0 +1,216 @@
+"""
+Webhook delivery tests against a local stub HTTP server.
+
+Paths on the stub control its behaviour:
+    /ok/<name>          always 200
+    /fail/<n>/<name>    500 for the first n requests, then 200
+    /slow/<name>        sleeps before answering 200
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend
+
+SLOW_SECONDS = 1.0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.received[self.path].append(body)
+            count = len(server.received[self.path])
+
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "slow":
+            time.sleep(SLOW_SECONDS)
+        status = 500 if parts[0] == "fail" and count <= int(parts[1]) else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.received = defaultdict(list)
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def client():
+    dispatcher = backend.webhook_dispatcher
+    saved = dispatcher.backoff, dispatcher.max_attempts
+    dispatcher.backoff, dispatcher.max_attempts = 0.05, 3
+    with TestClient(backend.app) as c:
+        yield c
+    dispatcher.backoff, dispatcher.max_attempts = saved
+
+
+@pytest.fixture
+def webhook(client, stub):
+    created = []
+
+    def register(path, events=()):
+        hook = client.post("/webhooks", json={"url": stub.url + path, "events": list(events)}).json()
+        created.append(hook)
+        return hook
+
+    yield register
+    for hook in created:
+        client.delete(f"/webhooks/{hook['id']}")
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def outbox_rows(url):
+    with backend.db.reader() as conn:
+        return [dict(r) for r in conn.execute("SELECT * FROM webhook_outbox WHERE url = ? ORDER BY id", (url,))]
+
+
+def test_events_are_delivered_to_matching_subscribers(client, stub, webhook):
+    webhook("/ok/created-only", events=["task_created"])
+    webhook("/ok/everything")
+
+    task = client.post("/tasks", json={"title": "deliver me"}).json()
+    client.put(f"/tasks/{task['id']}", json={"status": "DONE"})
+
+    assert wait_for(lambda: len(stub.received["/ok/everything"]) == 2)
+    assert [p["event"] for p in stub.received["/ok/everything"]] == ["task_created", "task_updated"]
+    assert wait_for(lambda: len(stub.received["/ok/created-only"]) == 1)
+    payload = stub.received["/ok/created-only"][0]
+    assert payload["event"] == "task_created"
+    assert payload["data"]["title"] == "deliver me"
+    time.sleep(0.2)
+    assert len(stub.received["/ok/created-only"]) == 1
+
+
+def test_failed_delivery_is_retried_with_backoff(client, stub, webhook):
+    webhook("/fail/2/retry")
+    client.post("/tasks", json={"title": "flaky subscriber"})
+
+    assert wait_for(lambda: len(stub.received["/fail/2/retry"]) == 3)
+    url = stub.url + "/fail/2/retry"
+    assert wait_for(lambda: outbox_rows(url)[0]["status"] == "delivered")
+    row = outbox_rows(url)[0]
+    assert row["attempts"] == 3
+    assert row["last_error"] is None
+
+
+def test_exhausted_delivery_is_dead_lettered(client, stub, webhook):
+    webhook("/fail/100/dead")
+    client.post("/tasks", json={"title": "broken subscriber"})
+
+    url = stub.url + "/fail/100/dead"
+    assert wait_for(lambda: outbox_rows(url) and outbox_rows(url)[0]["status"] == "dead")
+    row = outbox_rows(url)[0]
+    assert row["attempts"] == 3
+    assert row["last_error"] == "HTTP 500"
+    time.sleep(0.3)
+    assert len(stub.received["/fail/100/dead"]) == 3
+
+    stats = client.get("/stats/webhooks").json()
+    assert stats["dead"] >= 1
+    assert stats["dead_lettered"] >= 1
+
+
+def test_slow_subscriber_does_not_block_writes(client, stub, webhook):
+    webhook("/slow/tarpit")
+
+    start = time.perf_counter()
+    for i in range(3):
+        assert client.post("/tasks", json={"title": f"fast write {i}"}).status_code == 200
+    assert time.perf_counter() - start < SLOW_SECONDS
+
+    assert wait_for(lambda: len(stub.received["/slow/tarpit"]) == 3)
+    stats = client.get("/stats/webhooks").json()
+    assert stats["latency_ms"]["count"] >= 3
+
+
+def test_poller_survives_a_database_error(client, stub, webhook, monkeypatch):
+    dispatcher = backend.webhook_dispatcher
+    claim = dispatcher._claim
+    failures = []
+
+    def busy_once(conn, limit):
+        if not failures:
+            failures.append(limit)
+            raise sqlite3.OperationalError("database is locked")
+        return claim(conn, limit)
+
+    monkeypatch.setattr(dispatcher, "_claim", busy_once)
+    webhook("/ok/after-busy")
+    client.post("/tasks", json={"title": "delivered after a busy poll"})
+
+    assert wait_for(lambda: len(stub.received["/ok/after-busy"]) == 1)
+    assert failures
+
+
+def test_only_expired_leases_are_requeued(client, stub):
+    dispatcher = backend.webhook_dispatcher
+    now = time.time()
+    with backend.db.writer() as conn:
+        ids = [conn.execute("""INSERT INTO webhook_outbox (url, event, payload, status, attempts, next_attempt_at,
+                                                           created_at, claimed_at)
+                               VALUES (?, 'lease', '{}', 'delivering', 1, ?, ?, ?) RETURNING id""",
+                            (stub.url + path, now, now, claimed_at)).fetchone()[0]
+               for path, claimed_at in (("/ok/live-lease", now), ("/ok/expired-lease", now - dispatcher.lease - 1))]
+
+    with backend.db.writer() as conn:
+        assert dispatcher._requeue_expired(conn) >= 1
+    dispatcher.wake()
+    live, expired = (outbox_rows(stub.url + path)[0] for path in ("/ok/live-lease", "/ok/expired-lease"))
+    # Another worker is still delivering the live one; the expired one's worker died
+    assert live["status"] == "delivering"
+    assert expired["status"] != "delivering" or expired["claimed_at"] > now
+    assert wait_for(lambda: len(stub.received["/ok/expired-lease"]) == 1)
+    assert not stub.received["/ok/live-lease"]
+
+    with backend.db.writer() as conn:
+        conn.execute("DELETE FROM webhook_outbox WHERE id IN (?, ?)", ids)
+
+
+def test_finished_deliveries_are_pruned_after_retention(client, stub):
+    dispatcher = backend.webhook_dispatcher
+    now = time.time()
+    old = now - dispatcher.retention - 1
+    rows = [("delivered", old, old, None), ("delivered", now, now, None), ("dead", None, old, old),
+            ("dead", None, now, now), ("dead", None, None, old), ("pending", None, None, old)]
+    with backend.db.writer() as conn:
+        for status, delivered_at, claimed_at, created_at in rows:
+            conn.execute("""INSERT INTO webhook_outbox (url, event, payload, status, attempts, next_attempt_at,
+                                                        created_at, claimed_at, delivered_at)
+                            VALUES (?, 'prune', '{}', ?, 1, ?, ?, ?, ?)""",
+                         (stub.url + "/never", status, now + 3600, created_at or now, claimed_at, delivered_at))
+        assert dispatcher._prune(conn) == 3
+
+    kept = [(row["status"], row["delivered_at"] or row["claimed_at"]) for row in outbox_rows(stub.url + "/never")]
+    # The recent ones and anything still to deliver stay
+    assert kept == [("delivered", now), ("dead", now), ("pending", None)]
+
+    with backend.db.writer() as conn:
+        conn.execute("DELETE FROM webhook_outbox WHERE url = ?", (stub.url + "/never",))
@@ -0,0 +1,93 @@
+"""
+Partial updates in one statement.
+
+PUT routes build a column -> value dict of the fields the request set and
+hand it to update_returning(), which applies it with a single
+UPDATE ... RETURNING: no existence check before and no read-back after.
+Each update also bumps the row's `version`. A client that sends
+If-Match: "<version>" only updates the row it last saw. If someone else
+changed it in between, it gets VersionConflict (409) instead of
+overwriting their change.
+"""
+
+import sqlite3
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class Expr(NamedTuple):
+    """A SQL expression as the new value; column names in it see the row before the update"""
+    sql: str
+    params: tuple = ()
+
+
+class VersionConflict(Exception):
+    """The row exists but is no longer at the version the client named"""
+
+    def __init__(self, current: int):
+        super().__init__(f"Version conflict: the row is now at version {current}")
+        self.current = current
+
+
+def parse_if_match(header: Optional[str]) -> Optional[int]:
+    """The version named by an If-Match header ("3", W/"3" or 3); None for a missing header or *"""
+    if header is None or header.strip() == "*":
+        return None
+    value = header.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise ValueError(f"If-Match must be a row version, got {header!r}")
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _set_clause(changes: Dict[str, Any]):
+    sets, params = [], []
+    for column, value in changes.items():
+        if isinstance(value, Expr):
+            sets.append(f"{column} = {value.sql}")
+            params.extend(value.params)
+        else:
+            sets.append(f"{column} = ?")
+            params.append(value)
+    sets.append("version = version + 1")
+    return ", ".join(sets), params
+
+
+def update_returning(conn: sqlite3.Connection, table: str, row_id, changes: Dict[str, Any],
+                     expected: Optional[int] = None, returning: str = "*") -> Optional[sqlite3.Row]:
+    """
+    Apply `changes` to row `row_id` of `table` and bump its version; returns
+    the updated row (`returning` columns), or None if there is no such row.
+    With `expected`, raises VersionConflict when the row is at another version.
+    """
+    sets, params = _set_clause(changes)
+    query = f"UPDATE {table} SET {sets} WHERE id = ?"
+    params.append(row_id)
+    if expected is not None:
+        query += " AND version = ?"
+        params.append(expected)
+    # fetchall: the statement has to run to completion before the commit
+    rows = conn.execute(f"{query} RETURNING {returning}", params).fetchall()
+    if rows:
+        return rows[0]
+    if expected is not None:
+        # Only a failed update pays for this lookup
+        current = conn.execute(f"SELECT version FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        if current is not None:
+            raise VersionConflict(current[0])
+    return None
+
+
+def update_many(conn: sqlite3.Connection, table: str, changes: Dict[str, Any], conditions: List[str], params: list,
+                returning: str = "*") -> List[sqlite3.Row]:
+    """Apply `changes` to every row matching `conditions` in one statement, bumping each version; returns the rows"""
+    sets, set_params = _set_clause(changes)
+    query = f"UPDATE {table} SET {sets}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return conn.execute(f"{query} RETURNING {returning}", set_params + list(params)).fetchall()
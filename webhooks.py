@@ -0,0 +1,336 @@
+"""
+Asynchronous webhook delivery.
+
+Write routes add one webhook_outbox row per subscriber inside their own
+transaction, so an event is recorded if and only if the change commits.
+A WebhookDispatcher running on the event loop claims due rows, POSTs them
+through one shared keep-alive httpx client (with a per-host concurrency
+cap), and retries failures with exponential backoff until they either
+succeed or are parked in the 'dead' state.
+
+A claimed row is leased for LEASE_SECONDS. Every worker process runs a
+dispatcher, so a row still 'delivering' is only handed out again once its
+lease has run out, i.e. when the worker that claimed it died.
+
+Delivered and dead rows are kept for RETENTION_SECONDS after their last
+attempt, for inspection, and then deleted by the poller.
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from db import Database
+
+WORKERS = int(os.environ.get("HOOKER_WEBHOOK_WORKERS", "8"))
+PER_HOST_LIMIT = int(os.environ.get("HOOKER_WEBHOOK_PER_HOST", "4"))
+MAX_ATTEMPTS = int(os.environ.get("HOOKER_WEBHOOK_MAX_ATTEMPTS", "8"))
+BACKOFF_SECONDS = float(os.environ.get("HOOKER_WEBHOOK_BACKOFF", "1"))
+BACKOFF_MAX_SECONDS = float(os.environ.get("HOOKER_WEBHOOK_BACKOFF_MAX", "600"))
+TIMEOUT_SECONDS = float(os.environ.get("HOOKER_WEBHOOK_TIMEOUT", "5"))
+LEASE_SECONDS = float(os.environ.get("HOOKER_WEBHOOK_LEASE", "300"))
+RETENTION_SECONDS = float(os.environ.get("HOOKER_WEBHOOK_RETENTION", str(7 * 24 * 3600)))
+POLL_SECONDS = 5.0
+# Longest pause after the poller hits a database error
+ERROR_BACKOFF_MAX_SECONDS = 30.0
+
+log = logging.getLogger(__name__)
+
+INSERT_DELIVERY = """INSERT INTO webhook_outbox (webhook_id, url, event, payload, status, attempts, next_attempt_at, created_at)
+                     VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)"""
+
+
+class WebhookRegistry:
+    """
+    In-memory index of webhook subscribers keyed by event name, plus a
+    wildcard set for subscribers without an event filter. Built once at
+    startup and kept current by the webhook routes, so matching an event
+    costs O(matching subscribers) and never touches the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_event: Dict[str, Dict[int, str]] = {}
+        self._wildcard: Dict[int, str] = {}
+        self._events: Dict[int, List[str]] = {}
+
+    def load(self, db: Database):
+        with db.reader() as conn:
+            rows = conn.execute("SELECT id, url, events FROM webhooks").fetchall()
+        with self._lock:
+            self._by_event, self._wildcard, self._events = {}, {}, {}
+            for row in rows:
+                try:
+                    events = json.loads(row['events']) if row['events'] else []
+                except ValueError:
+                    events = []
+                self._add(row['id'], row['url'], events)
+
+    def _add(self, webhook_id: int, url: str, events: List[str]):
+        self._events[webhook_id] = events
+        if not events:
+            self._wildcard[webhook_id] = url
+        for event in events:
+            self._by_event.setdefault(event, {})[webhook_id] = url
+
+    def add(self, webhook_id: int, url: str, events: List[str]):
+        with self._lock:
+            self._add(webhook_id, url, list(events))
+
+    def remove(self, webhook_id: int):
+        with self._lock:
+            events = self._events.pop(webhook_id, None)
+            if events is None:
+                return
+            self._wildcard.pop(webhook_id, None)
+            for event in events:
+                subscribers = self._by_event.get(event)
+                if subscribers is not None:
+                    subscribers.pop(webhook_id, None)
+                    if not subscribers:
+                        del self._by_event[event]
+
+    def match(self, event: str) -> List[Tuple[int, str]]:
+        """(webhook_id, url) for every subscriber of `event`"""
+        with self._lock:
+            matched = list(self._wildcard.items())
+            subscribers = self._by_event.get(event)
+            if subscribers:
+                matched.extend(subscribers.items())
+            return matched
+
+    def __len__(self):
+        return len(self._events)
+
+
+def enqueue(conn: sqlite3.Connection, event: str, data: dict, subscribers: List[Tuple[int, str]]) -> int:
+    """Record one delivery per subscriber; call inside the write transaction"""
+    if not subscribers:
+        return 0
+    now = time.time()
+    payload = json.dumps({"event": event, "data": data, "timestamp": datetime.datetime.utcnow().isoformat()})
+    conn.executemany(INSERT_DELIVERY, [(webhook_id, url, event, payload, now, now) for webhook_id, url in subscribers])
+    return len(subscribers)
+
+
+class WebhookDispatcher:
+    """Outbox poller feeding a pool of async delivery workers"""
+
+    def __init__(self, db: Database, workers: int = WORKERS, per_host: int = PER_HOST_LIMIT,
+                 max_attempts: int = MAX_ATTEMPTS, backoff: float = BACKOFF_SECONDS,
+                 backoff_max: float = BACKOFF_MAX_SECONDS, timeout: float = TIMEOUT_SECONDS,
+                 lease: float = LEASE_SECONDS, retention: float = RETENTION_SECONDS):
+        self.db = db
+        self.workers = workers
+        self.per_host = per_host
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.lease = lease
+        self.retention = retention
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._jobs: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._tasks = []
+        # In-memory stats for /stats/webhooks
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self._latency_ms = deque(maxlen=1000)
+        self._request_ms = deque(maxlen=1000)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._jobs = asyncio.Queue(maxsize=self.workers * 4)
+        self._hosts = {}
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.workers * 2, max_keepalive_connections=self.workers))
+        self._tasks = [asyncio.create_task(self._poll())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def wake(self):
+        """Tell the poller new deliveries are due; safe to call from any thread"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # --- Outbox access (run on the DB executor through db.read / db.write) ---
+    def _requeue_expired(self, conn: sqlite3.Connection) -> int:
+        """Put rows whose lease ran out (their worker died mid-delivery) back to pending (at-least-once)"""
+        return conn.execute("UPDATE webhook_outbox SET status = 'pending' WHERE status = 'delivering' AND claimed_at <= ?",
+                            (time.time() - self.lease,)).rowcount
+
+    def _prune(self, conn: sqlite3.Connection) -> int:
+        """Delete delivered and dead rows whose last attempt is older than the retention window"""
+        cutoff = time.time() - self.retention
+        # Dead rows from before leases have no claimed_at
+        return conn.execute("""DELETE FROM webhook_outbox
+                               WHERE (status = 'delivered' AND delivered_at <= ?)
+                                  OR (status = 'dead' AND COALESCE(claimed_at, created_at) <= ?)""",
+                            (cutoff, cutoff)).rowcount
+
+    def _claim(self, conn: sqlite3.Connection, limit: int):
+        now = time.time()
+        return conn.execute("""UPDATE webhook_outbox SET status = 'delivering', attempts = attempts + 1, claimed_at = ?
+                               WHERE id IN (SELECT id FROM webhook_outbox
+                                            WHERE status = 'pending' AND next_attempt_at <= ?
+                                            ORDER BY next_attempt_at LIMIT ?)
+                               RETURNING id, url, payload, attempts, created_at""",
+                            (now, now, limit)).fetchall()
+
+    def _next_due(self, conn: sqlite3.Connection) -> Optional[float]:
+        return conn.execute("SELECT MIN(next_attempt_at) FROM webhook_outbox WHERE status = 'pending'").fetchone()[0]
+
+    def _finish(self, conn: sqlite3.Connection, job, error: Optional[str]):
+        now = time.time()
+        if error is None:
+            conn.execute("""UPDATE webhook_outbox SET status = 'delivered', delivered_at = ?, last_error = NULL
+                            WHERE id = ?""", (now, job['id']))
+        elif job['attempts'] >= self.max_attempts:
+            conn.execute("UPDATE webhook_outbox SET status = 'dead', last_error = ? WHERE id = ?",
+                         (error, job['id']))
+        else:
+            delay = min(self.backoff * 2 ** (job['attempts'] - 1), self.backoff_max)
+            delay *= random.uniform(0.8, 1.2)
+            conn.execute("""UPDATE webhook_outbox SET status = 'pending', next_attempt_at = ?, last_error = ?
+                            WHERE id = ?""", (now + delay, error, job['id']))
+
+    @staticmethod
+    def _backlog(conn: sqlite3.Connection):
+        backlog = dict(conn.execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM webhook_outbox WHERE status IN ('pending', 'delivering')").fetchone()[0]
+        return backlog, oldest
+
+    # --- Event loop side ---
+    async def _poll(self):
+        errors = 0
+        upkeep = 0.0
+        while True:
+            try:
+                if time.monotonic() >= upkeep:
+                    requeued = await self.db.write(self._requeue_expired)
+                    if requeued:
+                        log.warning("Requeued %d webhook deliveries whose lease expired", requeued)
+                    pruned = await self.db.write(self._prune)
+                    if pruned:
+                        log.info("Deleted %d finished webhook deliveries past retention", pruned)
+                    upkeep = time.monotonic() + min(self.lease / 2, 60)
+                timeout = await self._poll_once()
+                errors = 0
+            except Exception:
+                # e.g. SQLITE_BUSY under write load: keep polling rather than stop delivering
+                errors += 1
+                log.exception("Webhook outbox poll failed")
+                timeout = min(2 ** (errors - 1), ERROR_BACKOFF_MAX_SECONDS)
+            if timeout <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_once(self) -> float:
+        """Claim what is due; returns how long to wait for a wake() before polling again"""
+        self._wake.clear()
+        free = self._jobs.maxsize - self._jobs.qsize()
+        if not free:
+            # Workers are saturated; wait for them to drain before claiming more
+            await self._jobs.join()
+            return 0
+        jobs = await self.db.write(self._claim, free)
+        for job in jobs:
+            await self._jobs.put(job)
+        if len(jobs) == free:
+            return 0
+
+        next_due = await self.db.read(self._next_due)
+        return POLL_SECONDS if next_due is None else min(next_due - time.time(), POLL_SECONDS)
+
+    async def _work(self):
+        while True:
+            job = await self._jobs.get()
+            try:
+                await self._deliver(job)
+            except Exception:
+                log.exception("Webhook delivery to %s failed", job['url'])
+            finally:
+                self._jobs.task_done()
+
+    async def _deliver(self, job):
+        host = urlsplit(job['url']).netloc
+        limit = self._hosts.get(host)
+        if limit is None:
+            limit = self._hosts[host] = asyncio.Semaphore(self.per_host)
+
+        error = None
+        async with limit:
+            start = time.perf_counter()
+            try:
+                r = await self._client.post(job['url'], content=job['payload'],
+                                            headers={"Content-Type": "application/json"})
+                if r.status_code >= 300:
+                    error = f"HTTP {r.status_code}"
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+            self._request_ms.append((time.perf_counter() - start) * 1000)
+
+        await self.db.write(self._finish, job, error)
+        if error is None:
+            self.delivered += 1
+            self._latency_ms.append((time.time() - job['created_at']) * 1000)
+        elif job['attempts'] >= self.max_attempts:
+            self.dead += 1
+        else:
+            self.retried += 1
+            self._wake.set()
+
+    async def stats(self) -> dict:
+        backlog, oldest = await self.db.read(self._backlog)
+        return {
+            "pending": backlog.get("pending", 0),
+            "in_flight": backlog.get("delivering", 0),
+            "delivered_total": backlog.get("delivered", 0),
+            "dead": backlog.get("dead", 0),
+            "oldest_pending_age_s": round(time.time() - oldest, 3) if oldest else 0,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead_lettered": self.dead,
+            "latency_ms": _summary(self._latency_ms),
+            "request_ms": _summary(self._request_ms),
+        }
+
+
+def _summary(samples) -> dict:
+    if not samples:
+        return {"count": 0, "avg": 0, "p50": 0, "p95": 0, "max": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {"count": len(ordered), "avg": round(sum(ordered) / len(ordered), 3),
+            "p50": round(pick(0.50), 3), "p95": round(pick(0.95), 3), "max": round(ordered[-1], 3)}